@@ -0,0 +1,264 @@
+__author__ = "Jeremy Nelson"
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import pymarc
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import run
+from rda_enhancement import __version__
+from rda_enhancement import instrumentation, pcc_conversion, synthetic
+
+def peak_rss():
+    """Function returns the peak resident set size in megabytes of this
+    process and of its finished child processes"""
+    scale = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        'children': resource.getrusage(
+            resource.RUSAGE_CHILDREN).ru_maxrss / scale}
+
+def benchmark_convert(marc_filename):
+    """Function times PCCMARCtoRDAConversion.convert() alone over records
+    already decoded into memory
+
+    Args:
+        marc_filename -- File path of the corpus
+
+    Returns:
+        dict of records, seconds, records_per_second and steps
+    """
+    with open(marc_filename, 'rb') as marc_file:
+        records = list(pymarc.MARCReader(marc_file, to_unicode=True))
+    stats = instrumentation.ConversionStats()
+    start = instrumentation.timer()
+    for record in records:
+        pcc_conversion.PCCMARCtoRDAConversion(record, stats).convert()
+    seconds = instrumentation.timer() - start
+    return {'records': len(records),
+            'seconds': seconds,
+            'records_per_second': len(records) / seconds,
+            'steps': stats.as_dict()}
+
+def benchmark_run(marc_filename, records, workdir, workers, fast_path):
+    """Function times run.convert() end to end, from the corpus file to
+    the converted output file
+
+    Args:
+        marc_filename -- File path of the corpus
+        records -- Number of records in the corpus
+        workdir -- Directory for the output and stats files
+        workers -- Number of conversion processes
+        fast_path -- Copy already RDA records through
+
+    Returns:
+        dict of records, seconds, records_per_second, megabytes_per_second
+        and steps
+    """
+    output_filename = os.path.join(workdir, 'output.mrc')
+    stats_filename = os.path.join(workdir, 'stats.json')
+    start = instrumentation.timer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run.convert(marc_filename,
+                    output_filename,
+                    workers=workers,
+                    fast_path=fast_path,
+                    checkpoint_every=0,
+                    stats_filename=stats_filename)
+    seconds = instrumentation.timer() - start
+    with open(stats_filename) as stats_file:
+        steps = json.load(stats_file)
+    return {'records': records,
+            'seconds': seconds,
+            'records_per_second': records / seconds,
+            'megabytes_per_second':
+                os.path.getsize(marc_filename) / seconds / 1024.0 / 1024.0,
+            'steps': steps}
+
+BENCHMARKS = {'convert': benchmark_convert,
+              'run': benchmark_run}
+
+def isolated(name, *args):
+    """Function runs a benchmark in a fresh Python process, so the peak
+    memory reported with its result is of that benchmark alone
+
+    Args:
+        name -- Name of the benchmark in BENCHMARKS
+        args -- Arguments of the benchmark, must be JSON serializable
+
+    Returns:
+        dict of the benchmark result and its peak_rss_megabytes
+    """
+    handle, filename = tempfile.mkstemp(suffix='.json')
+    try:
+        with os.fdopen(handle, 'w') as args_file:
+            json.dump(args, args_file)
+        subprocess.check_call([sys.executable,
+                               os.path.abspath(__file__),
+                               '--child', name, filename])
+        with open(filename) as result_file:
+            return json.load(result_file)
+    finally:
+        os.remove(filename)
+
+def child(name, filename):
+    """Function runs a benchmark with the arguments saved in a file by
+    isolated() and saves its result with the peak memory of this process
+    over the arguments"""
+    with open(filename) as args_file:
+        args = json.load(args_file)
+    result = BENCHMARKS[name](*args)
+    result['peak_rss_megabytes'] = peak_rss()
+    with open(filename, 'w') as result_file:
+        json.dump(result, result_file)
+    return 0
+
+def fastest(repeat, name, *args):
+    """Function runs a benchmark repeat times, each in its own process,
+    and returns the fastest result, which is the least disturbed by other
+    load on the machine"""
+    results = [isolated(name, *args) for i in range(repeat)]
+    return min(results, key=lambda result: result['seconds'])
+
+def compare(results, previous, threshold):
+    """Function prints the change in records per second from a previous
+    results file and returns the names of the benchmarks that regressed
+    by more than threshold
+
+    Args:
+        results -- Results of this run
+        previous -- Results of a previous run
+        threshold -- Allowed slowdown as a fraction, for example 0.1
+
+    Returns:
+        list of benchmark names
+    """
+    regressions = []
+    for name, result in sorted(results['benchmarks'].items()):
+        before = previous['benchmarks'].get(name)
+        if before is None:
+            continue
+        change = result['records_per_second'] / \
+                 before['records_per_second'] - 1.0
+        print("{:<24} {:>12.1f} records/sec {:>+8.1%}".format(
+            name,
+            result['records_per_second'],
+            change))
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+def main(args):
+    if args.child:
+        return child(*args.child)
+    corpus = synthetic.SyntheticCorpus(
+        seed=args.seed,
+        aacr2_share=args.aacr2_share,
+        abbreviation_density=args.abbreviation_density,
+        multiple_007_share=args.multiple_007_share)
+    workdir = tempfile.mkdtemp()
+    try:
+        marc_filename = os.path.join(workdir, 'corpus.mrc')
+        corpus.save(marc_filename, args.records)
+        benchmarks = {'convert': fastest(args.repeat,
+                                         'convert',
+                                         marc_filename)}
+        for workers in args.workers:
+            benchmarks['run_workers_{}'.format(workers)] = fastest(
+                args.repeat,
+                'run',
+                marc_filename, args.records, workdir, workers, True)
+        benchmarks['run_no_fast_path'] = fastest(
+            args.repeat,
+            'run',
+            marc_filename, args.records, workdir, 1, False)
+    finally:
+        shutil.rmtree(workdir)
+    results = {
+        'version': __version__,
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'corpus': dict(corpus.__dict__, records=args.records),
+        'repeat': args.repeat,
+        'benchmarks': benchmarks}
+    for name, result in sorted(benchmarks.items()):
+        print("{:<24} {:>12.1f} records/sec".format(
+            name,
+            result['records_per_second']))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as previous_file:
+            regressions = compare(results,
+                                  json.load(previous_file),
+                                  args.threshold)
+        if len(regressions) > 0:
+            print("Regressions: {}".format(', '.join(regressions)))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the PCC RDA conversion on a synthetic corpus')
+    parser.add_argument(
+        '--records',
+        type=int,
+        default=10000,
+        help='Number of records in the synthetic corpus')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed for generating the corpus')
+    parser.add_argument(
+        '--aacr2-share',
+        type=float,
+        default=0.5,
+        help='Share of AACR2 records in the corpus, the rest are RDA')
+    parser.add_argument(
+        '--abbreviation-density',
+        type=float,
+        default=0.5,
+        help='Chance each 245/264/300/5XX value is abbreviated')
+    parser.add_argument(
+        '--multiple-007-share',
+        type=float,
+        default=0.1,
+        help='Share of records with more than one 007')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        nargs='+',
+        default=[1],
+        help='Number of processes for each end to end run')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='Times each benchmark is run, the fastest run is reported')
+    parser.add_argument(
+        '--output',
+        help='File path to save the results as JSON')
+    parser.add_argument(
+        '--compare',
+        help='Results file of a previous version to compare against')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='Slowdown that counts as a regression, default is 0.1 (10%%)')
+    # Runs one benchmark for isolated()
+    parser.add_argument(
+        '--child',
+        nargs=2,
+        help=argparse.SUPPRESS)
+    sys.exit(main(parser.parse_args()))
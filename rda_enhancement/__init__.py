@@ -3,3 +3,5 @@ __version__ = '.'.join(__version_info__)
 __author__ = "Jeremy Nelson"
 __license__ = 'MIT'
 __copyright__ = '(c) 2014 by Jeremy Nelson, Colorado College'
+
+from .stream import convert_batch, convert_stream
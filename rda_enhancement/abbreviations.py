@@ -0,0 +1,83 @@
+"""-------------------------------------------------------------------------------
+# Name:        abbreviations
+# Purpose:     Table driven expansion of the abbreviations the PCC
+#              recommendations replace with their spelled out forms
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+import re
+
+# Each rule is a regular expression for the abbreviation and its expansion,
+# earlier rules win when two abbreviations start at the same position. The
+# abbreviations must not match their own expansions so converting an RDA
+# record again leaves it unchanged.
+PHYSICAL_DESCRIPTION_ABBREVIATIONS = (
+    (r"\bp\.", "pages"),
+    (r"\bv\.", "volumes"),
+    (r"\billus\b|\bill\.", "illustrations"),
+    (r"\bfacsims\.", "facsimiles"),
+    (r"\bsd\.", "sound"),
+    (r"\bca\.", "approximately"))
+
+PUBLICATION_ABBREVIATIONS = (
+    (r"\bS\.l\.", "Place of publication not identified"),
+    (r"\bs\.n\.", "publisher not identified"))
+
+NOTE_ABBREVIATIONS = (
+    (r"\bp\.", "pages"),
+    (r"\bintrod\.", "Introduction"))
+
+# Rule table of MARC tag to subfield code to abbreviations, the subfield
+# code '*' applies to every subfield in the field
+PCC_ABBREVIATIONS = {
+    '264': {'*': PUBLICATION_ABBREVIATIONS},
+    '300': {'a': PHYSICAL_DESCRIPTION_ABBREVIATIONS,
+            'b': PHYSICAL_DESCRIPTION_ABBREVIATIONS},
+    '500': {'*': NOTE_ABBREVIATIONS},
+    '501': {'*': NOTE_ABBREVIATIONS},
+    '502': {'*': NOTE_ABBREVIATIONS},
+    '504': {'*': NOTE_ABBREVIATIONS}}
+
+class AbbreviationExpander(object):
+    """Compiles a sequence of abbreviation rules into a single alternation
+    regular expression so a subfield value is scanned once no matter how
+    many abbreviations are in the rules.
+
+    Attributes:
+        pattern: compiled regular expression of all the rules
+        expansions: dict of rule group name to expansion
+    """
+
+    def __init__(self, rules):
+        self.expansions = {}
+        alternatives = []
+        for i, (abbreviation, expansion) in enumerate(rules):
+            name = 'rule{0}'.format(i)
+            alternatives.append('(?P<{0}>{1})'.format(name, abbreviation))
+            self.expansions[name] = expansion
+        self.pattern = re.compile('|'.join(alternatives))
+
+    def __replace__(self, match):
+        return self.expansions[match.lastgroup]
+
+    def expand(self, value):
+        """Method returns the value with every abbreviation expanded
+
+        Args:
+            value(str): Subfield value
+
+        Returns:
+            str
+        """
+        return self.pattern.sub(self.__replace__, value)
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""-------------------------------------------------------------------------------
+# Name:        analyzer
+# Purpose:     Profiles a file of MARC21 records from their raw bytes and plans
+#              which of the PCC RDA conversion steps can change any of them
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import compact
+    import fingerprints
+    import marc_reader
+    import pcc_conversion
+except ImportError:
+    from . import compact
+    from . import fingerprints
+    from . import marc_reader
+    from . import pcc_conversion
+
+import collections
+import json
+import os
+
+PLAN_VERSION = 2
+
+# Conversion steps that run the rules of each tag, the rules of any other tag
+# are run by convertLocalRules
+RULE_STEPS = {'264': 'convert264',
+              '300': 'convert300',
+              '500': 'convert500s',
+              '501': 'convert500s',
+              '502': 'convert500s',
+              '504': 'convert500s'}
+
+# Tag of the fields each step changes or adds before convertLocalRules runs
+CHANGED_TAGS = {'convert245': '245',
+                'create336': '336',
+                'create337': '337',
+                'create338': '338'}
+
+class CorpusProfile(object):
+    """Distribution of the values the conversion steps read over a file of
+    records, gathered from each record's leader, directory and the raw
+    bytes of the few fields the steps read. A step is planned when it can
+    change at least one record. The checks only err towards running a step,
+    records the profile can not read keep every step.
+
+    Attributes:
+        rules: rules.ExecutionPlan the rule hits are matched with
+        records: number of records profiled
+        unreadable: records with a leader or directory that could not be read
+        encodings: Counter of 'utf-8' and 'marc-8' records
+        leader06: Counter of leader/06, the type of record
+        types007: Counter of 007/00-01, the category and material of each 007
+        fields33X: Counter of the records with a 336, 337 and 338
+        gmd: records with a GMD, a 245 $h
+        rule_hits: Counter of tag to the fields a rule matched
+        steps: Counter of step to the records it can change
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules or pcc_conversion.PCC_PLAN
+        self.local_tags = self.rules.tags - pcc_conversion.PCC_RULE_TAGS
+        self.records = 0
+        self.unreadable = 0
+        self.encodings = collections.Counter()
+        self.leader06 = collections.Counter()
+        self.types007 = collections.Counter()
+        self.fields33X = collections.Counter()
+        self.gmd = 0
+        self.rule_hits = collections.Counter()
+        self.steps = collections.Counter()
+
+    def add(self, raw_record):
+        """Method adds a record to the profile
+
+        Args:
+            raw_record(bytes): Record in ISO 2709 transmission format
+        """
+        self.records += 1
+        try:
+            steps = self.__profile__(bytes(raw_record))
+        except Exception:
+            # Malformed records are left for the conversion to report
+            self.unreadable += 1
+            steps = pcc_conversion.PCCMARCtoRDAConversion.steps
+        self.steps.update(steps)
+
+    def __profile__(self, raw_record):
+        leader = raw_record[0:24].decode('ascii')
+        utf8 = leader[9] == 'a'
+        self.encodings['utf-8' if utf8 else 'marc-8'] += 1
+        self.leader06[leader[6]] += 1
+        entries = marc_reader.read_directory(raw_record)
+        # Records with irregular subfields are decoded differently
+        regular = compact.IRREGULAR_SUBFIELD_RE.search(
+            raw_record, int(leader[12:17])) is None
+        tags = set(tag for tag, start, end in entries)
+        steps = set()
+        media, carriers, titles, gmd = set(), set(), [], False
+        for tag, start, end in entries:
+            data = raw_record[start:end]
+            if tag == '007':
+                values = data[:-1].decode('utf-8', 'replace')[0:2]
+                self.types007[values] += 1
+                media.add(pcc_conversion.RDA_MEDIA_FIELDS.get(values[0:1]))
+                carriers.add(pcc_conversion.RDA_CARRIER_FIELDS.get(
+                    (values[0:1], values[1:2])))
+            elif tag == '245':
+                gmd = gmd or marc_reader.SUBFIELD_INDICATOR + b'h' in data
+                titles.append(self.__field__(raw_record, tag, start, end,
+                                             utf8 and regular))
+            field_rules = self.rules.get(tag)
+            if field_rules is None or (tag < '010' and tag.isdigit()):
+                continue
+            field = self.__field__(raw_record, tag, start, end,
+                                   utf8 and regular)
+            if field is None or field_rules.matches(''.join(field.indicators),
+                                                    field):
+                self.rule_hits[tag] += 1
+                steps.add(RULE_STEPS.get(tag, 'convertLocalRules'))
+        for tag in ('336', '337', '338'):
+            if tag in tags:
+                self.fields33X[tag] += 1
+        if gmd:
+            self.gmd += 1
+        if self.__converts245__(leader, titles):
+            steps.add('convert245')
+        if not '336' in tags and \
+           leader[6] in pcc_conversion.RDA_CONTENT_FIELDS:
+            steps.add('create336')
+        if not '337' in tags and len(media - set([None])) > 0:
+            steps.add('create337')
+        if not '338' in tags and len(carriers - set([None])) > 0:
+            steps.add('create338')
+        # Local rules also run on the fields the PCC steps changed
+        if any(CHANGED_TAGS.get(step) in self.local_tags for step in steps):
+            steps.add('convertLocalRules')
+        return steps
+
+    def __field__(self, raw_record, tag, start, end, plain):
+        # Returns None for a field that can not be read without a full decode
+        if not plain:
+            if compact.MARC8_SPECIAL_RE.search(raw_record, start, end) or \
+               compact.IRREGULAR_SUBFIELD_RE.search(raw_record, start, end):
+                return None
+        return compact.CompactField.from_buffer(tag, raw_record, start, end)
+
+    def __converts245__(self, leader, titles):
+        if len(titles) < 1:
+            return False
+        if None in titles:
+            return True
+        record = compact.CompactRecord(leader)
+        for field in titles:
+            record.add_field(field)
+        converter = pcc_conversion.PCCMARCtoRDAConversion(record,
+                                                           rules=self.rules)
+        return converter.convert245() > 0
+
+    def plan(self):
+        """Method returns the conversion steps that can change a record, in
+        the order convert() runs them
+
+        Returns:
+            list of step names
+        """
+        return [step for step in pcc_conversion.PCCMARCtoRDAConversion.steps
+                if self.steps[step] > 0]
+
+    def as_dict(self):
+        """Method returns the profile for saving as JSON
+
+        Returns:
+            dict
+        """
+        return {'records': self.records,
+                'unreadable': self.unreadable,
+                'encodings': dict(self.encodings),
+                'leader06': dict(self.leader06),
+                '007': dict(self.types007),
+                '33X': dict(self.fields33X),
+                'gmd': self.gmd,
+                'rule_hits': dict(self.rule_hits),
+                'steps': dict((step, self.steps[step]) for step in
+                              pcc_conversion.PCCMARCtoRDAConversion.steps)}
+
+def analyze(raw_records, rules=None):
+    """Function profiles raw MARC21 records, see CorpusProfile
+
+    Args:
+        raw_records(iterable): Raw ISO 2709 records as bytes
+        rules(rules.ExecutionPlan): Rules of the conversion, defaults to
+                                    the PCC rules
+
+    Returns:
+        CorpusProfile
+    """
+    profile = CorpusProfile(rules)
+    for raw_record in raw_records:
+        profile.add(raw_record)
+    return profile
+
+def input_version(input_filename):
+    """Function returns the name, size and modification time in
+    nanoseconds of an input file, which a plan is only used for
+
+    Args:
+        input_filename(str): File path of the input
+
+    Returns:
+        dict
+    """
+    status = os.stat(input_filename)
+    return {'filename': os.path.basename(input_filename),
+            'size': status.st_size,
+            'modified': status.st_mtime_ns}
+
+def save_plan(profile, filename, input_filename):
+    """Function saves the execution plan of a profiled input file as JSON,
+    with the version of the rules it was made with and the profile
+
+    Args:
+        profile(CorpusProfile): Profile of the input file
+        filename(str): File path of the plan
+        input_filename(str): File path of the profiled input
+    """
+    with open(filename, 'w') as plan_file:
+        json.dump({'version': PLAN_VERSION,
+                   'input': input_version(input_filename),
+                   'rule_version': fingerprints.rule_version(profile.rules),
+                   'steps': profile.plan(),
+                   'profile': profile.as_dict()},
+                  plan_file,
+                  indent=2,
+                  sort_keys=True)
+
+def load_steps(filename, input_filename, rules):
+    """Function returns the steps of a saved execution plan, raising a
+    ValueError if the plan was made for a different file or rules
+
+    Args:
+        filename(str): File path of the plan
+        input_filename(str): File path of the input to convert
+        rules(rules.ExecutionPlan): Rules of the conversion
+
+    Returns:
+        tuple of step names
+    """
+    with open(filename) as plan_file:
+        plan = json.load(plan_file)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError("Unknown plan version in {}".format(filename))
+    if plan['rule_version'] != fingerprints.rule_version(rules):
+        raise ValueError(
+            "Plan {} was made with different rules".format(filename))
+    # A plan made for a different version of the file is stale, as with
+    # the .idx of marc_reader.MappedMARCReader
+    version = input_version(input_filename)
+    if (plan['input']['size'], plan['input']['modified']) != \
+       (version['size'], version['modified']):
+        raise ValueError(
+            "Plan {} was made for {}, not {}".format(filename,
+                                                     plan['input']['filename'],
+                                                     input_filename))
+    return tuple(plan['steps'])
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
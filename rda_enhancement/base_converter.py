@@ -11,9 +11,101 @@
 from pymarc import Field
 
 class BaseMARC21Conversion(object):
+    """Base class of the converters. Subclasses set self.record, the
+    conversion steps then look fields up by tag in an index of the record
+    built on first use instead of scanning the record's fields each time.
+
+    Attributes:
+        record: pymarc.Record or compact.CompactRecord
+        fields_by_tag: dict of tag to list of the record's fields, or None
+                       before it is built
+    """
 
     def __init__(self):
-        pass
+        self.record = None
+        self.fields_by_tag = None
+
+    def indexFields(self):
+        """Method builds the tag to fields index of the record in a single
+        pass over its fields"""
+        self.fields_by_tag = {}
+        for field in self.record.fields:
+            self.fields_by_tag.setdefault(field.tag, []).append(field)
+
+    def getFields(self, *tags):
+        """Method returns the record's fields with any of the tags, grouped
+        by tag in the order of the tags
+
+        Args:
+            tags(str): MARC tags
+
+        Returns:
+            list of pymarc.Field
+        """
+        if self.fields_by_tag is None:
+            self.indexFields()
+        if len(tags) == 1:
+            return list(self.fields_by_tag.get(tags[0], []))
+        fields = []
+        for tag in tags:
+            fields.extend(self.fields_by_tag.get(tag, []))
+        return fields
+
+    def hasField(self, tag):
+        """Method returns True if the record has a field with the tag"""
+        if self.fields_by_tag is None:
+            self.indexFields()
+        return len(self.fields_by_tag.get(tag, [])) > 0
+
+    def addField(self, field):
+        """Method adds a field to the end of the record and to the index
+
+        Args:
+            field(pymarc.Field): New field
+        """
+        if self.fields_by_tag is None:
+            self.indexFields()
+        self.record.add_field(field)
+        self.fields_by_tag.setdefault(field.tag, []).append(field)
+
+    def newField(self, tag, indicators=None, subfields=None, data=''):
+        """Method creates a field of the same kind as the record's fields,
+        a compact.CompactField for a compact.CompactRecord and otherwise a
+        pymarc.Field
+
+        Args:
+            tag(str): MARC tag
+            indicators(list): Indicators of a data field
+            subfields(list): Subfield codes and values of a data field
+            data(str): Data of a control field
+
+        Returns:
+            pymarc.Field or compact.CompactField
+        """
+        field_type = getattr(self.record, 'field_type', Field)
+        return field_type(tag,
+                          indicators=indicators,
+                          subfields=subfields,
+                          data=data)
+
+    def replaceField(self, field, new_field):
+        """Method replaces a field of the record with a new field in the
+        same position of the record and of the index
+
+        Args:
+            field(pymarc.Field): Field of the record
+            new_field(pymarc.Field): Field replacing it
+        """
+        if self.fields_by_tag is None:
+            self.indexFields()
+        fields = self.record.fields
+        fields[fields.index(field)] = new_field
+        tag_fields = self.fields_by_tag[field.tag]
+        if new_field.tag == field.tag:
+            tag_fields[tag_fields.index(field)] = new_field
+        else:
+            tag_fields.remove(field)
+            self.fields_by_tag.setdefault(new_field.tag, []).append(new_field)
 
     def __format245__(self, field245):
         """Method takes a 245 field from a MARC record and returns properly
@@ -32,13 +124,14 @@ class BaseMARC21Conversion(object):
         a_subfields = field245.get_subfields('a')
         indicator1,indicator2 = field245.indicators
         if len(a_subfields) > 0:
-            subfield_a = a_subfields[0]
+            subfield_a = a_subfields[0].strip()
             if len(subfield_a) > 0:
-                if ['.','\\'].count(subfield_a[-1]) > 0:
+                # Also strips the ' :' or ' /' added by a previous conversion
+                if ['.','\\',':','/'].count(subfield_a[-1]) > 0:
                     subfield_a = subfield_a[:-1].strip()
-        new245 = Field(tag='245',
-                       indicators=[indicator1,indicator2],
-                       subfields = ['a', u'{0} '.format(subfield_a)])
+        new245 = self.newField('245',
+                               indicators=[indicator1,indicator2],
+                               subfields = ['a', u'{0} '.format(subfield_a)])
         b_subfields = field245.get_subfields('b')
         c_subfields = field245.get_subfields('c')
         n_subfields = field245.get_subfields('n')
@@ -66,6 +159,33 @@ class BaseMARC21Conversion(object):
                 new245.add_subfield('c',subfield_c)
         return new245
 
+    def rewriteSubfields(self, field, rewrite):
+        """Method maps a function over a field's subfields in a single pass
+        and replaces the field's subfields once, keeping the original order
+        of the subfields. The function is called with each subfield's code
+        and value and returns the new value, or None to drop the subfield.
+
+        Args:
+            field(pymarc.Field): Field to rewrite
+            rewrite(function): Function taking a subfield code and value
+
+        Returns:
+            boolean, True if any subfield was changed or dropped
+        """
+        subfields, changed = [], False
+        for code, value in field:
+            new_value = rewrite(code, value)
+            if new_value is None:
+                changed = True
+                continue
+            if new_value != value:
+                changed = True
+            subfields.append(code)
+            subfields.append(new_value)
+        if changed:
+            field.subfields = subfields
+        return changed
+
 def main():
     pass
 
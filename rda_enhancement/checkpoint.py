@@ -0,0 +1,100 @@
+"""-------------------------------------------------------------------------------
+# Name:        checkpoint
+# Purpose:     Saves and loads the progress of a batch conversion so a run
+#              that fails partway through can resume where it left off
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+import json
+import os
+
+DEFAULT_CHECKPOINT_EVERY = 10000
+
+class Checkpoint(object):
+    """Progress of a batch conversion after the last record written to
+    the output file.
+
+    Attributes:
+        input_offset: byte offset of the next input record
+        record_count: number of the next input record
+        output_offset: size of the output file
+        error_count: number of records that failed to convert
+        quarantine_offset: size of the quarantine file of failed records
+        report_offset: size of the error report
+    """
+
+    def __init__(self,
+                 input_offset=0,
+                 record_count=0,
+                 output_offset=0,
+                 error_count=0,
+                 quarantine_offset=0,
+                 report_offset=0):
+        self.input_offset = input_offset
+        self.record_count = record_count
+        self.output_offset = output_offset
+        self.error_count = error_count
+        self.quarantine_offset = quarantine_offset
+        self.report_offset = report_offset
+
+    @classmethod
+    def load(cls, filename):
+        """Method loads a saved checkpoint
+
+        Args:
+            filename(str): Checkpoint file path
+
+        Returns:
+            Checkpoint or None if the file does not exist
+        """
+        if not os.path.exists(filename):
+            return None
+        with open(filename) as checkpoint_file:
+            return cls(**json.load(checkpoint_file))
+
+    def save(self, filename):
+        """Method atomically saves the checkpoint by writing and syncing a
+        temporary file before renaming it over the previous checkpoint
+
+        Args:
+            filename(str): Checkpoint file path
+        """
+        temp_filename = '{0}.tmp'.format(filename)
+        with open(temp_filename, 'w') as checkpoint_file:
+            json.dump(self.__dict__, checkpoint_file, sort_keys=True)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_filename, filename)
+
+    @staticmethod
+    def remove(filename):
+        """Method removes the checkpoint of a run that finished, so it can
+        not be resumed
+
+        Args:
+            filename(str): Checkpoint file path
+        """
+        if os.path.exists(filename):
+            os.remove(filename)
+
+def checkpoint_filename(output_filename):
+    """Function returns the checkpoint file path for an output file
+
+    Args:
+        output_filename(str): Path of the converted MARC21 file
+
+    Returns:
+        str
+    """
+    return '{0}.checkpoint'.format(output_filename)
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
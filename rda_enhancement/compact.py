@@ -0,0 +1,472 @@
+"""-------------------------------------------------------------------------------
+# Name:        compact
+# Purpose:     Compact record and field model for the RDA conversion that
+#              keeps the raw bytes of a MARC21 record and decodes each field,
+#              from UTF-8 or MARC-8, only when a conversion step reads it
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+import array
+import functools
+import logging
+import pymarc
+import re
+import warnings
+from pymarc.exceptions import BadSubfieldCodeWarning, BaseAddressInvalid
+from pymarc.exceptions import BaseAddressNotFound, NoFieldsFound
+from pymarc.exceptions import RecordDirectoryInvalid, RecordLeaderInvalid
+from pymarc.exceptions import TruncatedRecord
+from pymarc.record import normalize_subfield_code
+
+END_OF_FIELD = 0x1e
+SUBFIELD_INDICATOR = b'\x1f'
+
+# An empty subfield or a subfield code that is not ASCII, which pymarc drops
+# or normalizes when it decodes a field
+IRREGULAR_SUBFIELD_RE = re.compile(b'\x1f[\x1e\x1f\x80-\xff]')
+
+# Bytes that MARC-8 conversion changes, fields of a MARC-8 record without
+# them are the same bytes in MARC-8, Latin-1 and UTF-8
+MARC8_SPECIAL_RE = re.compile(b'[^\x1e\x1f\x20-\x7e]')
+
+def _normalize_tag(tag):
+    # Same as pymarc.Field, so '1' and ' 12' become '001' and '012'
+    if len(tag) == 3 and tag.isdigit():
+        return tag
+    try:
+        return '{0:03d}'.format(int(tag))
+    except ValueError:
+        return '{0:>3}'.format(tag)
+
+
+class CompactField(object):
+    """Field of a CompactRecord with the subset of the pymarc.Field API the
+    conversion steps use. A field read from a raw record only holds the
+    record's bytes and the byte range of its data, the indicators,
+    subfields and control field data are decoded on first use, and the
+    byte offset of each subfield delimiter is kept in a flat array instead
+    of splitting the field. A field whose subfields were never replaced is
+    written back as its original bytes.
+
+    Attributes:
+        tag: MARC tag
+        buffer: bytes of the raw record, None for a new or replaced field
+        start: byte offset of the field's data in the buffer
+        end: byte offset after the field's end of field byte
+        encoding: 'utf-8', 'marc-8' or 'iso8859-1', the encoding of the
+                  field's bytes
+    """
+
+    __slots__ = ('tag', 'buffer', 'start', 'end', 'encoding',
+                 '_offsets', '_indicators', '_subfields', '_data')
+
+    def __init__(self, tag, indicators=None, subfields=None, data=''):
+        self.tag = _normalize_tag(tag)
+        self.buffer, self.start, self.end = None, 0, 0
+        self.encoding = 'utf-8'
+        self._offsets = None
+        self._indicators, self._subfields, self._data = None, None, None
+        if self.is_control_field():
+            self._data = data
+        else:
+            self._indicators = [str(x) for x in (indicators or [])]
+            self._subfields = subfields or []
+
+    @classmethod
+    def from_buffer(cls, tag, buffer, start, end, encoding='utf-8'):
+        """Method creates a field from the byte range of its data in a raw
+        record, including the end of field byte, without decoding it. The
+        record must be valid in the encoding without irregular subfields,
+        see IRREGULAR_SUBFIELD_RE.
+
+        Args:
+            tag(str): MARC tag
+            buffer(bytes): Raw record
+            start(int): Byte offset of the field's data
+            end(int): Byte offset after the field's data
+            encoding(str): 'utf-8', 'marc-8' for a record in MARC-8, or
+                           'iso8859-1' for a MARC-8 record written by
+                           pymarc or marc_writer.serialize_record
+
+        Returns:
+            CompactField
+        """
+        field = cls.__new__(cls)
+        field.tag, field.buffer, field.start, field.end = tag, buffer, start, end
+        field.encoding = encoding
+        field._offsets = None
+        field._indicators, field._subfields, field._data = None, None, None
+        return field
+
+    def is_control_field(self):
+        return self.tag < '010' and self.tag.isdigit()
+
+    @property
+    def offsets(self):
+        """Byte offsets in the buffer of the field's subfield delimiters"""
+        if self._offsets is None:
+            self._offsets = array.array('I')
+            stop = self.end - 1
+            position = self.buffer.find(SUBFIELD_INDICATOR, self.start, stop)
+            while position > -1:
+                self._offsets.append(position)
+                position = self.buffer.find(SUBFIELD_INDICATOR,
+                                            position + 1,
+                                            stop)
+        return self._offsets
+
+    @property
+    def data(self):
+        if self._data is None and self.buffer is not None:
+            # pymarc reads the control fields of a MARC-8 record as Latin-1
+            self._data = self.buffer[self.start:self.end - 1].decode(
+                'utf-8' if self.encoding == 'utf-8' else 'iso8859-1')
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self.buffer = None
+
+    @property
+    def indicators(self):
+        if self._indicators is None and self.buffer is not None:
+            self._indicators = self.__decode_indicators__()
+        return self._indicators
+
+    @indicators.setter
+    def indicators(self, value):
+        self._indicators = value
+
+    @property
+    def indicator1(self):
+        return self.indicators[0]
+
+    @property
+    def indicator2(self):
+        return self.indicators[1]
+
+    @property
+    def subfields(self):
+        """Subfields as a pymarc style list of codes and values, decoded
+        once and then written from the list instead of the raw bytes"""
+        if self._subfields is None and self.buffer is not None:
+            self._subfields = [part for subfield in self.__iter_raw__()
+                               for part in subfield]
+        return self._subfields
+
+    @subfields.setter
+    def subfields(self, value):
+        self._indicators = self.indicators
+        self._subfields = value
+        self.buffer = None
+
+    def __decode_indicators__(self):
+        # Missing and extra indicators are handled the same way as pymarc
+        offsets = self.offsets
+        stop = offsets[0] if len(offsets) > 0 else self.end - 1
+        indicators = self.buffer[self.start:stop].decode('ascii')
+        if len(indicators) == 0:
+            logging.warning("missing indicators: %s",
+                            self.buffer[self.start:self.end - 1])
+        elif len(indicators) == 1:
+            logging.warning("only 1 indicator found: %s",
+                            self.buffer[self.start:self.end - 1])
+        elif len(indicators) > 2:
+            logging.warning("more than 2 indicators found: %s",
+                            self.buffer[self.start:self.end - 1])
+        indicators = indicators + '  '
+        return [indicators[0], indicators[1]]
+
+    def __iter_raw__(self):
+        offsets, buffer = self.offsets, self.buffer
+        if self.encoding == 'utf-8':
+            decode = bytes.decode
+        elif self.encoding == 'marc-8':
+            decode = pymarc.marc8_to_unicode
+        else:
+            decode = lambda value: value.decode(self.encoding)
+        for i, start in enumerate(offsets):
+            stop = offsets[i + 1] if i + 1 < len(offsets) else self.end - 1
+            if stop - start < 2:
+                continue
+            skip = 1
+            if buffer[start + 1] < 0x80:
+                code = chr(buffer[start + 1])
+            else:
+                warnings.warn(BadSubfieldCodeWarning())
+                code, skip = normalize_subfield_code(buffer[start + 1:stop])
+            value = buffer[start + 1 + skip:stop]
+            yield code, decode(value)
+
+    def __iter__(self):
+        """Iterates over the (code, value) pairs of the subfields, decoding
+        the values of an unchanged field without keeping them"""
+        if self.is_control_field():
+            return iter(())
+        if self._subfields is None and self.buffer is not None:
+            return self.__iter_raw__()
+        subfields = self._subfields
+        return iter([(subfields[i], subfields[i + 1])
+                     for i in range(0, len(subfields), 2)])
+
+    def __is_raw__(self):
+        # True when the raw bytes are exactly what encoding the decoded
+        # field would write
+        if self.buffer is None or self._subfields is not None:
+            return False
+        buffer, start, end = self.buffer, self.start, self.end
+        if end <= start or end > len(buffer) or buffer[end - 1] != END_OF_FIELD:
+            return False
+        if self.is_control_field():
+            return True
+        if end - start < 3 or buffer[start + 2] not in (0x1e, 0x1f):
+            return False
+        if self._indicators is None:
+            return 0x1f != buffer[start] < 0x80 and \
+                   0x1f != buffer[start + 1] < 0x80
+        return len(self._indicators) == 2 and \
+               (self._indicators[0] + self._indicators[1]).encode(
+                   'utf-8') == buffer[start:start + 2]
+
+    def as_marc(self, encoding):
+        """Method returns the field in transmission format, the original
+        bytes if the field is unchanged
+
+        Args:
+            encoding(str): Character encoding of the record
+
+        Returns:
+            bytes
+        """
+        if self.__is_raw__():
+            # Only ASCII is written the same in every encoding
+            if encoding == self.encoding or MARC8_SPECIAL_RE.search(
+                    self.buffer, self.start, self.end) is None:
+                return self.buffer[self.start:self.end]
+        if self.is_control_field():
+            return (self.data + '\x1e').encode(encoding)
+        marc = self.indicator1 + self.indicator2
+        for code, value in self:
+            marc += '\x1f' + code + value
+        return (marc + '\x1e').encode(encoding)
+
+    def get_subfields(self, *codes):
+        return [value for code, value in self if code in codes]
+
+    def add_subfield(self, code, value, pos=None):
+        subfields = self.subfields
+        if pos is None or (pos + 1) * 2 > len(subfields):
+            subfields.append(code)
+            subfields.append(value)
+        else:
+            subfields.insert(pos * 2, code)
+            subfields.insert(pos * 2 + 1, value)
+
+    def __contains__(self, code):
+        return len(self.get_subfields(code)) > 0
+
+    def __getitem__(self, code):
+        values = self.get_subfields(code)
+        return values[0] if len(values) > 0 else None
+
+    def __setitem__(self, code, value):
+        positions = [i for i in range(0, len(self.subfields), 2)
+                     if self.subfields[i] == code]
+        if len(positions) > 1:
+            raise KeyError("more than one code '{0}'".format(code))
+        elif len(positions) == 0:
+            raise KeyError("no code '{0}'".format(code))
+        self.subfields[positions[0] + 1] = value
+
+    def __str__(self):
+        if self.is_control_field():
+            return '={0}  {1}'.format(self.tag, self.data.replace(' ', '\\'))
+        text = '={0}  '.format(self.tag)
+        for indicator in self.indicators:
+            text += '\\' if indicator in (' ', '\\') else indicator
+        for code, value in self:
+            text += '${0}{1}'.format(code, value)
+        return text
+
+    def to_field(self):
+        """Method returns the field as a pymarc.Field"""
+        if self.is_control_field():
+            return pymarc.Field(tag=self.tag, data=self.data)
+        return pymarc.Field(tag=self.tag,
+                            indicators=list(self.indicators),
+                            subfields=[part for subfield in self
+                                       for part in subfield])
+
+def _decode_field(tag, buffer, start, end, encoding='utf-8'):
+    # Decodes every part of a field up front, the way pymarc decides
+    # between control and data fields on the tag before it is normalized
+    raw_field = CompactField.from_buffer(tag, buffer, start, end, encoding)
+    if raw_field.is_control_field():
+        return CompactField(tag, data=raw_field.data)
+    return CompactField(tag,
+                        indicators=raw_field.indicators,
+                        subfields=[part for subfield in
+                                   raw_field.__iter_raw__()
+                                   for part in subfield])
+
+def _marc8_field(tag, buffer, start, end):
+    # Fields of a MARC-8 record that are plain ASCII are read as UTF-8, the
+    # rest are converted from MARC-8 when they are first read or written
+    if MARC8_SPECIAL_RE.search(buffer, start, end) is None:
+        return CompactField.from_buffer(tag, buffer, start, end)
+    return CompactField.from_buffer(tag, buffer, start, end, 'marc-8')
+
+
+class CompactRecord(object):
+    """MARC21 record of CompactField objects used by the conversion in
+    place of pymarc.Record, with the parts of the pymarc.Record API the
+    conversion steps and marc_writer.serialize_record use. Converting to
+    and from pymarc.Record is left to the edges of the library.
+
+    Attributes:
+        leader: record leader as a str
+        fields: list of CompactField
+        force_utf8: always encode the record as UTF-8
+    """
+
+    __slots__ = ('leader', 'fields', 'force_utf8')
+
+    # Converters create new fields of the same kind as the record's
+    field_type = CompactField
+
+    def __init__(self, leader=' ' * 24, force_utf8=False):
+        self.leader = leader
+        self.fields = []
+        self.force_utf8 = force_utf8
+
+    @classmethod
+    def from_marc(cls, marc, encoding=None):
+        """Method reads a record in transmission format, checking the
+        leader and directory the same way pymarc.Record does but leaving
+        the fields undecoded. The fields of a MARC-8 record that are not
+        plain ASCII are converted to Unicode when they are first read, or
+        when the record is written if no step read them.
+
+        Args:
+            marc(bytes): Record in ISO 2709 transmission format
+            encoding(str): 'iso8859-1' reads a MARC-8 record written by
+                           marc_writer.serialize_record, defaults to the
+                           encoding in leader/09
+
+        Returns:
+            CompactRecord
+        """
+        marc = bytes(marc)
+        record = cls(marc[0:24].decode('ascii'))
+        if len(record.leader) != 24:
+            raise RecordLeaderInvalid
+        base_address = int(marc[12:17])
+        if base_address <= 0:
+            raise BaseAddressNotFound
+        if base_address >= len(marc):
+            raise BaseAddressInvalid
+        if len(marc) < int(record.leader[:5]):
+            raise TruncatedRecord
+        directory = marc[24:base_address - 1].decode('ascii')
+        if len(directory) % 12 != 0:
+            raise RecordDirectoryInvalid
+        # Checked once for the whole record instead of field by field,
+        # records that pymarc would repair are decoded up front
+        if encoding is None:
+            encoding = 'utf-8' if record.leader[9] == 'a' else 'marc-8'
+        decode = functools.partial(CompactField.from_buffer,
+                                   encoding=encoding)
+        if encoding == 'marc-8':
+            decode = _marc8_field
+        elif encoding == 'utf-8':
+            try:
+                marc[base_address:].decode('utf-8')
+            except UnicodeDecodeError:
+                decode = _decode_field
+        if IRREGULAR_SUBFIELD_RE.search(marc, base_address) is not None:
+            decode = _decode_field
+        for i in range(0, len(directory), 12):
+            tag = directory[i:i + 3]
+            start = base_address + int(directory[i + 7:i + 12])
+            end = start + int(directory[i + 3:i + 7])
+            if decode is _decode_field or len(tag) != 3 or not tag.isdigit():
+                record.fields.append(_decode_field(tag,
+                                                   marc,
+                                                   start,
+                                                   end,
+                                                   encoding))
+            else:
+                record.fields.append(decode(tag, marc, start, end))
+        if len(record.fields) < 1:
+            raise NoFieldsFound
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        """Method copies a pymarc.Record
+
+        Args:
+            record(pymarc.Record): MARC21 record
+
+        Returns:
+            CompactRecord
+        """
+        compact_record = cls(str(record.leader), record.force_utf8)
+        for field in record.fields:
+            if field.is_control_field():
+                compact_record.add_field(CompactField(field.tag,
+                                                      data=field.data))
+            else:
+                compact_record.add_field(
+                    CompactField(field.tag,
+                                 indicators=list(field.indicators),
+                                 subfields=list(field.subfields)))
+        return compact_record
+
+    def add_field(self, *fields):
+        self.fields.extend(fields)
+
+    def get_fields(self, *tags):
+        if len(tags) < 1:
+            return list(self.fields)
+        return [field for field in self.fields if field.tag in tags]
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def to_record(self):
+        """Method returns the record as a pymarc.Record
+
+        Returns:
+            pymarc.Record
+        """
+        record = pymarc.Record(force_utf8=self.force_utf8)
+        record.leader = self.leader
+        for field in self.fields:
+            record.add_field(field.to_field())
+        return record
+
+def decode_record(raw_record, encoding=None):
+    """Function reads a raw UTF-8 or MARC-8 record into a CompactRecord
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        encoding(str): Encoding of the record's fields, see
+                       CompactRecord.from_marc
+
+    Returns:
+        CompactRecord
+    """
+    return CompactRecord.from_marc(raw_record, encoding)
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+"""-------------------------------------------------------------------------------
+# Name:        dedup
+# Purpose:     Finds the records of a file that are duplicates of each other by
+#              their 001, ISBN (020) or standard identifier (024), so only one
+#              of each is converted
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import marc_reader
+except ImportError:
+    from . import marc_reader
+
+import array
+import collections
+import hashlib
+import os
+import re
+import sqlite3
+
+# 'first' keeps the first record of a set of duplicates, 'latest' the one
+# with the latest 005, the first of them when their 005s are the same
+POLICIES = ('first', 'latest')
+
+# Keys held in memory before they are spilled to the SQLite file
+DEFAULT_MAX_KEYS = 1000000
+
+# Most keys in one lookup query, below SQLite's variable limit
+LOOKUP_SIZE = 500
+
+# Records added to the key set at a time
+CHUNK_SIZE = 5000
+
+ISBN_RE = re.compile(r'^(?:97[89])?\d{9}[\dX]$')
+
+# 024 first indicator to the type of standard number, 7 gives it in $2
+STANDARD_NUMBERS = {'0': 'isrc',
+                    '1': 'upc',
+                    '2': 'ismn',
+                    '3': 'ean',
+                    '4': 'sici'}
+
+def normalize_isbn(value):
+    """Function returns an ISBN as its ISBN-13 digits, so the ISBN-10 and
+    ISBN-13 of a book are the same key
+
+    Args:
+        value(str): 020 $a, with any hyphens and qualifier
+
+    Returns:
+        str or None if the value is not an ISBN
+    """
+    words = value.split()
+    if len(words) < 1:
+        return None
+    isbn = words[0].replace('-', '').upper()
+    if ISBN_RE.match(isbn) is None:
+        return None
+    if len(isbn) == 13:
+        return isbn
+    isbn = '978' + isbn[:9]
+    check = sum(int(digit) * (3 if i % 2 else 1)
+                for i, digit in enumerate(isbn))
+    return isbn + str((10 - check % 10) % 10)
+
+def record_keys(raw_record, entries=None):
+    """Function returns the keys a raw record is matched to its duplicates
+    by and its 005, without decoding the record
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        entries(list): The record's directory if already read
+
+    Returns:
+        tuple of a list of (tag, key) and the 005 as a float, 0.0 if the
+        record has none
+    """
+    keys, stamp = [], 0.0
+    for tag, start, end in entries or marc_reader.read_directory(raw_record):
+        if tag not in ('001', '005', '020', '024'):
+            continue
+        data = bytes(raw_record[start:end - 1]).decode('utf-8', 'replace')
+        if tag == '001':
+            if len(data.strip()) > 0:
+                keys.append((tag, data.strip()))
+            continue
+        if tag == '005':
+            try:
+                stamp = float(data.strip())
+            except ValueError:
+                pass
+            continue
+        subfields = data.split(marc_reader.SUBFIELD_INDICATOR.decode())
+        values = [subfield[1:].strip() for subfield in subfields[1:]
+                  if subfield.startswith('a')]
+        if tag == '020':
+            keys.extend((tag, isbn) for isbn in map(normalize_isbn, values)
+                        if isbn is not None)
+            continue
+        source = STANDARD_NUMBERS.get(subfields[0][0:1])
+        if subfields[0][0:1] == '7':
+            source = next((subfield[1:].strip().lower()
+                           for subfield in subfields[1:]
+                           if subfield.startswith('2')), None)
+        if source is None:
+            continue
+        for value in values:
+            # DOIs are not case sensitive
+            if source == 'doi':
+                value = value.lower()
+            if len(value) > 0:
+                keys.append((tag, '{0}:{1}'.format(source, value)))
+    return keys, stamp
+
+def key_digest(tag, key):
+    """Function hashes a key to a signed 64-bit integer, which a set holds
+    in a fraction of the memory of the key and SQLite stores as an INTEGER
+
+    Args:
+        tag(str): Tag the key was read from
+        key(str): Value of the key
+
+    Returns:
+        int
+    """
+    digest = hashlib.sha1('{0}:{1}'.format(tag, key).encode('utf-8')).digest()
+    return int.from_bytes(digest[0:8], 'big', signed=True)
+
+
+class KeySet(object):
+    """Hashed keys of the records seen so far, each with the number of the
+    first record that had it. Up to max_keys keys are held in memory, after
+    which they are spilled to a SQLite file if one is given, so the keys of
+    a catalog sized file do not have to fit in memory.
+
+    Attributes:
+        spill_filename: SQLite file the keys are spilled to or None
+        max_keys: keys held in memory before spilling
+        spilled: keys in the SQLite file
+    """
+
+    def __init__(self, spill_filename=None, max_keys=DEFAULT_MAX_KEYS):
+        self.spill_filename = spill_filename
+        self.max_keys = max_keys
+        self.keys = {}
+        self.spilled = 0
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.keys) + self.spilled
+
+    def lookup(self, digests):
+        """Method returns the record of each of the digests that has been
+        added
+
+        Args:
+            digests(iterable): Key digests
+
+        Returns:
+            dict of digest to record number
+        """
+        found, missing = {}, []
+        for digest in digests:
+            if digest in self.keys:
+                found[digest] = self.keys[digest]
+            else:
+                missing.append(digest)
+        if self.connection is None:
+            return found
+        for start in range(0, len(missing), LOOKUP_SIZE):
+            lookup = missing[start:start + LOOKUP_SIZE]
+            found.update(self.connection.execute(
+                "SELECT digest, record FROM record_keys "
+                "WHERE digest IN ({0})".format(','.join('?' * len(lookup))),
+                lookup))
+        return found
+
+    def add(self, digest, record):
+        """Method adds a key digest with its record, keeping the record
+        already added if any
+
+        Args:
+            digest(int): Key digest
+            record(int): Record number
+        """
+        self.keys.setdefault(digest, record)
+        if self.spill_filename and len(self.keys) >= self.max_keys:
+            self.__spill__()
+
+    def __spill__(self):
+        if self.connection is None:
+            if os.path.exists(self.spill_filename):
+                os.remove(self.spill_filename)
+            self.connection = sqlite3.connect(self.spill_filename)
+            self.connection.execute("PRAGMA journal_mode=OFF")
+            self.connection.execute("PRAGMA synchronous=OFF")
+            self.connection.execute(
+                """CREATE TABLE record_keys (
+                       digest INTEGER PRIMARY KEY,
+                       record INTEGER NOT NULL)""")
+        cursor = self.connection.executemany(
+            "INSERT OR IGNORE INTO record_keys VALUES (?, ?)",
+            self.keys.items())
+        self.spilled += cursor.rowcount
+        self.connection.commit()
+        self.keys = {}
+
+    def close(self):
+        """Method closes and removes the spill file"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            os.remove(self.spill_filename)
+
+
+class Deduplicator(object):
+    """Groups the records of a file into sets of duplicates, records that
+    share a key directly or through other records, and picks the record of
+    each set that is kept by the policy. The sets are merged as the records
+    are added, so only the record numbers of the duplicates are held besides
+    the key set, and for the 'latest' policy the 005 of every record.
+
+    Attributes:
+        policy: one of POLICIES
+        records: number of records added
+        counts: Counter of tag to the duplicates matched by a key of it
+    """
+
+    def __init__(self,
+                 policy='first',
+                 spill_filename=None,
+                 max_keys=DEFAULT_MAX_KEYS):
+        if policy not in POLICIES:
+            raise ValueError(
+                "policy must be one of {0}".format(', '.join(POLICIES)))
+        self.policy = policy
+        self.key_set = KeySet(spill_filename, max_keys)
+        self.records = 0
+        self.first = None
+        self.parents = {}
+        self.tags = {}
+        self.stamps = array.array('d')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, first, raw_records):
+        """Method adds a chunk of consecutive records
+
+        Args:
+            first(int): Record number of the first record
+            raw_records(list): Raw records as bytes
+        """
+        if self.first is None:
+            self.first = first
+        chunk = []
+        for record, raw_record in enumerate(raw_records, first):
+            try:
+                keys, stamp = record_keys(raw_record)
+            except Exception:
+                # Malformed records are left for the conversion to report
+                keys, stamp = [], 0.0
+            chunk.append((record,
+                          [(tag, key_digest(tag, key)) for tag, key in keys]))
+            if self.policy == 'latest':
+                self.stamps.append(stamp)
+        # Keys of earlier chunks are looked up once for the whole chunk
+        seen = self.key_set.lookup(digest for record, keys in chunk
+                                   for tag, digest in keys)
+        for record, keys in chunk:
+            self.records += 1
+            roots = {}
+            for tag, digest in keys:
+                holder = seen.get(digest)
+                if holder is None:
+                    # Also found by the later records of the chunk after
+                    # the key set spills
+                    seen[digest] = record
+                    self.key_set.add(digest, record)
+                elif holder != record:
+                    roots.setdefault(self.__root__(holder), tag)
+            if len(roots) < 1:
+                continue
+            kept = self.__kept__(list(roots) + [record])
+            roots.setdefault(record, next(iter(roots.values())))
+            for root, tag in roots.items():
+                if root != kept:
+                    self.parents[root] = kept
+                    self.tags[root] = tag
+
+    def __root__(self, record):
+        path = []
+        while record in self.parents:
+            path.append(record)
+            record = self.parents[record]
+        for duplicate in path:
+            self.parents[duplicate] = record
+        return record
+
+    def __kept__(self, records):
+        if self.policy == 'first':
+            return min(records)
+        return max(records,
+                   key=lambda record: (self.stamps[record - self.first],
+                                       -record))
+
+    @property
+    def counts(self):
+        return collections.Counter(self.tags.values())
+
+    def duplicates(self):
+        """Method returns the duplicates found in the records added so far
+
+        Returns:
+            dict of the record number of each duplicate to the number of the
+            record kept in its place
+        """
+        return dict((record, self.__root__(record)) for record in self.parents)
+
+    def close(self):
+        self.key_set.close()
+
+def find_duplicates(raw_records,
+                    policy='first',
+                    first=0,
+                    spill_filename=None,
+                    max_keys=DEFAULT_MAX_KEYS):
+    """Function reads raw MARC21 records once and returns their duplicates,
+    see Deduplicator
+
+    Args:
+        raw_records(iterable): Raw ISO 2709 records as bytes
+        policy(str): One of POLICIES
+        first(int): Record number of the first record
+        spill_filename(str): SQLite file the keys are spilled to once there
+                             are more than max_keys, removed at the end
+        max_keys(int): Keys held in memory
+
+    Returns:
+        tuple of the duplicates, see Deduplicator.duplicates, and a Counter
+        of tag to the duplicates matched by a key of it
+    """
+    with Deduplicator(policy, spill_filename, max_keys) as deduplicator:
+        chunk = []
+        for raw_record in raw_records:
+            chunk.append(raw_record)
+            if len(chunk) >= CHUNK_SIZE:
+                deduplicator.add(first, chunk)
+                first += len(chunk)
+                chunk = []
+        deduplicator.add(first, chunk)
+        return deduplicator.duplicates(), deduplicator.counts
+
+def leave_out(raw_records, duplicates, first=0):
+    """Generator yields raw records with None in place of the duplicates,
+    so the records keep their numbers
+
+    Args:
+        raw_records(iterable): Raw ISO 2709 records as bytes
+        duplicates(dict): Record numbers of the duplicates
+        first(int): Record number of the first record
+
+    Yields:
+        bytes or None
+    """
+    for record, raw_record in enumerate(raw_records, first):
+        yield None if record in duplicates else raw_record
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
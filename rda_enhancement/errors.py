@@ -0,0 +1,221 @@
+"""-------------------------------------------------------------------------------
+# Name:        errors
+# Purpose:     Captures the records that fail the RDA conversion with the step
+#              and traceback of the failure, quarantines them and stops a run
+#              early when too many records fail
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import marc_reader
+except ImportError:
+    from . import marc_reader
+
+import json
+import os
+import traceback
+
+# Records converted before the error rate is checked against the threshold
+DEFAULT_MIN_RECORDS = 100
+
+class ConversionError(Exception):
+    """Error raised by a step of the conversion, raised from the original
+    error so its traceback is kept
+
+    Attributes:
+        step: name of the step, 'decode', 'encode' or a conversion step
+        error: name of the original error's class
+        message: message of the original error
+    """
+
+    def __init__(self, step, error):
+        super(ConversionError, self).__init__(
+            '{0} failed with {1}: {2}'.format(step,
+                                              type(error).__name__,
+                                              error))
+        self.step = step
+        self.error = type(error).__name__
+        self.message = str(error)
+
+
+class ErrorRateExceeded(RuntimeError):
+    """Raised when more of the records converted so far failed than the
+    fail fast threshold allows"""
+
+
+class RecordFailure(object):
+    """Record that failed to convert, small enough to send back from a
+    worker process in place of the converted record
+
+    Attributes:
+        record: number of the record in the input
+        control_number: 001 of the record or None
+        step: step that failed, None if not known
+        error: name of the error's class
+        message: message of the error
+        traceback: formatted traceback of the error
+        raw_record: bytes of the record as read
+    """
+
+    def __init__(self, record, raw_record, error):
+        self.record = record
+        self.raw_record = bytes(raw_record)
+        try:
+            self.control_number = marc_reader.control_number(self.raw_record)
+        except Exception:
+            self.control_number = None
+        self.step = getattr(error, 'step', None)
+        self.error = getattr(error, 'error', type(error).__name__)
+        self.message = getattr(error, 'message', str(error))
+        self.traceback = ''.join(traceback.format_exception(type(error),
+                                                            error,
+                                                            error.__traceback__))
+
+    def __eq__(self, other):
+        return isinstance(other, RecordFailure) and \
+               self.as_dict() == other.as_dict() and \
+               self.raw_record == other.raw_record
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.error, self.message)
+
+    def as_dict(self):
+        """Method returns the failure without the raw record for the error
+        report
+
+        Returns:
+            dict
+        """
+        return {'record': self.record,
+                'control_number': self.control_number,
+                'step': self.step,
+                'error': self.error,
+                'message': self.message,
+                'traceback': self.traceback}
+
+
+class ErrorReport(object):
+    """Writes each failed record as it was read to a quarantine MARC21 file
+    and its failure as a line of JSON to a report file, and counts the
+    failures of each step. With max_error_rate set, check() raises
+    ErrorRateExceeded once at least min_records records have been converted
+    and the share that failed is over the rate.
+
+    Attributes:
+        quarantine_file: binary file of the failed records or None
+        report_file: text file of the JSON failures or None
+        max_error_rate: fail fast threshold from 0.0 to 1.0 or None
+        min_records: records converted before the rate is checked
+        steps: dict of step to number of failures
+    """
+
+    def __init__(self,
+                 quarantine_filename=None,
+                 report_filename=None,
+                 max_error_rate=None,
+                 min_records=DEFAULT_MIN_RECORDS,
+                 quarantine_offset=None,
+                 report_offset=None):
+        self.quarantine_file = _open(quarantine_filename,
+                                     'b',
+                                     quarantine_offset)
+        self.report_file = _open(report_filename, '', report_offset)
+        self.max_error_rate = max_error_rate
+        self.min_records = min_records
+        self.steps = {}
+        self.failures = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, failure):
+        """Method quarantines a failed record and reports its failure
+
+        Args:
+            failure(RecordFailure): Failure of the record
+        """
+        step = failure.step or 'unknown'
+        self.steps[step] = self.steps.get(step, 0) + 1
+        self.failures += 1
+        if self.quarantine_file is not None:
+            self.quarantine_file.write(failure.raw_record)
+        if self.report_file is not None:
+            self.report_file.write(json.dumps(failure.as_dict(),
+                                              sort_keys=True))
+            self.report_file.write('\n')
+
+    def check(self, records):
+        """Method raises ErrorRateExceeded if the failures are over the
+        fail fast threshold
+
+        Args:
+            records(int): Number of records converted so far
+        """
+        if self.max_error_rate is None or records < self.min_records:
+            return
+        if self.failures > records * self.max_error_rate:
+            raise ErrorRateExceeded(
+                "{0} of {1} records failed, over the error rate of {2:.1%}, "
+                "by step: {3}".format(self.failures,
+                                      records,
+                                      self.max_error_rate,
+                                      self.steps))
+
+    def summary(self, records):
+        """Method returns the failures and failure rate of each step
+
+        Args:
+            records(int): Number of records converted
+
+        Returns:
+            dict of step to dict of failures and rate
+        """
+        return dict((step, {'failures': failures,
+                            'rate': failures / float(max(records, 1))})
+                    for step, failures in self.steps.items())
+
+    def offsets(self):
+        """Method flushes the files and returns their sizes for a checkpoint
+
+        Returns:
+            tuple of the quarantine and report file sizes, None for no file
+        """
+        sizes = []
+        for output_file in (self.quarantine_file, self.report_file):
+            if output_file is None:
+                sizes.append(None)
+                continue
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            sizes.append(output_file.tell())
+        return tuple(sizes)
+
+    def close(self):
+        for output_file in (self.quarantine_file, self.report_file):
+            if output_file is not None:
+                output_file.close()
+
+def _open(filename, mode, offset):
+    # Files of a resumed run are truncated back to their checkpoint
+    if filename is None:
+        return None
+    if offset is None or not os.path.exists(filename):
+        return open(filename, 'w' + mode)
+    output_file = open(filename, 'r+' + mode)
+    output_file.truncate(offset)
+    output_file.seek(offset)
+    return output_file
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""-------------------------------------------------------------------------------
+# Name:        fingerprints
+# Purpose:     Fingerprints the fields of a raw MARC21 record that the RDA
+#              conversion reads and hashes the whole record, keeping both in
+#              a SQLite store, so records unchanged since the last run with
+#              the same rules can be skipped
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import marc_reader
+    import pcc_conversion
+    import prefilter
+except ImportError:
+    from . import marc_reader
+    from . import pcc_conversion
+    from . import prefilter
+
+import hashlib
+import os
+import sqlite3
+
+# Most control numbers in one lookup query, below SQLite's variable limit
+LOOKUP_SIZE = 500
+
+def record_fingerprint(raw_record, tags=prefilter.CONVERSION_TAGS):
+    """Function returns the 001 of a raw record and a hash of the leader
+    positions and fields that the conversion reads, without decoding the
+    record
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        tags(set): Tags of the fields hashed
+
+    Returns:
+        tuple of the 001 or None and the fingerprint
+    """
+    digest = hashlib.sha1(raw_record[5:10])
+    entries = marc_reader.read_directory(raw_record)
+    for tag, start, end in entries:
+        if tag in tags:
+            digest.update(tag.encode('ascii'))
+            digest.update(raw_record[start:end])
+    return (marc_reader.control_number(raw_record, entries),
+            digest.hexdigest())
+
+def record_hash(raw_record):
+    """Function returns a hash of the whole of a raw record, which changes
+    when any of its fields change
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+
+    Returns:
+        str
+    """
+    return hashlib.sha1(raw_record).hexdigest()
+
+def rule_version(plan):
+    """Function returns the version of a conversion, which changes when the
+    rules or the conversion steps change
+
+    Args:
+        plan(rules.ExecutionPlan): Rules of the conversion
+
+    Returns:
+        str
+    """
+    steps = ','.join(pcc_conversion.PCCMARCtoRDAConversion.steps)
+    return hashlib.sha1('{0}:{1}'.format(plan.fingerprint,
+                                         steps).encode('utf-8')).hexdigest()
+
+
+class FingerprintStore(object):
+    """SQLite file of the 001, the fingerprints and the hashes of the whole
+    of the input and of the converted record and the rule version of each
+    record written by a run. Worker processes open the store read only to
+    look records up while the process writing the output adds to it.
+
+    Attributes:
+        filename: path of the SQLite file
+        rule_version: version of the conversion, see rule_version
+        tags: tags of the fields fingerprinted
+    """
+
+    def __init__(self,
+                 filename,
+                 rule_version,
+                 tags=prefilter.CONVERSION_TAGS,
+                 read_only=False):
+        self.filename = filename
+        self.rule_version = rule_version
+        self.tags = tags
+        self.pending = []
+        if read_only:
+            self.connection = sqlite3.connect(
+                'file:{0}?mode=ro'.format(filename),
+                uri=True)
+        else:
+            self.connection = sqlite3.connect(filename)
+            # Readers in the worker processes do not block the writer
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS fingerprints (
+                       control_number TEXT PRIMARY KEY,
+                       input_fingerprint TEXT NOT NULL,
+                       output_fingerprint TEXT NOT NULL,
+                       rule_version TEXT NOT NULL,
+                       input_hash TEXT,
+                       output_hash TEXT)""")
+            # Stores saved before the hashes were kept have no hash columns,
+            # their records are never skipped until they are added again
+            columns = [row[1] for row in self.connection.execute(
+                "PRAGMA table_info(fingerprints)")]
+            for column in ('input_hash', 'output_hash'):
+                if column not in columns:
+                    self.connection.execute(
+                        "ALTER TABLE fingerprints ADD COLUMN {0} TEXT".format(
+                            column))
+            self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+    def unchanged(self, raw_records, converted_only=False):
+        """Method returns the positions of the raw records that are the
+        same as the input or the converted record of a run with the same
+        rule version, by the hash of the whole record, so the output of that
+        run still holds them
+
+        Args:
+            raw_records(list): Raw records as bytes
+            converted_only(boolean): Only match the fingerprints of the
+                                     converted records, so every record
+                                     matched is already in its converted
+                                     form, whatever its other fields
+
+        Returns:
+            set of int
+        """
+        fingerprints = {}
+        for i, raw_record in enumerate(raw_records):
+            try:
+                control_number, fingerprint = record_fingerprint(raw_record,
+                                                                 self.tags)
+                if not converted_only:
+                    fingerprint = record_hash(raw_record)
+            except Exception:
+                # Malformed records are left for the conversion to report
+                continue
+            if control_number:
+                fingerprints.setdefault(control_number, []).append(
+                    (i, fingerprint))
+        control_numbers = list(fingerprints)
+        positions = set()
+        for start in range(0, len(control_numbers), LOOKUP_SIZE):
+            lookup = control_numbers[start:start + LOOKUP_SIZE]
+            rows = self.connection.execute(
+                """SELECT control_number, input_hash, {0}
+                   FROM fingerprints
+                   WHERE rule_version=? AND control_number IN ({1})""".format(
+                    'output_fingerprint' if converted_only else 'output_hash',
+                    ','.join('?' * len(lookup))),
+                [self.rule_version] + lookup)
+            for control_number, stored_input, stored_output in rows:
+                stored = set([stored_output])
+                if not converted_only:
+                    stored.add(stored_input)
+                positions.update(i for i, fingerprint
+                                 in fingerprints[control_number]
+                                 if fingerprint in stored)
+        return positions
+
+    def add(self, input_record, output_record):
+        """Method adds the fingerprints and hashes of a record and of its
+        converted record, records without a 001 are not added. Call commit()
+        to save the records added.
+
+        Args:
+            input_record(bytes): Raw record
+            output_record(bytes): Converted record
+        """
+        control_number, output_fingerprint = record_fingerprint(
+            output_record,
+            self.tags)
+        if control_number:
+            self.pending.append((control_number,
+                                 record_fingerprint(input_record,
+                                                    self.tags)[1],
+                                 output_fingerprint,
+                                 self.rule_version,
+                                 record_hash(input_record),
+                                 record_hash(output_record)))
+
+    def commit(self):
+        self.connection.executemany(
+            """INSERT OR REPLACE INTO fingerprints (
+                   control_number, input_fingerprint, output_fingerprint,
+                   rule_version, input_hash, output_hash)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            self.pending)
+        self.connection.commit()
+        self.pending = []
+
+    def close(self):
+        self.connection.close()
+
+# Stores opened by open_store, with the modification time and size of the
+# SQLite file when they were opened
+_STORES = {}
+
+def open_store(filename, plan):
+    """Function opens a store read only once in each process, and again
+    when the SQLite file has been changed or replaced, closing the store
+    opened before
+
+    Args:
+        filename(str): Path of the SQLite file
+        plan(rules.ExecutionPlan): Rules of the conversion
+
+    Returns:
+        FingerprintStore
+    """
+    status = os.stat(filename)
+    version = (status.st_mtime_ns, status.st_size)
+    key = (os.getpid(), filename, plan.fingerprint)
+    cached = _STORES.get(key)
+    if cached is not None:
+        if cached[0] == version:
+            return cached[1]
+        cached[1].close()
+    store = FingerprintStore(filename,
+                             rule_version(plan),
+                             prefilter.CONVERSION_TAGS | plan.tags,
+                             read_only=True)
+    _STORES[key] = (version, store)
+    return store
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
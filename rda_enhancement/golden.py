@@ -0,0 +1,279 @@
+"""-------------------------------------------------------------------------------
+# Name:        golden
+# Purpose:     Regression harness that converts a corpus of fixture records in
+#              parallel and diffs the output field by field against stored
+#              golden records
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import analyzer
+    import marc_reader
+    import marc_writer
+    import parallel
+    import pcc_conversion
+    import prefilter
+except ImportError:
+    from . import analyzer
+    from . import marc_reader
+    from . import marc_writer
+    from . import parallel
+    from . import pcc_conversion
+    from . import prefilter
+
+import collections
+import functools
+import gzip
+import multiprocessing
+import os
+import pymarc
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+GOLDEN_INPUT = os.path.join(FIXTURES, 'golden-input.mrc.gz')
+GOLDEN_EXPECTED = os.path.join(FIXTURES, 'golden-expected.mrc.gz')
+
+# Ways of converting a record, 'reference' is the full pymarc decode and
+# encode every other engine must match byte for byte
+ENGINES = ('reference', 'compact', 'fast', 'plan')
+
+FieldDifference = collections.namedtuple(
+    'FieldDifference',
+    ['tag', 'occurrence', 'expected', 'actual'])
+
+RecordDifference = collections.namedtuple(
+    'RecordDifference',
+    ['record', 'control_number', 'fields'])
+
+def read_records(filename):
+    """Generator yields the raw records of a MARC21 file, gzipped if its
+    name ends in .gz
+
+    Args:
+        filename(str): File path
+
+    Yields:
+        bytes
+    """
+    with _open(filename, 'rb') as marc_file:
+        for raw_record in marc_reader.iter_raw_records(marc_file):
+            yield raw_record
+
+def reference_convert(raw_record):
+    """Function converts a raw record the reference way, decoding all of it
+    into a pymarc.Record and encoding all of it again
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+
+    Returns:
+        bytes
+    """
+    record = pymarc.Record(data=raw_record, to_unicode=True)
+    pcc_conversion.PCCMARCtoRDAConversion(record).convert()
+    return marc_writer.serialize_record(record)
+
+def convert_record(raw_record, engine='fast', steps=None):
+    """Function converts a raw record with one of the ENGINES
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        engine(str): 'reference', 'compact' for a compact.CompactRecord,
+                     'fast' converts from the fields the prefilter reads
+                     and 'plan' only runs the steps given
+        steps(tuple): Steps of an analyzer plan for the 'plan' engine
+
+    Returns:
+        bytes
+    """
+    if engine == 'reference':
+        return reference_convert(raw_record)
+    if engine == 'compact':
+        return parallel.convert_raw_record(raw_record)
+    if engine == 'plan' and steps is None:
+        raise ValueError("The plan engine needs the steps of a plan")
+    marc = prefilter.convert_record(raw_record, steps=steps)
+    if marc is not None:
+        return marc
+    return parallel.convert_raw_record(raw_record, steps=steps)
+
+def diff_records(expected, actual):
+    """Function compares two raw records field by field and returns their
+    differences, none only when they are byte for byte the same
+
+    Args:
+        expected(bytes): Expected record
+        actual(bytes): Converted record
+
+    Returns:
+        list of FieldDifference, the tag is 'LDR' for the leader, apart from
+        the record length and base address, and None for a difference in
+        the bytes of records with the same fields
+    """
+    if expected == actual:
+        return []
+    expected_record = pymarc.Record(data=expected, to_unicode=True)
+    actual_record = pymarc.Record(data=actual, to_unicode=True)
+    differences = []
+    # The record length and base address follow from the fields
+    if _leader(expected_record) != _leader(actual_record):
+        differences.append(FieldDifference('LDR',
+                                           0,
+                                           str(expected_record.leader),
+                                           str(actual_record.leader)))
+    expected_fields = _fields_by_tag(expected_record)
+    actual_fields = _fields_by_tag(actual_record)
+    for tag in sorted(set(expected_fields) | set(actual_fields)):
+        expected_values = expected_fields.get(tag, [])
+        actual_values = actual_fields.get(tag, [])
+        for i in range(max(len(expected_values), len(actual_values))):
+            expected_value = expected_values[i] \
+                             if i < len(expected_values) else None
+            actual_value = actual_values[i] if i < len(actual_values) else None
+            if expected_value != actual_value:
+                differences.append(FieldDifference(tag,
+                                                   i,
+                                                   expected_value,
+                                                   actual_value))
+    if len(differences) < 1:
+        # Same fields in a different order or encoding
+        offset = next(i for i, (x, y) in enumerate(zip(expected, actual))
+                      if x != y) if len(expected) == len(actual) \
+                 else min(len(expected), len(actual))
+        differences.append(FieldDifference(None,
+                                           offset,
+                                           expected[offset:offset + 40],
+                                           actual[offset:offset + 40]))
+    return differences
+
+def _leader(record):
+    leader = str(record.leader)
+    return leader[5:12] + leader[17:]
+
+def _fields_by_tag(record):
+    fields = {}
+    for field in record.fields:
+        fields.setdefault(field.tag, []).append(str(field))
+    return fields
+
+def compare_chunk(chunk, engine='fast', steps=None):
+    """Function converts a numbered chunk of (input, expected) record pairs
+    and returns the differences of the records that do not match
+
+    Args:
+        chunk(tuple): Index of the first record and a list of pairs
+        engine(str): One of ENGINES
+        steps(tuple): Steps of an analyzer plan for the 'plan' engine
+
+    Returns:
+        list of RecordDifference
+    """
+    start, pairs = chunk
+    differences = []
+    for i, (raw_record, expected) in enumerate(pairs, start):
+        try:
+            control_number = marc_reader.control_number(raw_record)
+        except Exception:
+            control_number = None
+        try:
+            actual = convert_record(raw_record, engine, steps)
+            fields = diff_records(expected, actual)
+        except Exception as error:
+            fields = [FieldDifference(None,
+                                      0,
+                                      None,
+                                      '{0}: {1}'.format(type(error).__name__,
+                                                        error))]
+        if len(fields) > 0:
+            differences.append(RecordDifference(i, control_number, fields))
+    return differences
+
+def compare_corpus(input_filename=GOLDEN_INPUT,
+                   expected_filename=GOLDEN_EXPECTED,
+                   engine='fast',
+                   workers=1,
+                   chunk_size=parallel.DEFAULT_CHUNK_SIZE,
+                   shard=0,
+                   shards=1):
+    """Generator converts the records of a fixture corpus with an engine in
+    a pool of worker processes and yields the differences from the golden
+    records. Only the chunks of the corpus numbered shard modulo shards are
+    compared, so a large corpus can be split across several machines.
+
+    Args:
+        input_filename(str): Fixture records, gzipped or not
+        expected_filename(str): Golden records in the same order, or None
+                                to compare with the reference engine
+        engine(str): One of ENGINES
+        workers(int): Number of worker processes
+        chunk_size(int): Number of records sent to a worker at a time
+        shard(int): Number of the shard to compare
+        shards(int): Number of shards the corpus is split into
+
+    Yields:
+        RecordDifference
+    """
+    if engine not in ENGINES:
+        raise ValueError("engine must be one of {0}".format(', '.join(ENGINES)))
+    steps = None
+    if engine == 'plan':
+        steps = tuple(analyzer.analyze(read_records(input_filename)).plan())
+    if expected_filename is None:
+        expected_records = (reference_convert(raw_record)
+                            for raw_record in read_records(input_filename))
+    else:
+        expected_records = read_records(expected_filename)
+    pairs = zip(read_records(input_filename), expected_records)
+    chunks = (chunk for i, chunk in enumerate(parallel.chunk_records(
+                                                  pairs,
+                                                  chunk_size))
+              if i % shards == shard)
+    compare = functools.partial(compare_chunk, engine=engine, steps=steps)
+    if workers < 2:
+        for chunk in chunks:
+            for difference in compare(chunk):
+                yield difference
+        return
+    with multiprocessing.Pool(workers) as pool:
+        for differences in pool.imap(compare, chunks):
+            for difference in differences:
+                yield difference
+
+def save_golden(input_filename=GOLDEN_INPUT,
+                expected_filename=GOLDEN_EXPECTED):
+    """Function converts the fixture records with the reference engine and
+    saves them as the golden records, for after a deliberate change to the
+    conversion
+
+    Args:
+        input_filename(str): Fixture records, gzipped or not
+        expected_filename(str): Golden records, gzipped if the name ends
+                                in .gz
+
+    Returns:
+        int, number of records saved
+    """
+    count = 0
+    with _open(expected_filename, 'wb') as expected_file:
+        for raw_record in read_records(input_filename):
+            expected_file.write(reference_convert(raw_record))
+            count += 1
+    return count
+
+def _open(filename, mode):
+    # gzip files are written without a timestamp so saving the same golden
+    # records again leaves the file unchanged
+    if filename.endswith('.gz'):
+        return gzip.GzipFile(filename, mode, mtime=0)
+    return open(filename, mode)
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""-------------------------------------------------------------------------------
+# Name:        instrumentation
+# Purpose:     Collects per step timing and counters for the PCC RDA
+#              conversion and reports them as JSON or Prometheus text
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+import json
+import time
+
+timer = time.perf_counter
+
+class ConversionStats(object):
+    """Wall time, number of calls and number of fields modified for each
+    conversion step, aggregated over every record in a run. Stats from
+    worker processes are sent back with as_dict() and combined with merge().
+
+    Attributes:
+        steps: dict of step name to dict of calls, seconds and
+               fields_modified
+    """
+
+    def __init__(self, steps=None):
+        self.steps = {}
+        for name, counters in (steps or {}).items():
+            self.steps[name] = dict(counters)
+
+    def add(self, step, seconds, fields_modified=0):
+        """Method adds a call of a step
+
+        Args:
+            step(str): Step name
+            seconds(float): Wall time of the call
+            fields_modified(int): Number of fields the call changed
+        """
+        counters = self.steps.get(step)
+        if counters is None:
+            counters = self.steps[step] = {'calls': 0,
+                                           'seconds': 0.0,
+                                           'fields_modified': 0}
+        counters['calls'] += 1
+        counters['seconds'] += seconds
+        counters['fields_modified'] += fields_modified or 0
+
+    def count(self, step, counter, amount=1):
+        """Method adds to a counter of a step other than the calls, seconds
+        and fields modified, such as the hits of a cache
+
+        Args:
+            step(str): Step name
+            counter(str): Counter name
+            amount(int): Amount added to the counter
+        """
+        counters = self.steps.setdefault(
+            step,
+            {'calls': 0, 'seconds': 0.0, 'fields_modified': 0})
+        counters[counter] = counters.get(counter, 0) + amount
+
+    def merge(self, other):
+        """Method adds the counters of other stats to these stats
+
+        Args:
+            other(ConversionStats or dict): Stats or the as_dict() of stats
+        """
+        if isinstance(other, ConversionStats):
+            other = other.as_dict()
+        for name, counters in other.items():
+            mine = self.steps.setdefault(
+                name,
+                {'calls': 0, 'seconds': 0.0, 'fields_modified': 0})
+            for counter, value in counters.items():
+                mine[counter] = mine.get(counter, 0) + value
+
+    def as_dict(self):
+        return dict((name, dict(counters))
+                    for name, counters in self.steps.items())
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Method returns the stats in the Prometheus text exposition format
+
+        Returns:
+            str
+        """
+        metrics = (
+            ('calls', 'rda_conversion_step_calls_total',
+             'Number of calls of each conversion step'),
+            ('seconds', 'rda_conversion_step_seconds_total',
+             'Wall time spent in each conversion step'),
+            ('fields_modified', 'rda_conversion_step_fields_modified_total',
+             'Number of fields changed by each conversion step'))
+        lines = []
+        for counter, metric, description in metrics:
+            lines.append('# HELP {0} {1}'.format(metric, description))
+            lines.append('# TYPE {0} counter'.format(metric))
+            for name in sorted(self.steps):
+                lines.append('{0}{{step="{1}"}} {2}'.format(
+                    metric,
+                    name,
+                    self.steps[name][counter]))
+        extra_counters = sorted(set(
+            counter for counters in self.steps.values()
+            for counter in counters) - set(metric[0] for metric in metrics))
+        for counter in extra_counters:
+            metric = 'rda_conversion_step_{0}_total'.format(counter)
+            lines.append('# TYPE {0} counter'.format(metric))
+            for name in sorted(self.steps):
+                if counter in self.steps[name]:
+                    lines.append('{0}{{step="{1}"}} {2}'.format(
+                        metric,
+                        name,
+                        self.steps[name][counter]))
+        return '\n'.join(lines) + '\n'
+
+    def save(self, filename, format='json'):
+        """Method saves the stats to a file
+
+        Args:
+            filename(str): File path
+            format(str): 'json' or 'prometheus'
+        """
+        if format not in ('json', 'prometheus'):
+            raise ValueError("format must be 'json' or 'prometheus'")
+        with open(filename, 'w') as stats_file:
+            if format == 'prometheus':
+                stats_file.write(self.to_prometheus())
+            else:
+                stats_file.write(self.to_json())
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+"""-------------------------------------------------------------------------------
+# Name:        marc_formats
+# Purpose:     Streaming readers and writers of MARCXML and line delimited
+#              MARC-in-JSON for the RDA conversion
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import compact
+    import marc_writer
+except ImportError:
+    from . import compact
+    from . import marc_writer
+
+import itertools
+import json
+import pymarc
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+MARCXML_NAMESPACE = 'http://www.loc.gov/MARC21/slim'
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+             '<collection xmlns="{0}">\n'.format(MARCXML_NAMESPACE)
+XML_FOOTER = '</collection>\n'
+
+FORMATS = ('marc', 'xml', 'json')
+
+def detect_format(filename):
+    """Function detects the format of a MARC21 file from its first bytes
+
+    Args:
+        filename(str): File path
+
+    Returns:
+        str, 'marc', 'xml' or 'json'
+    """
+    with open(filename, 'rb') as marc_file:
+        start = marc_file.read(64).lstrip(b'\xef\xbb\xbf \t\r\n')
+    if start.startswith(b'<'):
+        return 'xml'
+    if start.startswith(b'{'):
+        return 'json'
+    return 'marc'
+
+def format_from_filename(filename):
+    """Function returns the output format for a file name's extension,
+    .xml is MARCXML, .json, .jsonl and .ndjson are MARC-in-JSON lines and
+    anything else is MARC21 transmission format"""
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension == 'xml':
+        return 'xml'
+    if extension in ('json', 'jsonl', 'ndjson'):
+        return 'json'
+    return 'marc'
+
+def _unicode_leader(leader):
+    # MARCXML and MARC-in-JSON are always Unicode
+    leader = '{0:<24}'.format(leader)
+    return leader[0:9] + 'a' + leader[10:24]
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def xml_to_record(element):
+    """Function creates a record from a MARCXML record element
+
+    Args:
+        element(Element): record element
+
+    Returns:
+        pymarc.Record
+    """
+    record = pymarc.Record(force_utf8=True)
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 'leader':
+            record.leader = _unicode_leader(child.text or '')
+        elif name == 'controlfield':
+            record.add_field(pymarc.Field(tag=child.get('tag'),
+                                          data=child.text or ''))
+        elif name == 'datafield':
+            subfields = []
+            for subfield in child:
+                subfields.append(subfield.get('code'))
+                subfields.append(subfield.text or '')
+            record.add_field(pymarc.Field(tag=child.get('tag'),
+                                          indicators=[child.get('ind1', ' '),
+                                                      child.get('ind2', ' ')],
+                                          subfields=subfields))
+    return record
+
+def iter_xml_records(xml_file):
+    """Generator parses a MARCXML file incrementally, clearing each record
+    element once it is read so memory use stays the same for any size of
+    file
+
+    Args:
+        xml_file(file): MARCXML file opened in binary mode
+
+    Yields:
+        pymarc.Record
+    """
+    context = ElementTree.iterparse(xml_file, events=('start', 'end'))
+    event, root = next(context)
+    for event, element in context:
+        if event == 'end' and _local_name(element.tag) == 'record':
+            yield xml_to_record(element)
+            root.clear()
+
+def json_to_record(marc_json):
+    """Function creates a record from a MARC-in-JSON object
+
+    Args:
+        marc_json(dict): MARC-in-JSON record
+
+    Returns:
+        pymarc.Record
+    """
+    record = pymarc.Record(force_utf8=True)
+    record.leader = _unicode_leader(marc_json.get('leader', ''))
+    for field in marc_json.get('fields', []):
+        for tag, value in field.items():
+            if not isinstance(value, dict):
+                record.add_field(pymarc.Field(tag=tag, data=value))
+                continue
+            subfields = []
+            for subfield in value.get('subfields', []):
+                for code, subfield_value in subfield.items():
+                    subfields.append(code)
+                    subfields.append(subfield_value)
+            record.add_field(pymarc.Field(tag=tag,
+                                          indicators=[value.get('ind1', ' '),
+                                                      value.get('ind2', ' ')],
+                                          subfields=subfields))
+    return record
+
+def iter_json_records(json_file):
+    """Generator reads line delimited MARC-in-JSON, one record a line
+
+    Args:
+        json_file(file): File opened in binary or text mode
+
+    Yields:
+        pymarc.Record
+    """
+    for line in json_file:
+        # json.loads only takes bytes from Python 3.6
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig')
+        if len(line.strip()) > 0:
+            yield json_to_record(json.loads(line))
+
+def record_to_xml(record):
+    """Function serializes a record as a MARCXML record element
+
+    Args:
+        record(pymarc.Record): MARC21 record
+
+    Returns:
+        str
+    """
+    lines = ['<record>',
+             '  <leader>{0}</leader>'.format(
+                 escape(_unicode_leader(str(record.leader))))]
+    for field in record.fields:
+        if field.is_control_field():
+            lines.append('  <controlfield tag={0}>{1}</controlfield>'.format(
+                quoteattr(field.tag),
+                escape(field.data)))
+            continue
+        lines.append('  <datafield tag={0} ind1={1} ind2={2}>'.format(
+            quoteattr(field.tag),
+            quoteattr(field.indicators[0]),
+            quoteattr(field.indicators[1])))
+        for i in range(0, len(field.subfields), 2):
+            lines.append('    <subfield code={0}>{1}</subfield>'.format(
+                quoteattr(field.subfields[i]),
+                escape(field.subfields[i+1])))
+        lines.append('  </datafield>')
+    lines.append('</record>\n')
+    return '\n'.join(lines)
+
+def record_to_json(record):
+    """Function returns a record as a MARC-in-JSON object
+
+    Args:
+        record(pymarc.Record): MARC21 record
+
+    Returns:
+        dict
+    """
+    fields = []
+    for field in record.fields:
+        if field.is_control_field():
+            fields.append({field.tag: field.data})
+            continue
+        fields.append({field.tag: {
+            'ind1': field.indicators[0],
+            'ind2': field.indicators[1],
+            'subfields': [{field.subfields[i]: field.subfields[i+1]}
+                          for i in range(0, len(field.subfields), 2)]}})
+    return {'leader': _unicode_leader(str(record.leader)), 'fields': fields}
+
+def iter_records(marc_file, format):
+    """Function returns a generator of the records of a MARCXML or
+    MARC-in-JSON file
+
+    Args:
+        marc_file(file): File opened in binary mode
+        format(str): 'xml' or 'json'
+
+    Yields:
+        pymarc.Record
+    """
+    if format == 'xml':
+        return iter_xml_records(marc_file)
+    if format == 'json':
+        return iter_json_records(marc_file)
+    raise ValueError("format must be 'xml' or 'json'")
+
+
+class StreamingMARCReader(object):
+    """Reads a MARCXML or MARC-in-JSON file in one pass as raw MARC21
+    records, standing in for marc_reader.MappedMARCReader in run.py. The
+    file can not be indexed, so offsets are record numbers.
+
+    Attributes:
+        filename: path of the file
+        format: 'xml' or 'json'
+    """
+
+    def __init__(self, filename, format):
+        if format not in ('xml', 'json'):
+            raise ValueError("format must be 'xml' or 'json'")
+        self.filename = filename
+        self.format = format
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def offset(self, number):
+        return number
+
+    def records(self, start=0, stop=None):
+        """Generator yields the records from start up to stop as raw
+        MARC21 records, records before start are parsed and skipped
+
+        Args:
+            start(int): Number of the first record
+            stop(int): Number of the record to stop before
+
+        Yields:
+            bytes
+        """
+        with open(self.filename, 'rb') as marc_file:
+            for record in itertools.islice(iter_records(marc_file,
+                                                        self.format),
+                                           start,
+                                           stop):
+                yield marc_writer.serialize_record(record, sort_fields=False)
+
+
+class FormatWriter(object):
+    """Writes raw MARC21 records as MARCXML or MARC-in-JSON lines through a
+    marc_writer.BufferedMARCWriter, with the same write, tell, flush and
+    close methods.
+
+    Attributes:
+        writer: marc_writer.BufferedMARCWriter of the output file
+        format: 'xml' or 'json'
+    """
+
+    def __init__(self, writer, format):
+        if format not in ('xml', 'json'):
+            raise ValueError("format must be 'xml' or 'json'")
+        self.writer = writer
+        self.format = format
+        if format == 'xml' and writer.tell() == 0:
+            writer.write(XML_HEADER.encode('utf-8'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, raw_record, encoding=None):
+        """Method writes a raw MARC21 record in the writer's format
+
+        Args:
+            raw_record(bytes): Record in ISO 2709 transmission format
+            encoding(str): 'marc-8' decodes a MARC-8 record with
+                           pymarc.marc8_to_unicode, by default a record
+                           with a MARC-8 leader is read as the Latin-1
+                           marc_writer.serialize_record writes a converted
+                           record in
+        """
+        if encoding is None and raw_record[9:10] != b'a':
+            encoding = 'iso8859-1'
+        self.write_record(compact.decode_record(raw_record, encoding))
+
+    def write_record(self, record):
+        """Method writes a pymarc.Record or compact.CompactRecord in the
+        writer's format"""
+        if self.format == 'xml':
+            self.writer.write(record_to_xml(record).encode('utf-8'))
+        else:
+            self.writer.write(
+                json.dumps(record_to_json(record),
+                           ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def tell(self):
+        return self.writer.tell()
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        """Method ends the MARCXML collection and closes the writer"""
+        if self.format == 'xml':
+            self.writer.write(XML_FOOTER.encode('utf-8'))
+        self.writer.close()
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""-------------------------------------------------------------------------------
+# Name:        marc_reader
+# Purpose:     Reads raw ISO 2709 MARC21 records without decoding them into
+#              pymarc objects
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+import array
+import mmap
+import os
+import struct
+from pymarc.exceptions import BaseAddressInvalid, RecordDirectoryInvalid
+from pymarc.exceptions import RecordLengthInvalid, TruncatedRecord
+
+END_OF_FIELD = b'\x1e'
+END_OF_RECORD = b'\x1d'
+SUBFIELD_INDICATOR = b'\x1f'
+INDEX_MAGIC = b'MRCIDX01'
+
+# Memory maps opened by RecordRange in this process, keyed by file name, with
+# the modification time and size of the file they map
+_MAPPINGS = {}
+
+def iter_raw_records(marc_file):
+    """Generator reads a file of MARC21 records in transmission format and
+    yields each record as bytes using the record length in the leader.
+
+    Args:
+        marc_file(file): File object opened in binary mode
+
+    Yields:
+        bytes
+    """
+    while True:
+        record_length = marc_file.read(5)
+        if len(record_length) < 1:
+            break
+        if len(record_length) < 5 or not record_length.isdigit():
+            raise RecordLengthInvalid
+        length = int(record_length)
+        if length < 5:
+            raise RecordLengthInvalid
+        remainder = marc_file.read(length - 5)
+        if len(remainder) < length - 5:
+            raise TruncatedRecord
+        yield record_length + remainder
+
+class MappedMARCReader(object):
+    """Memory maps a file of MARC21 records and builds an index of the byte
+    offset of every record from the record lengths in the leaders, giving
+    random access to records by record number. The index can be saved to
+    and loaded from a sidecar file so a large file is only scanned once.
+
+    Attributes:
+        filename: path of the MARC21 file
+        mapping: mmap of the file, None for an empty file
+        modified: modification time of the file in nanoseconds
+        offsets: array of the byte offset of each record
+        size: size of the file in bytes
+    """
+
+    def __init__(self, filename, index_filename=None, save_index=False):
+        self.filename = filename
+        self.size = os.path.getsize(filename)
+        self.modified = os.stat(filename).st_mtime_ns
+        self.mapping = None
+        if self.size > 0:
+            with open(filename, 'rb') as marc_file:
+                self.mapping = mmap.mmap(marc_file.fileno(),
+                                         0,
+                                         access=mmap.ACCESS_READ)
+        index_filename = index_filename or '{0}.idx'.format(filename)
+        self.offsets = self.__load_index__(index_filename)
+        if self.offsets is None:
+            self.offsets = self.__build_index__()
+            if save_index:
+                self.save_index(index_filename)
+
+    def __build_index__(self):
+        offsets = array.array('Q')
+        position = 0
+        while position < self.size:
+            record_length = self.mapping[position:position + 5]
+            if len(record_length) < 5 or not record_length.isdigit():
+                raise RecordLengthInvalid
+            length = int(record_length)
+            if length < 5:
+                raise RecordLengthInvalid
+            if position + length > self.size:
+                raise TruncatedRecord
+            offsets.append(position)
+            position += length
+        return offsets
+
+    def __load_index__(self, index_filename):
+        if not os.path.exists(index_filename):
+            return None
+        with open(index_filename, 'rb') as index_file:
+            header = index_file.read(24)
+            if len(header) < 24 or header[0:8] != INDEX_MAGIC:
+                return None
+            # An index saved for a different version of the file is stale
+            if struct.unpack('<QQ', header[8:24]) != (self.size, self.modified):
+                return None
+            offsets = array.array('Q')
+            offsets.frombytes(index_file.read())
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, number):
+        start, end = self.span(number)
+        return self.mapping[start:end]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+    def save_index(self, index_filename=None):
+        """Method saves the record offsets to a sidecar index file, written
+        to a temporary file first so a partial index is never left behind
+
+        Args:
+            index_filename(str): Defaults to the MARC file name with .idx
+        """
+        index_filename = index_filename or '{0}.idx'.format(self.filename)
+        temp_filename = '{0}.tmp'.format(index_filename)
+        with open(temp_filename, 'wb') as index_file:
+            index_file.write(INDEX_MAGIC)
+            index_file.write(struct.pack('<QQ', self.size, self.modified))
+            index_file.write(self.offsets.tobytes())
+        os.replace(temp_filename, index_filename)
+
+    def offset(self, number):
+        """Method returns the byte offset of a record, or the size of the
+        file for the record number after the last record
+
+        Args:
+            number(int): Record number, starting at 0
+
+        Returns:
+            int
+        """
+        if number >= len(self.offsets):
+            return self.size
+        return self.offsets[number]
+
+    def span(self, number):
+        """Method returns the start and end byte offsets of a record
+
+        Args:
+            number(int): Record number, starting at 0
+
+        Returns:
+            tuple of (start, end)
+        """
+        if number < 0:
+            number += len(self.offsets)
+        start = self.offsets[number]
+        if number + 1 < len(self.offsets):
+            return start, self.offsets[number + 1]
+        return start, self.size
+
+    def view(self, number):
+        """Method returns a zero-copy memoryview of a record's bytes
+
+        Args:
+            number(int): Record number, starting at 0
+
+        Returns:
+            memoryview
+        """
+        start, end = self.span(number)
+        return memoryview(self.mapping)[start:end]
+
+    def records(self, start=0, stop=None):
+        """Generator yields the raw records from record number start up to,
+        but not including, record number stop
+
+        Args:
+            start(int): First record number
+            stop(int): Record number to stop at, defaults to the last record
+
+        Yields:
+            bytes
+        """
+        stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+        for number in range(start, stop):
+            yield self[number]
+
+    def ranges(self, chunk_size, start=0, stop=None):
+        """Generator splits the records from start to stop into contiguous
+        byte ranges of chunk_size records that worker processes read from
+        their own memory map of the file instead of being sent the bytes
+
+        Args:
+            chunk_size(int): Number of records in each range
+            start(int): First record number
+            stop(int): Record number to stop at, defaults to the last record
+
+        Yields:
+            tuple of (number of first record, RecordRange)
+        """
+        stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+        for first in range(start, stop, chunk_size):
+            last = min(first + chunk_size, stop) - 1
+            yield first, RecordRange(self.filename,
+                                     self.span(first)[0],
+                                     self.span(last)[1],
+                                     (self.modified, self.size))
+
+
+class RecordRange(object):
+    """Contiguous byte range of records in a MARC21 file that is cheap to
+    send to another process. Iterating the range memory maps the file once
+    per process and yields the records in the range, raising a ValueError
+    if the file is no longer the version the offsets were read from.
+
+    Attributes:
+        filename: path of the MARC21 file
+        start: byte offset of the first record
+        end: byte offset after the last record
+        version: modification time in nanoseconds and size of the file
+    """
+
+    def __init__(self, filename, start, end, version):
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.version = version
+
+    def __iter__(self):
+        mapping = _open_mapping(self.filename, self.version)
+        position = self.start
+        while position < self.end:
+            length = int(mapping[position:position + 5])
+            yield mapping[position:position + length]
+            position += length
+
+
+def _open_mapping(filename, version):
+    # The offsets of a range are only good for the version of the file they
+    # were read from, a map of an earlier version is closed
+    status = os.stat(filename)
+    if (status.st_mtime_ns, status.st_size) != tuple(version):
+        raise ValueError(
+            "{0} has changed since its records were indexed".format(
+                filename))
+    cached = _MAPPINGS.get(filename)
+    if cached is not None:
+        if cached[0] == version:
+            return cached[1]
+        cached[1].close()
+        del _MAPPINGS[filename]
+    with open(filename, 'rb') as marc_file:
+        mapping = mmap.mmap(marc_file.fileno(), 0, access=mmap.ACCESS_READ)
+    _MAPPINGS[filename] = (version, mapping)
+    return mapping
+
+def read_directory(raw_record):
+    """Function reads the directory of a raw MARC21 record and returns the
+    tag and the byte range of each field's data in the record, including
+    the field's end of field byte.
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+
+    Returns:
+        list of (tag, start, end) tuples
+    """
+    base_address = int(raw_record[12:17])
+    if base_address <= 24 or base_address > len(raw_record):
+        raise BaseAddressInvalid
+    directory = raw_record[24:base_address - 1]
+    if len(directory) % 12 != 0:
+        raise RecordDirectoryInvalid
+    entries = []
+    for i in range(0, len(directory), 12):
+        entry = directory[i:i+12]
+        start = base_address + int(entry[7:12])
+        entries.append((entry[0:3].decode('ascii'),
+                        start,
+                        start + int(entry[3:7])))
+    return entries
+
+def control_number(raw_record, entries=None):
+    """Function returns the 001 of a raw MARC21 record without decoding the
+    rest of the record
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        entries(list): The record's directory if already read
+
+    Returns:
+        str or None if the record has no 001
+    """
+    for tag, start, end in entries or read_directory(raw_record):
+        if tag == '001':
+            return raw_record[start:end - 1].decode('utf-8',
+                                                    'replace').strip()
+    return None
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""-------------------------------------------------------------------------------
+# Name:        marc_writer
+# Purpose:     Serializes MARC21 records into a reusable buffer and writes
+#              them to the output file in large blocks
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+import queue
+import threading
+from pymarc.field import RawField
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+def serialize_record(record, sort_fields=True):
+    """Function serializes a record to ISO 2709 transmission format the same
+    way pymarc.Record.as_marc() does, optionally with its fields sorted by
+    tag, without copying the fields into a new Record
+
+    Args:
+        record(pymarc.Record): MARC21 record
+        sort_fields(boolean): Write the fields in tag order
+
+    Returns:
+        bytes
+    """
+    leader = str(record.leader)
+    if leader[9] == 'a' or getattr(record, 'force_utf8', False):
+        encoding = 'utf-8'
+    else:
+        encoding = 'iso8859-1'
+    fields = record.fields
+    if sort_fields:
+        fields = sorted(fields, key=lambda x: x.tag)
+    directory, data, offset = [], [], 0
+    for field in fields:
+        if isinstance(field, RawField):
+            field_data = field.as_marc()
+        else:
+            field_data = field.as_marc(encoding)
+        directory.append('{0:>3}{1:04d}{2:05d}'.format(field.tag,
+                                                       len(field_data),
+                                                       offset))
+        data.append(field_data)
+        offset += len(field_data)
+    directory = (''.join(directory) + '\x1e').encode(encoding)
+    base_address = 24 + len(directory)
+    record_length = base_address + offset + 1
+    leader = '{0:05d}{1}{2:05d}{3}'.format(record_length,
+                                           leader[5:12],
+                                           base_address,
+                                           leader[17:])
+    return leader.encode(encoding) + directory + b''.join(data) + b'\x1d'
+
+
+class BufferedMARCWriter(object):
+    """Collects serialized records in a reusable buffer and writes the
+    buffer to the output file once it holds buffer_size bytes. With
+    background set, full buffers are written by a separate thread so disk
+    I/O overlaps with converting the next records.
+
+    Attributes:
+        marc_file: output file opened in binary mode
+        buffer_size: number of bytes collected before a write
+        position: byte position in the output after every record written
+    """
+
+    def __init__(self,
+                 marc_file,
+                 buffer_size=DEFAULT_BUFFER_SIZE,
+                 background=False):
+        self.marc_file = marc_file
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.position = marc_file.tell()
+        self.blocks = None
+        self.error = None
+        if background:
+            self.blocks = queue.Queue(maxsize=4)
+            self.thread = threading.Thread(target=self.__write_blocks__)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def __write_blocks__(self):
+        while True:
+            block = self.blocks.get()
+            try:
+                if block is None:
+                    return
+                if self.error is None:
+                    self.marc_file.write(block)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.blocks.task_done()
+
+    def __check__(self):
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __write_buffer__(self):
+        if len(self.buffer) < 1:
+            return
+        if self.blocks is None:
+            self.marc_file.write(self.buffer)
+            del self.buffer[:]
+        else:
+            self.__check__()
+            self.blocks.put(bytes(self.buffer))
+            del self.buffer[:]
+
+    def write(self, raw_record):
+        """Method adds a serialized record to the buffer
+
+        Args:
+            raw_record(bytes): Record in ISO 2709 transmission format
+        """
+        self.buffer += raw_record
+        self.position += len(raw_record)
+        if len(self.buffer) >= self.buffer_size:
+            self.__write_buffer__()
+
+    def write_record(self, record):
+        """Method serializes a pymarc.Record, with its fields sorted by tag,
+        into the buffer
+
+        Args:
+            record(pymarc.Record): MARC21 record
+        """
+        self.write(serialize_record(record))
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        """Method writes the buffer and waits for the background thread to
+        write every block it has been given"""
+        self.__write_buffer__()
+        if self.blocks is not None:
+            self.blocks.join()
+            self.__check__()
+        self.marc_file.flush()
+
+    def close(self):
+        """Method flushes the writer and stops the background thread, the
+        output file is left open for its owner to close"""
+        try:
+            self.flush()
+        finally:
+            if self.blocks is not None:
+                self.blocks.put(None)
+                self.thread.join()
+                self.blocks = None
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""-------------------------------------------------------------------------------
+# Name:        parallel
+# Purpose:     Runs the PCC RDA conversion over chunks of raw MARC21 records
+#              in a pool of worker processes
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import compact
+    import errors
+    import fingerprints
+    import instrumentation
+    import marc_writer
+    import pcc_conversion
+    import prefilter
+    import rules
+except ImportError:
+    from . import compact
+    from . import errors
+    from . import fingerprints
+    from . import instrumentation
+    from . import marc_writer
+    from . import pcc_conversion
+    from . import prefilter
+    from . import rules
+
+import collections
+import functools
+import multiprocessing
+import queue
+
+DEFAULT_CHUNK_SIZE = 500
+
+def chunk_records(raw_records, chunk_size=DEFAULT_CHUNK_SIZE, first=0):
+    """Generator groups raw MARC21 records into numbered chunks so that each
+    record keeps its position in the input file.
+
+    Args:
+        raw_records(iterable): Raw ISO 2709 records as bytes
+        chunk_size(int): Number of records in each chunk
+        first(int): Record number of the first record
+
+    Yields:
+        tuple of (index of first record, list of bytes)
+    """
+    chunk, start = [], first
+    for i, raw_record in enumerate(raw_records, first):
+        if len(chunk) < 1:
+            start = i
+        chunk.append(raw_record)
+        if len(chunk) >= chunk_size:
+            yield start, chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield start, chunk
+
+@functools.lru_cache(maxsize=None)
+def load_plan(rules_filename=None, cache_size=0):
+    """Function compiles the rules once in each process, see
+    rules.load_plan"""
+    return rules.load_plan(rules_filename, cache_size)
+
+def convert_raw_record(raw_record, stats=None, rules=None, steps=None):
+    """Function reads a raw MARC21 record into a compact.CompactRecord,
+    runs the PCC RDA conversion on it and returns the converted record with
+    its fields sorted by tag. Only the fields the conversion reads are
+    decoded, the rest are written back as they were read. Failures are
+    raised as an errors.ConversionError naming the step that failed.
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        stats(instrumentation.ConversionStats): Optional stats that the
+            decode, conversion steps and encode are timed into
+        rules(rules.ExecutionPlan): Rules of the conversion, defaults to
+                                    the PCC rules
+        steps(iterable): Steps of the conversion, defaults to all of them
+
+    Returns:
+        bytes
+    """
+    start = instrumentation.timer()
+    try:
+        record = compact.decode_record(raw_record)
+    except Exception as error:
+        raise errors.ConversionError('decode', error) from error
+    if stats is not None:
+        stats.add('decode', instrumentation.timer() - start)
+    converter = pcc_conversion.PCCMARCtoRDAConversion(record,
+                                                       stats,
+                                                       rules,
+                                                       steps)
+    converter.convert()
+    start = instrumentation.timer()
+    try:
+        marc = marc_writer.serialize_record(converter.record)
+    except Exception as error:
+        raise errors.ConversionError('encode', error) from error
+    if stats is not None:
+        stats.add('encode', instrumentation.timer() - start)
+    return marc
+
+def convert_chunk(chunk,
+                  fast_path=True,
+                  instrument=False,
+                  rules_filename=None,
+                  cache_size=0,
+                  fingerprints_filename=None,
+                  unchanged='skip',
+                  steps=None):
+    """Converts a numbered chunk of raw records, capturing the error of any
+    record that fails instead of failing the whole chunk.
+
+    Args:
+        chunk(tuple): Index of first record and a list of raw records or
+                      a marc_reader.RecordRange, None in place of a record
+                      leaves it out like an unchanged record
+        fast_path(boolean): Convert records from the fields the
+                            conversion reads, copying the ones it would not
+                            change through, see prefilter.convert_record
+        instrument(boolean): Collect per step stats for the chunk
+        rules_filename(str): Local rule spec run after the PCC rules
+        cache_size(int): Rewritten subfield values cached in each process
+        fingerprints_filename(str): fingerprints.FingerprintStore of the
+                                    records converted by earlier runs
+        unchanged(str): 'skip' leaves records unchanged since they were
+                        added to the fingerprint store out, with no bytes
+                        and no error in their result, 'copy' copies the
+                        ones already converted through
+        steps(tuple): Steps of the conversion from an analyzer plan,
+                      defaults to all of them
+
+    Returns:
+        tuple of a list of (record index, converted bytes or None,
+        errors.RecordFailure or None) and the chunk's stats as a dict, or
+        None if not instrumented
+    """
+    start, raw_records = chunk
+    stats = instrumentation.ConversionStats() if instrument else None
+    plan = load_plan(rules_filename, cache_size)
+    if plan.cache is not None:
+        hits, misses = plan.cache.hits, plan.cache.misses
+    unchanged_records = set()
+    if fingerprints_filename is not None:
+        started = instrumentation.timer()
+        raw_records = list(raw_records)
+        store = fingerprints.open_store(fingerprints_filename, plan)
+        unchanged_records = store.unchanged(raw_records,
+                                            unchanged == 'copy')
+        if stats is not None:
+            stats.add('fingerprint', instrumentation.timer() - started)
+            stats.count('fingerprint', 'unchanged', len(unchanged_records))
+    results = []
+    for offset, raw_record in enumerate(raw_records):
+        try:
+            if raw_record is None:
+                results.append((start + offset, None, None))
+                continue
+            if offset in unchanged_records:
+                results.append((start + offset,
+                                raw_record if unchanged == 'copy' else None,
+                                None))
+                continue
+            if fast_path:
+                started = instrumentation.timer()
+                marc = prefilter.convert_record(raw_record,
+                                                plan,
+                                                steps,
+                                                stats)
+                if stats is not None:
+                    # Records copied through or left for the full
+                    # conversion are not modified by the prefilter
+                    stats.add('prefilter',
+                              instrumentation.timer() - started,
+                              int(marc is not None and
+                                  marc is not raw_record))
+                    if marc is None:
+                        stats.count('prefilter', 'fallbacks')
+                if marc is not None:
+                    results.append((start + offset, marc, None))
+                    continue
+            results.append((start + offset,
+                            convert_raw_record(raw_record,
+                                               stats,
+                                               plan,
+                                               steps),
+                            None))
+        except Exception as error:
+            results.append((start + offset,
+                            None,
+                            errors.RecordFailure(start + offset,
+                                                 raw_record,
+                                                 error)))
+    if stats is not None and plan.cache is not None:
+        stats.count('rule_cache', 'hits', plan.cache.hits - hits)
+        stats.count('rule_cache', 'misses', plan.cache.misses - misses)
+    return results, None if stats is None else stats.as_dict()
+
+def convert_chunks(chunks,
+                   workers,
+                   order='input',
+                   max_pending=None,
+                   **options):
+    """Generator sends chunks to a pool of worker processes and yields the
+    converted chunks. At most max_pending chunks are in flight so a large
+    input file is never read into memory all at once.
+
+    Args:
+        chunks(iterable): Numbered chunks from chunk_records
+        workers(int): Number of worker processes
+        order(str): 'input' yields chunks in input order, 'completion' yields
+                    each chunk as soon as a worker finishes it
+        max_pending(int): Chunks in flight, defaults to twice the workers
+        options: fast_path, instrument and the other keyword arguments
+                 of convert_chunk
+
+    Yields:
+        results and stats of each chunk, see convert_chunk
+    """
+    if order not in ('input', 'completion'):
+        raise ValueError("order must be 'input' or 'completion'")
+    max_pending = max_pending or workers * 2
+    worker = functools.partial(convert_chunk, **options)
+    pool = multiprocessing.Pool(workers)
+    try:
+        if order == 'input':
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(worker, (chunk,)))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().get()
+            while len(pending) > 0:
+                yield pending.popleft().get()
+        else:
+            finished, in_flight = queue.Queue(), 0
+            for chunk in chunks:
+                pool.apply_async(worker, (chunk,),
+                                 callback=finished.put,
+                                 error_callback=finished.put)
+                in_flight += 1
+                if in_flight >= max_pending:
+                    yield _completed(finished.get())
+                    in_flight -= 1
+            while in_flight > 0:
+                yield _completed(finished.get())
+                in_flight -= 1
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _completed(result):
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -13,8 +13,14 @@
 
 try:
     import base_converter
+    import errors
+    import instrumentation
+    import rules
 except ImportError:
     from . import base_converter
+    from . import errors
+    from . import instrumentation
+    from . import rules
 
 import pymarc
 import re
@@ -71,117 +77,150 @@ RDA_MEDIA = {
         'code': 'v'},
     'k': {'term': 'unmediated', 'code': 'n'}, 'h': {'term': 'microform', 'code': 'h'}, 'm': {'term': 'projected', 'code': 'g'}, 'z': {'term': 'other', 'code': 'x'}, 's': {'term': 'audio', 'code': 's'}}
 
+def _prototype(tag, rda_type, source):
+    return (tag, ('a', rda_type.get('term').strip(),
+                  'b', rda_type.get('code'),
+                  '2', source))
+
+# Immutable (tag, subfields) prototypes of every 33X field the conversion
+# creates, keyed by leader/06, 007/00 and (007/00, 007/01)
+RDA_CONTENT_FIELDS = dict(
+    (type_of, _prototype('336', content_type, 'rdacontent'))
+    for type_of, content_type in RDA_CONTENT_LOOKUP.items())
+
+RDA_MEDIA_FIELDS = dict(
+    (type_of, _prototype('337', media_type, 'rdamedia'))
+    for type_of, media_type in RDA_MEDIA.items())
+
+RDA_CARRIER_FIELDS = dict(
+    ((type_of, material), _prototype('338', carrier_type, 'rdacarrier'))
+    for type_of, carrier_types in RDA_CARRIER_TYPES.items()
+    for material, carrier_type in carrier_types.items())
+
+def new_field(prototype, field_type=pymarc.Field):
+    """Function creates a new field from a field prototype
+
+    Args:
+        prototype(tuple): Tag and subfields
+        field_type(callable): pymarc.Field, compact.CompactField or the
+                              newField method of a converter
+
+    Returns:
+        pymarc.Field or compact.CompactField
+    """
+    tag, subfields = prototype
+    return field_type(tag,
+                      indicators=[' ', ' '],
+                      subfields=list(subfields))
+
+ELLIPSIS_ET_AL_RE = re.compile(r"\u2026 \[et al.\]")
+
+# Rules of the PCC recommendations compiled once for every conversion
+PCC_PLAN = rules.load_plan()
+
+# Tags converted by the rule plan in convert264, convert300 and convert500s,
+# rules for any other tag are run by convertLocalRules
+PCC_RULE_TAGS = frozenset(['264', '300', '500', '501', '502', '504'])
+
 class PCCMARCtoRDAConversion(base_converter.BaseMARC21Conversion):
     """Placeholder for class summary
 
     Attributes:
         record: pymarc.Record
+        stats: instrumentation.ConversionStats or None
+        rules: rules.ExecutionPlan of the abbreviation and indicator rules
+        steps: names of the steps convert() runs
     """
 
-    pages_re = re.compile(r"p\.")
-    volumes_re = re.compile(r"v\.")
-    illus_re = re.compile(r"illus|ill\.")
-    facsim_re = re.compile(r"facsims.")
-    sound_re = re.compile(r"sd.")
-    approx_re = re.compile(r"ca\.")
-
-    def __init__(self, marc_record):
+    # Conversion steps in the order convert() runs them, each step returns
+    # the number of fields it modified or added
+    steps = ('convert245',
+             'convert264',
+             'convert300',
+             'create336',
+             'create337',
+             'create338',
+             'convert500s',
+             'convertLocalRules')
+
+    def __init__(self, marc_record, stats=None, rules=None, steps=None):
         super(PCCMARCtoRDAConversion, self).__init__()
         self.record = marc_record
+        self.stats = stats
+        self.rules = rules or PCC_PLAN
+        if steps is not None:
+            # A plan from analyzer leaves out steps, never reorders them
+            self.steps = tuple(step for step in self.steps if step in steps)
 
     def convert(self):
         """Method runs entire PCC recomended
-         RDA conversions on its MARC21 record"""
-        self.convert245()
-        self.convert264()
-        self.convert300()
-        self.create336()
-        self.create337()
-        self.create338()
-        self.convert500s()
+         RDA conversions on its MARC21 record. If the converter has stats,
+         the wall time and fields modified by each step are added to them.
+         An error in a step is raised as an errors.ConversionError naming
+         the step."""
+        for step in self.steps:
+            try:
+                if self.stats is None:
+                    getattr(self, step)()
+                    continue
+                start = instrumentation.timer()
+                fields_modified = getattr(self, step)()
+                self.stats.add(step,
+                               instrumentation.timer() - start,
+                               fields_modified)
+            except Exception as error:
+                raise errors.ConversionError(step, error) from error
 
     def convert245(self):
         """Method converts field 245"""
-        all245s = self.record.get_fields('245')
-        for field245 in all245s:
+        modified = 0
+        for field245 in self.getFields('245'):
+            original = (list(field245.indicators), list(field245.subfields))
             self.remove245EllipsesChangeLatin(field245)
             self.remove245GMD(field245)
             new_field245 = self.__format245__(field245)
-            self.record.remove_field(field245)
-            self.record.add_field(new_field245)
+            self.replaceField(field245, new_field245)
+            if (new_field245.indicators, new_field245.subfields) != original:
+                modified += 1
+        return modified
 
     def convert264(self):
         """Method converts field 260. Changes s.1 to
         place of publication not identified"""
-        all264s = self.record.get_fields('264')
-
-        sl_re = re.compile(r"S.l.")
-        sn_re = re.compile(r"s\.n\.")
-
-        for field in all264s:
-            if len(field.indicators[1].strip()) < 1:
-                field.indicators[1] = '1'
-            for subfield in field:
-                new_subfield = (
-                    subfield[0],
-                    sl_re.sub(
-                        "Place of publication not identified",
-                        subfield[1]))
-                field.delete_subfield(subfield[0])
-                field.add_subfield(new_subfield[0], new_subfield[1])
-
-        for field in all264s:
-            for subfield in field:
-                new_subfield = (
-                    subfield[0],
-                    sn_re.sub(
-                        "publisher not identified",
-                        subfield[1]))
-                field.delete_subfield(subfield[0])
-                field.add_subfield(new_subfield[0], new_subfield[1])
-
+        return len([field for field in self.getFields('264')
+                    if self.applyRules(field)])
 
     def convert300(self):
         """Method converts abbreviations in field 300 to the expanded form"""
-        all300s = self.record.get_fields('300')
-
-
-        for field_a in all300s:
-            all_a_subfields = field_a.get_subfields('a')
-            for subfield_a in all_a_subfields:
-                new_a = PCCMARCtoRDAConversion.pages_re.sub("pages", subfield_a)
-                new_a = PCCMARCtoRDAConversion.volumes_re.sub("volumes", new_a)
-                new_a = PCCMARCtoRDAConversion.illus_re.sub("illustrations", new_a)
-                new_a = PCCMARCtoRDAConversion.facsim_re.sub("facsimiles", new_a)
-                new_a = PCCMARCtoRDAConversion.sound_re.sub("sound", new_a)
-                new_a = PCCMARCtoRDAConversion.approx_re.sub("approximately", new_a)
-                field_a.delete_subfield('a')
-                field_a.add_subfield('a', new_a)
-
-        for field_b in all300s:
-            all_b_subfields = field_b.get_subfields('b')
-            for subfield_b in all_b_subfields:
-                new_b = PCCMARCtoRDAConversion.pages_re.sub("pages", subfield_b)
-                new_b = PCCMARCtoRDAConversion.volumes_re.sub("volumes", new_b)
-                new_b = PCCMARCtoRDAConversion.illus_re.sub("illustrations", new_b)
-                new_b = PCCMARCtoRDAConversion.facsim_re.sub("facsimiles", new_b)
-                new_b = PCCMARCtoRDAConversion.sound_re.sub("sound", new_b)
-                new_b = PCCMARCtoRDAConversion.approx_re.sub("approximately", new_b)
-                field_b.delete_subfield('b')
-                field_b.add_subfield('b', new_b)
+        return len([field for field in self.getFields('300')
+                    if self.applyRules(field)])
 
+    def applyRules(self, field):
+        """Method runs the compiled rules for the field's tag on its
+        indicators and subfields, scanning each subfield value once
 
+        Args:
+            field(pymarc.Field): Field to convert
+
+        Returns:
+            boolean, True if the field changed
+        """
+        field_rules = self.rules.get(field.tag)
+        if field_rules is None or field.is_control_field():
+            return False
+        changed = field_rules.rewriteIndicators(field)
+        return self.rewriteSubfields(field, field_rules.rewrite) or changed
 
     def remove245EllipsesChangeLatin(self, field245):
         """Method 245 subfield c:  Remove ellipses and change Latin abbreviation
         ("... [et al.]"  becomes "[and others]")"""
-        pattern = re.compile(r"\u2026 \[et al.\]")
-        c_subfields = field245.get_subfields('c')
-        for subfield in c_subfields:
-            if pattern.search(subfield):
-                pre_string = subfield.split("\u2026")[0]
-                field245.delete_subfield(subfield)
-                field245.add_subfield('c', '{} [and others]'.format(pre_string))
+        def change_latin(code, value):
+            if code == 'c' and ELLIPSIS_ET_AL_RE.search(value):
+                pre_string = value.split("\u2026")[0]
+                return '{} [and others]'.format(pre_string)
+            return value
+
+        return self.rewriteSubfields(field245, change_latin)
 
 
     def remove245GMD(self, field245):
@@ -193,87 +232,66 @@ class PCCMARCtoRDAConversion(base_converter.BaseMARC21Conversion):
             field245(pymarc.Field): A 245 field
 
         """
-
-        field245.delete_subfield('h')
+        return self.rewriteSubfields(
+            field245,
+            lambda code, value: None if code == 'h' else value)
 
     def create336(self):
-        # If 336 already exists return
-        field336 = self.record.get_fields('336')
-        if len(field336) > 0:
-            return
-        type_of = self.record.leader[6]
-        if type_of in RDA_CONTENT_LOOKUP:
-            rda_content_type = RDA_CONTENT_LOOKUP.get(type_of)
-            new336 = pymarc.Field(
-                '336', 
-                indicators=[' ',' '],
-                subfields=['a', rda_content_type.get('term'),
-                           'b', rda_content_type.get('code'),
-                           '2', "rdacontent"])
-            self.record.add_field(new336)
+        """Method creates a 336 content type field from leader/06 if the
+        record does not have a 336"""
+        if self.hasField('336'):
+            return 0
+        prototype = RDA_CONTENT_FIELDS.get(self.record.leader[6])
+        if prototype is None:
+            return 0
+        self.addField(new_field(prototype, self.newField))
+        return 1
 
     def create337(self):
-        # If 337 already exists return
-        field337 = self.record.get_fields('337')
-        if len(field337) > 0 or not '007' in self.record:
-            return
-        field007 = self.record['007']
-        type_of = field007.data[0]
-         
-        if type_of in RDA_MEDIA:
-            rda_media = RDA_MEDIA.get(type_of)
-            new337 = pymarc.Field(
-                '337', 
-                indicators=[' ',' '],
-                subfields=['a', rda_media.get('term'),
-                           'b', rda_media.get('code'),
-                           '2', "rdamedia"])
-            self.record.add_field(new337)
+        """Method creates a 337 media type field from 007/00 of each 007 in
+        the record if the record does not have a 337"""
+        if self.hasField('337'):
+            return 0
+        prototypes = []
+        for field007 in self.getFields('007'):
+            prototype = RDA_MEDIA_FIELDS.get(field007.data[0:1])
+            if prototype is not None and not prototype in prototypes:
+                prototypes.append(prototype)
+        for prototype in prototypes:
+            self.addField(new_field(prototype, self.newField))
+        return len(prototypes)
 
     def create338(self):
-        # If 338 already exists return
-        field338 = self.record.get_fields('338')
-        if len(field338) > 0 or not '007' in self.record:
-            return
-        field007 = self.record['007']
-        type_of = field007.data[1]
-        if type_of in RDA_CARRIER_TYPES:
-            rda_carrier_type = RDA_CARRIER_TYPES.get(type_of)
-            new338 = pymarc.Field(
-                '338', 
-                indicators=[' ',' '],
-                subfields=['a', rda_media.get('term'),
-                           'b', rda_media.get('code'),
-                           '2', "rdacarrier"])
-            self.record.add_field(new338)
+        """Method creates a 338 carrier type field from 007/00 and 007/01 of
+        each 007 in the record if the record does not have a 338"""
+        if self.hasField('338'):
+            return 0
+        prototypes = []
+        for field007 in self.getFields('007'):
+            prototype = RDA_CARRIER_FIELDS.get(
+                (field007.data[0:1], field007.data[1:2]))
+            if prototype is not None and not prototype in prototypes:
+                prototypes.append(prototype)
+        for prototype in prototypes:
+            self.addField(new_field(prototype, self.newField))
+        return len(prototypes)
 
 
     def convert500s(self):
         """Method to convert all field notes 500 - expanding abbreviations"""
-        all500s = self.record.get_fields('500', '501','502','504')
-        """There might be other 5XX fields with these abbreviations"""
-
-        intro_re = re.compile(r"introd.")
-
-        for field in all500s:
-            for subfield in field:
-                new_subfield = (
-                    subfield[0],
-                    PCCMARCtoRDAConversion.pages_re.sub(
-                        "pages",
-                        subfield[1]))
-                field.delete_subfield(subfield[0])
-                field.add_subfield(new_subfield[0], new_subfield[1])
-
-        for field in all500s:
-            for subfield in field:
-                new_subfield = (
-                    subfield[0],
-                    intro_re.sub(
-                        "Introduction",
-                        subfield[1]))
-                field.delete_subfield(subfield[0])
-                field.add_subfield(new_subfield[0], new_subfield[1])
+        # There might be other 5XX fields with these abbreviations
+        all500s = self.getFields('500', '501', '502', '504')
+        return len([field for field in all500s
+                    if self.applyRules(field)])
+
+    def convertLocalRules(self):
+        """Method runs the rules of a local rule spec for tags that none of
+        the PCC steps convert, visiting each field of the record once"""
+        local_tags = self.rules.tags - PCC_RULE_TAGS
+        if len(local_tags) < 1:
+            return 0
+        return len([field for field in self.getFields(*sorted(local_tags))
+                    if self.applyRules(field)])
 
 
 def main():
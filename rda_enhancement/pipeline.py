@@ -0,0 +1,230 @@
+"""-------------------------------------------------------------------------------
+# Name:        pipeline
+# Purpose:     Runs the PCC RDA conversion as a pipeline of a reader stage,
+#              converter processes and a writer stage joined by bounded queues
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import instrumentation
+    import parallel
+except ImportError:
+    from . import instrumentation
+    from . import parallel
+
+import json
+import multiprocessing
+import queue
+import threading
+import traceback
+
+DEFAULT_QUEUE_SIZE = 8
+
+def new_stage():
+    """Function returns the empty counters of a pipeline stage. Busy is time
+    spent doing the stage's work, waiting is time spent for input from the
+    stage before it and blocked is time spent on backpressure from the
+    stage after it."""
+    return {'batches': 0,
+            'busy_seconds': 0.0,
+            'waiting_seconds': 0.0,
+            'blocked_seconds': 0.0}
+
+def utilisation(stage):
+    """Function returns the share of a stage's time spent busy"""
+    total = stage['busy_seconds'] + stage['waiting_seconds'] + \
+            stage['blocked_seconds']
+    if total <= 0:
+        return 0.0
+    return stage['busy_seconds'] / total
+
+def _convert_batches(tasks, results, options):
+    # Converter stage, runs in a worker process until it gets a None batch
+    stage = new_stage()
+    try:
+        while True:
+            started = instrumentation.timer()
+            task = tasks.get()
+            stage['waiting_seconds'] += instrumentation.timer() - started
+            if task is None:
+                break
+            sequence, chunk = task
+            started = instrumentation.timer()
+            result = parallel.convert_chunk(chunk, **options)
+            stage['busy_seconds'] += instrumentation.timer() - started
+            stage['batches'] += 1
+            started = instrumentation.timer()
+            results.put(('batch', sequence, result))
+            stage['blocked_seconds'] += instrumentation.timer() - started
+        results.put(('done', None, stage))
+    except BaseException:
+        results.put(('error', None, traceback.format_exc()))
+
+
+class Pipeline(object):
+    """A reader thread, workers converter processes and the caller as the
+    writer stage. At most queue_size batches are read and not yet written,
+    so the reader blocks instead of filling memory when the converters or
+    the writer fall behind.
+
+    Attributes:
+        workers: number of converter processes
+        queue_size: maximum batches in flight between reader and writer
+        order: 'input' or 'completion' order of the batches yielded
+        options: keyword arguments of parallel.convert_chunk
+        stages: dict of stage name to counters, see new_stage
+    """
+
+    def __init__(self,
+                 workers=1,
+                 queue_size=DEFAULT_QUEUE_SIZE,
+                 order='input',
+                 **options):
+        if order not in ('input', 'completion'):
+            raise ValueError("order must be 'input' or 'completion'")
+        self.workers = workers
+        self.queue_size = max(queue_size, 1)
+        self.order = order
+        self.options = options
+        self.stages = {'reader': new_stage(),
+                       'converter': new_stage(),
+                       'writer': new_stage()}
+
+    def __read__(self, chunks, tasks, in_flight, stopping):
+        # Reader stage, runs in a thread of the calling process
+        stage = self.stages['reader']
+        try:
+            chunks = iter(chunks)
+            sequence = 0
+            while not stopping.is_set():
+                started = instrumentation.timer()
+                chunk = next(chunks, None)
+                stage['busy_seconds'] += instrumentation.timer() - started
+                if chunk is None:
+                    break
+                started = instrumentation.timer()
+                while not in_flight.acquire(timeout=0.1):
+                    if stopping.is_set():
+                        return
+                tasks.put((sequence, chunk))
+                stage['blocked_seconds'] += instrumentation.timer() - started
+                stage['batches'] += 1
+                sequence += 1
+        except BaseException:
+            self.reader_error = traceback.format_exc()
+        finally:
+            for i in range(self.workers):
+                tasks.put(None)
+
+    def __result__(self, results, converters):
+        while True:
+            try:
+                return results.get(timeout=1.0)
+            except queue.Empty:
+                # A converter killed by the system never sends its result
+                for converter in converters:
+                    if converter.exitcode not in (None, 0):
+                        raise RuntimeError(
+                            "Converter stage exited with {}".format(
+                                converter.exitcode))
+
+    def run(self, chunks):
+        """Generator runs numbered chunks of raw records through the
+        pipeline and yields each converted chunk for the caller to write.
+        The time the caller takes between chunks is the writer stage's
+        busy time.
+
+        Args:
+            chunks(iterable): Numbered chunks from parallel.chunk_records
+
+        Yields:
+            results and stats of each chunk, see parallel.convert_chunk
+        """
+        tasks = multiprocessing.Queue(self.queue_size)
+        results = multiprocessing.Queue(self.queue_size)
+        in_flight = threading.BoundedSemaphore(self.queue_size)
+        stopping = threading.Event()
+        self.reader_error = None
+        converters = [
+            multiprocessing.Process(target=_convert_batches,
+                                    args=(tasks, results, self.options))
+            for i in range(self.workers)]
+        for converter in converters:
+            converter.daemon = True
+            converter.start()
+        reader = threading.Thread(target=self.__read__,
+                                  args=(chunks, tasks, in_flight, stopping))
+        reader.daemon = True
+        reader.start()
+        writer = self.stages['writer']
+        finished, pending, next_sequence = 0, {}, 0
+        try:
+            while finished < self.workers:
+                started = instrumentation.timer()
+                kind, sequence, payload = self.__result__(results, converters)
+                writer['waiting_seconds'] += instrumentation.timer() - started
+                if kind == 'error':
+                    raise RuntimeError(
+                        "Converter stage failed:\n{}".format(payload))
+                if kind == 'done':
+                    for counter, value in payload.items():
+                        self.stages['converter'][counter] += value
+                    finished += 1
+                    continue
+                if self.order == 'completion':
+                    ready = [payload]
+                else:
+                    pending[sequence] = payload
+                    ready = []
+                    while next_sequence in pending:
+                        ready.append(pending.pop(next_sequence))
+                        next_sequence += 1
+                for result in ready:
+                    started = instrumentation.timer()
+                    yield result
+                    writer['busy_seconds'] += instrumentation.timer() - started
+                    writer['batches'] += 1
+                    in_flight.release()
+            reader.join()
+            if self.reader_error is not None:
+                raise RuntimeError(
+                    "Reader stage failed:\n{}".format(self.reader_error))
+            for converter in converters:
+                converter.join()
+        finally:
+            stopping.set()
+            for converter in converters:
+                if converter.is_alive():
+                    converter.terminate()
+                converter.join()
+            # Chunks left for converters that were stopped are dropped
+            # instead of blocking the exit of this process
+            tasks.cancel_join_thread()
+
+    def report(self):
+        """Method returns the counters and utilisation of each stage, the
+        converter counters are summed over all of the converter processes
+
+        Returns:
+            dict of stage name to counters
+        """
+        report = {}
+        for name, stage in self.stages.items():
+            report[name] = dict(stage, utilisation=utilisation(stage))
+        report['converter']['workers'] = self.workers
+        return report
+
+    def save_report(self, filename):
+        with open(filename, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2, sort_keys=True)
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""-------------------------------------------------------------------------------
+# Name:        prefilter
+# Purpose:     Decides from the raw bytes of a MARC21 record whether the PCC
+#              RDA conversion would change it, so records that are already
+#              RDA can be copied through without a full decode and encode
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import compact
+    import instrumentation
+    import marc_reader
+    import marc_writer
+    import pcc_conversion
+except ImportError:
+    from . import compact
+    from . import instrumentation
+    from . import marc_reader
+    from . import marc_writer
+    from . import pcc_conversion
+
+# Fields read or written by PCCMARCtoRDAConversion.convert()
+CONVERSION_TAGS = frozenset([
+    '007', '245', '264', '300', '336', '337', '338',
+    '500', '501', '502', '504'])
+
+def needs_conversion(raw_record, rules=None, steps=None):
+    """Function returns False only when the converted output of the record
+    would be byte-for-byte the same as the raw record. Just the fields in
+    CONVERSION_TAGS are decoded and converted, the rest of the record is
+    only checked at the byte level for anything a full pymarc decode and
+    encode would normalize. MARC-8 records need the full conversion unless
+    they are plain ASCII.
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        rules(rules.ExecutionPlan): Rules of the conversion, defaults to
+                                    the PCC rules
+        steps(iterable): Steps of the conversion, defaults to all of them
+
+    Returns:
+        boolean
+    """
+    try:
+        converted = __convert_fields__(raw_record, rules, steps)
+    except Exception:
+        # Malformed records are left for the full conversion to report
+        return True
+    return converted is None or converted[1]
+
+def convert_record(raw_record, rules=None, steps=None, stats=None):
+    """Function converts a record from the fields in CONVERSION_TAGS alone
+    when the rest of the record would be written back as it was read,
+    returning the raw record itself when the conversion would not change
+    it. The fields the check converts are the fields written, so a record
+    is only converted once.
+
+    Args:
+        raw_record(bytes): Record in ISO 2709 transmission format
+        rules(rules.ExecutionPlan): Rules of the conversion, defaults to
+                                    the PCC rules
+        steps(iterable): Steps of the conversion, defaults to all of them
+        stats(instrumentation.ConversionStats): Optional stats that the
+            conversion steps and encode are timed into
+
+    Returns:
+        bytes, or None if the record needs the full conversion
+    """
+    try:
+        converted = __convert_fields__(raw_record, rules, steps, stats)
+    except Exception:
+        return None
+    if converted is None:
+        return None
+    record, changed, others = converted
+    if not changed:
+        return raw_record
+    start = instrumentation.timer()
+    for field in others:
+        record.add_field(field)
+    marc = marc_writer.serialize_record(record)
+    if stats is not None:
+        stats.add('encode', instrumentation.timer() - start)
+    return marc
+
+def __convert_fields__(raw_record, rules=None, steps=None, stats=None):
+    # Returns None when the record needs the full conversion, otherwise the
+    # record of the converted fields, whether the conversion changed them
+    # and the fields the conversion does not read
+    leader = raw_record[0:24]
+    if leader[20:24] != b'4500':
+        return None
+    if int(leader[0:5]) != len(raw_record) or \
+       raw_record[-1:] != marc_reader.END_OF_RECORD:
+        return None
+    entries = marc_reader.read_directory(raw_record)
+    if len(entries) < 1:
+        return None
+    tags = [entry[0] for entry in entries]
+    if tags != sorted(tags):
+        return None
+    base_address = int(leader[12:17])
+    if raw_record[base_address - 1:base_address] != marc_reader.END_OF_FIELD:
+        return None
+    data = raw_record[base_address:-1]
+    # pymarc drops empty subfields and normalizes subfield codes
+    if compact.IRREGULAR_SUBFIELD_RE.search(data) is not None:
+        return None
+    if leader[9:10] != b'a':
+        # MARC-8 conversion and the Latin-1 encode change anything but ASCII
+        if compact.MARC8_SPECIAL_RE.search(data) is not None:
+            return None
+    else:
+        # raises for invalid UTF-8 which the full decode would fail on
+        data.decode('utf-8')
+    conversion_tags = CONVERSION_TAGS
+    if rules is not None:
+        conversion_tags = conversion_tags | rules.tags
+    record = compact.CompactRecord(leader.decode('ascii'))
+    original, others, position = [], [], base_address
+    for tag, start, end in entries:
+        # pymarc writes fields back contiguously in directory order
+        if start != position:
+            return None
+        position = end
+        field_data = raw_record[start:end]
+        if field_data[-1:] != marc_reader.END_OF_FIELD:
+            return None
+        # pymarc repairs missing indicators and fails on ones not in ASCII
+        if not (tag < '010' and tag.isdigit()) and \
+           (field_data[2:3] not in (marc_reader.SUBFIELD_INDICATOR,
+                                    marc_reader.END_OF_FIELD) or
+            marc_reader.SUBFIELD_INDICATOR in field_data[0:2] or
+            max(bytearray(field_data[0:2]) or b'\0') > 0x7f):
+            return None
+        if tag in conversion_tags:
+            field = compact.CompactField.from_buffer(tag,
+                                                     raw_record,
+                                                     start,
+                                                     end)
+            original.append((field, field_data))
+            record.add_field(field)
+        else:
+            others.append(compact.CompactField.from_buffer(tag,
+                                                           raw_record,
+                                                           start,
+                                                           end))
+    if position != len(raw_record) - 1:
+        return None
+    converter = pcc_conversion.PCCMARCtoRDAConversion(record,
+                                                       stats,
+                                                       rules,
+                                                       steps)
+    converter.convert()
+    fields = sorted(record.fields, key=lambda x: x.tag)
+    if len(fields) != len(original):
+        return record, True, others
+    # A field the steps did not touch is still its raw bytes, only the
+    # fields they rewrote are encoded to compare
+    changed = any(not (field is read and field.__is_raw__()) and
+                  field.as_marc('utf-8') != field_data
+                  for field, (read, field_data) in zip(fields, original))
+    return record, changed, others
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""-------------------------------------------------------------------------------
+# Name:        reporter
+# Purpose:     Reports the progress of a conversion run, its throughput, error
+#              rate and time left, at most once an interval and to a status
+#              file that a scheduler can poll
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import instrumentation
+except ImportError:
+    from . import instrumentation
+
+import datetime
+import json
+import os
+import sys
+
+# Seconds between progress reports
+DEFAULT_INTERVAL = 5.0
+
+# Weight of the latest interval in the moving average of the rates
+DEFAULT_SMOOTHING = 0.3
+
+class ProgressReporter(object):
+    """Tracks the records, input bytes and errors of a run as they are
+    added a chunk at a time. Adding only reads the clock, the rates and
+    the time left are worked out and reported once interval seconds have
+    passed since the last report. The rates are reported for the last
+    interval, over the whole run and as an exponentially weighted moving
+    average of each interval's rate, which the time left is estimated from,
+    using the input bytes when their total is known and the records
+    otherwise.
+
+    Attributes:
+        total_records: number of records in the run or None if not known
+        total_bytes: bytes of input in the run or None if not known
+        interval: seconds between reports, 0 reports only at the end
+        status_filename: JSON file rewritten with each report or None
+        records: records done
+        input_bytes: bytes of input done
+        errors: records that failed
+        record_rate: moving average of records per second or None
+        byte_rate: moving average of input bytes per second or None
+        interval_record_rate: records per second of the last interval or
+                              None
+        interval_byte_rate: input bytes per second of the last interval or
+                            None
+    """
+
+    def __init__(self,
+                 total_records=None,
+                 total_bytes=None,
+                 interval=DEFAULT_INTERVAL,
+                 status_filename=None,
+                 output=None,
+                 smoothing=DEFAULT_SMOOTHING,
+                 clock=instrumentation.timer):
+        self.total_records = total_records
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.status_filename = status_filename
+        self.output = output or sys.stdout
+        self.smoothing = smoothing
+        self.clock = clock
+        self.records, self.input_bytes, self.errors = 0, 0, 0
+        self.record_rate, self.byte_rate = None, None
+        self.interval_record_rate, self.interval_byte_rate = None, None
+        self.state = 'running'
+        self.started = self.last_report = clock()
+        self.last_records, self.last_bytes = 0, 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        self.finish('failed' if error_type is not None else 'finished')
+
+    def update(self, records, input_bytes=0, errors=0):
+        """Method adds a chunk of records to the progress and reports it if
+        the interval has passed
+
+        Args:
+            records(int): Records done in the chunk
+            input_bytes(int): Bytes of input of the records
+            errors(int): Records of the chunk that failed
+        """
+        self.records += records
+        self.input_bytes += input_bytes
+        self.errors += errors
+        now = self.clock()
+        if self.interval > 0 and now - self.last_report >= self.interval:
+            self.report(now)
+
+    def __average__(self, average, rate):
+        if average is None:
+            return rate
+        return self.smoothing * rate + (1.0 - self.smoothing) * average
+
+    def report(self, now=None, average=True):
+        """Method updates the moving averages, prints the progress and
+        saves the status file
+
+        Args:
+            now(float): Time from the reporter's clock, read if not given
+            average(boolean): Add the rates since the last report to the
+                              moving averages
+        """
+        now = self.clock() if now is None else now
+        seconds = now - self.last_report
+        if average and seconds > 0:
+            self.interval_record_rate = (self.records -
+                                         self.last_records) / seconds
+            self.interval_byte_rate = (self.input_bytes -
+                                       self.last_bytes) / seconds
+            self.record_rate = self.__average__(self.record_rate,
+                                                self.interval_record_rate)
+            self.byte_rate = self.__average__(self.byte_rate,
+                                              self.interval_byte_rate)
+        self.last_report = now
+        self.last_records, self.last_bytes = self.records, self.input_bytes
+        status = self.status(now)
+        print(format_status(status), file=self.output, flush=True)
+        if self.status_filename:
+            save_status(status, self.status_filename)
+
+    def status(self, now=None):
+        """Method returns the progress of the run
+
+        Args:
+            now(float): Time from the reporter's clock, read if not given
+
+        Returns:
+            dict
+        """
+        now = self.clock() if now is None else now
+        elapsed = now - self.started
+        fraction, eta = None, None
+        if self.total_bytes and self.byte_rate:
+            fraction = self.input_bytes / float(self.total_bytes)
+            eta = (self.total_bytes - self.input_bytes) / self.byte_rate
+        elif self.total_records and self.record_rate:
+            fraction = self.records / float(self.total_records)
+            eta = (self.total_records - self.records) / self.record_rate
+        if self.state != 'running':
+            eta = 0.0 if self.state == 'finished' else None
+        return {'state': self.state,
+                'updated': datetime.datetime.now().isoformat(),
+                'elapsed_seconds': elapsed,
+                'records': self.records,
+                'total_records': self.total_records,
+                'input_bytes': self.input_bytes,
+                'total_bytes': self.total_bytes,
+                'fraction_done': fraction,
+                'errors': self.errors,
+                'error_rate': self.errors / float(max(self.records, 1)),
+                'records_per_second': self.records / elapsed
+                                      if elapsed > 0 else None,
+                'bytes_per_second': self.input_bytes / elapsed
+                                    if elapsed > 0 else None,
+                'interval_records_per_second': self.interval_record_rate,
+                'interval_bytes_per_second': self.interval_byte_rate,
+                'moving_records_per_second': self.record_rate,
+                'moving_bytes_per_second': self.byte_rate,
+                'eta_seconds': None if eta is None else max(eta, 0.0)}
+
+    def finish(self, state='finished'):
+        """Method reports the progress once more at the end of the run
+
+        Args:
+            state(str): 'finished' or 'failed'
+        """
+        if self.state != 'running':
+            return
+        self.state = state
+        # The end of the run is not a stall
+        self.report(average=self.records > self.last_records)
+
+def format_status(status):
+    """Function formats the progress of a run as one line
+
+    Args:
+        status(dict): Progress from ProgressReporter.status
+
+    Returns:
+        str
+    """
+    line = '{0:>12,} records'.format(status['records'])
+    if status['fraction_done'] is not None:
+        line += ' {0:>6.1%}'.format(min(status['fraction_done'], 1.0))
+    if status['moving_records_per_second'] is not None:
+        line += ' {0:>10,.0f} records/s ({1:,.0f} moving, {2:,.0f} ' \
+                'average)'.format(status['interval_records_per_second'],
+                                  status['moving_records_per_second'],
+                                  status['records_per_second'] or 0.0)
+    if status['interval_bytes_per_second']:
+        line += ' {0:>7.2f} MB/s'.format(
+            status['interval_bytes_per_second'] / 1048576.0)
+    line += ' {0:,} errors ({1:.2%})'.format(status['errors'],
+                                             status['error_rate'])
+    if status['state'] != 'running':
+        line += ' {0} in {1}'.format(status['state'],
+                                     _duration(status['elapsed_seconds']))
+    elif status['eta_seconds'] is not None:
+        line += ' ETA {0}'.format(_duration(status['eta_seconds']))
+    return line
+
+def _duration(seconds):
+    return str(datetime.timedelta(seconds=int(round(seconds))))
+
+def save_status(status, filename):
+    """Function saves the progress of a run as JSON, replacing the file in
+    one step so a poller never reads half of it
+
+    Args:
+        status(dict): Progress from ProgressReporter.status
+        filename(str): File path
+    """
+    temporary = '{0}.tmp'.format(filename)
+    with open(temporary, 'w') as status_file:
+        json.dump(status, status_file, indent=2, sort_keys=True)
+    os.replace(temporary, filename)
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
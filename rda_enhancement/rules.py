@@ -0,0 +1,387 @@
+"""-------------------------------------------------------------------------------
+# Name:        rules
+# Purpose:     Loads PCC conversion rules from a JSON or YAML spec and
+#              compiles them once into an execution plan grouped by tag
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import abbreviations
+except ImportError:
+    from . import abbreviations
+
+import collections
+import hashlib
+import json
+import re
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# A rule spec is a dict with a list of rules. A subfield rule replaces the
+# pattern with the replacement in the listed subfields ('*' for every
+# subfield) of the tags, optionally only in values matching the guard. An
+# indicator rule replaces an indicator (1 or 2) that fully matches the
+# pattern. Consecutive subfield rules with the same guard are applied
+# together in one pass, see FieldRules. For example:
+#
+#   {"rules": [
+#       {"tag": "300", "subfields": "ab",
+#        "pattern": "\\bcm\\.", "replacement": "cm"},
+#       {"tag": ["500", "505"], "pattern": "\\bv\\.",
+#        "replacement": "volume", "guard": "^Contents"},
+#       {"tag": "264", "indicator": 2,
+#        "pattern": "\\s*", "replacement": "1"}]}
+
+def table_rules(table):
+    """Function converts an abbreviation table, like
+    abbreviations.PCC_ABBREVIATIONS, into a list of rules
+
+    Args:
+        table(dict): MARC tag to subfield code to abbreviation rules
+
+    Returns:
+        list of rule dicts
+    """
+    rules = []
+    for tag in sorted(table):
+        for code in sorted(table[tag]):
+            for pattern, replacement in table[tag][code]:
+                rules.append({'tag': tag,
+                              'subfields': code,
+                              'pattern': pattern,
+                              'replacement': replacement})
+    return rules
+
+PCC_RULE_SPEC = {
+    'rules': [{'tag': '264',
+               'indicator': 2,
+               'pattern': r'\s*',
+               'replacement': '1'}] +
+             table_rules(abbreviations.PCC_ABBREVIATIONS)}
+
+class RuleSet(object):
+    """An ordered list of conversion rules. Consecutive subfield rules with
+    the same guard run together as one pass over the subfield, where the
+    earlier rule wins when two match at the same position and no rule sees
+    the replacements of the others. A rule with a different guard in
+    between starts a new pass, which runs on the output of the passes
+    before it.
+
+    Attributes:
+        rules: list of rule dicts
+    """
+
+    def __init__(self, rules=None):
+        self.rules = []
+        for rule in rules or []:
+            self.add(rule)
+
+    @classmethod
+    def load(cls, filename):
+        """Method loads a rule spec from a JSON file, or from a YAML file
+        when PyYAML is installed
+
+        Args:
+            filename(str): Spec file path ending in .json, .yaml or .yml
+
+        Returns:
+            RuleSet
+        """
+        with open(filename) as spec_file:
+            if filename.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise ImportError("PyYAML is needed to load {}".format(
+                        filename))
+                spec = yaml.safe_load(spec_file)
+            else:
+                spec = json.load(spec_file)
+        if not isinstance(spec, dict) or \
+           not isinstance(spec.get('rules'), list):
+            raise ValueError("{} must have a list of rules".format(filename))
+        return cls(spec['rules'])
+
+    def add(self, rule):
+        """Method validates a rule and adds it to the end of the rule set
+
+        Args:
+            rule(dict): Rule with tag, pattern and replacement and either
+                        subfields or indicator
+        """
+        if not isinstance(rule, dict):
+            raise ValueError("Rule {} must be a mapping".format(rule))
+        for key in ('tag', 'pattern', 'replacement'):
+            if key not in rule:
+                raise ValueError("Rule {} is missing {}".format(rule, key))
+        # A null guard or subfields is the same as leaving it out
+        rule = dict((key, value) for key, value in rule.items()
+                    if value is not None or key not in ('guard', 'subfields'))
+        for key in ('pattern', 'replacement', 'guard', 'subfields'):
+            if key in rule and not isinstance(rule[key], str):
+                raise ValueError("Rule {} {} must be a string".format(rule,
+                                                                       key))
+        if rule.get('indicator') not in (None, 1, 2):
+            raise ValueError("Rule {} indicator must be 1 or 2".format(rule))
+        tags = rule['tag']
+        if not isinstance(tags, (list, tuple)):
+            tags = [tags]
+        rule = dict(rule, tag=[str(tag) for tag in tags])
+        # Compiling here reports a bad pattern when the spec is loaded
+        for key in ('pattern', 'guard'):
+            try:
+                re.compile(rule.get(key) or '')
+            except re.error as error:
+                raise ValueError("Rule {} {} is not a valid regular "
+                                 "expression: {}".format(rule, key, error))
+        self.rules.append(rule)
+
+    def extend(self, other):
+        """Method returns a new rule set of these rules followed by the
+        rules of other
+
+        Args:
+            other(RuleSet): Rules to run after these rules
+
+        Returns:
+            RuleSet
+        """
+        return RuleSet(self.rules + other.rules)
+
+    def fingerprint(self):
+        """Method returns a hash that changes whenever the rules change
+
+        Returns:
+            str
+        """
+        spec = json.dumps(self.rules, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(spec).hexdigest()
+
+    def compile(self, cache_size=0):
+        """Method compiles the rules into an ExecutionPlan
+
+        Args:
+            cache_size(int): Number of rewritten subfield values to cache,
+                             0 turns the cache off
+
+        Returns:
+            ExecutionPlan
+        """
+        return ExecutionPlan(self, cache_size)
+
+
+class RewriteCache(object):
+    """Bounded least recently used cache of (tag, subfield code, value) to
+    the value rewritten by the rules, for the values that repeat across
+    the records of a vendor load.
+
+    Attributes:
+        max_size: most values kept, the least recently used is dropped
+        hits: number of lookups found in the cache
+        misses: number of lookups not in the cache
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.values = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, key):
+        """Method returns the cached value of the key or None"""
+        value = self.values.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.values.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.values[key] = value
+        if len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+
+
+class FieldRules(object):
+    """Compiled rules for one tag. Consecutive subfield rules with the same
+    guard are compiled into one AbbreviationExpander, an alternation of
+    their patterns, so each subfield value is scanned once per guard. At
+    the same position the earlier rule's pattern wins, and the rules of a
+    group do not see each other's replacements.
+
+    Attributes:
+        tag: MARC tag of the rules
+        subfields: dict of subfield code to list of (guard, expander)
+        default: list of (guard, expander) for codes not in subfields
+        indicators: list of (indicator position, pattern, replacement)
+        cache: RewriteCache shared by the plan or None
+    """
+
+    def __init__(self, tag, rules, cache=None):
+        self.tag = tag
+        self.cache = cache
+        self.indicators = []
+        subfield_rules = []
+        for rule in rules:
+            if rule.get('indicator') is not None:
+                self.indicators.append((rule['indicator'] - 1,
+                                        re.compile(rule['pattern']),
+                                        rule['replacement']))
+            else:
+                subfield_rules.append(rule)
+        codes = set()
+        for rule in subfield_rules:
+            codes.update(code for code in rule.get('subfields', '*')
+                         if code != '*')
+        self.default = self.__group__(
+            [rule for rule in subfield_rules
+             if '*' in rule.get('subfields', '*')])
+        self.subfields = {}
+        for code in codes:
+            self.subfields[code] = self.__group__(
+                [rule for rule in subfield_rules
+                 if code in rule.get('subfields', '*') or
+                    '*' in rule.get('subfields', '*')])
+
+    def __group__(self, rules):
+        groups = []
+        for rule in rules:
+            # A null or empty guard matches every value
+            guard = rule.get('guard') or None
+            if len(groups) < 1 or groups[-1][0] != guard:
+                groups.append((guard, []))
+            groups[-1][1].append((rule['pattern'], rule['replacement']))
+        return [(None if guard is None else re.compile(guard),
+                 abbreviations.AbbreviationExpander(group))
+                for guard, group in groups]
+
+    def rewrite(self, code, value):
+        """Method returns the subfield value with the rules for the subfield
+        code applied
+
+        Args:
+            code(str): Subfield code
+            value(str): Subfield value
+
+        Returns:
+            str
+        """
+        expanders = self.subfields.get(code, self.default)
+        if len(expanders) < 1:
+            return value
+        if self.cache is not None:
+            key = (self.tag, code, value)
+            rewritten = self.cache.get(key)
+            if rewritten is None:
+                rewritten = self.__rewrite__(expanders, value)
+                self.cache.put(key, rewritten)
+            return rewritten
+        return self.__rewrite__(expanders, value)
+
+    def __rewrite__(self, expanders, value):
+        for guard, expander in expanders:
+            if guard is None or guard.search(value):
+                value = expander.expand(value)
+        return value
+
+    def rewriteIndicators(self, field):
+        """Method applies the indicator rules to a field
+
+        Args:
+            field(pymarc.Field): Field with indicators
+
+        Returns:
+            boolean, True if an indicator changed
+        """
+        changed = False
+        for position, pattern, replacement in self.indicators:
+            value = field.indicators[position]
+            if pattern.fullmatch(value) and value != replacement:
+                field.indicators[position] = replacement
+                changed = True
+        return changed
+
+    def matches(self, indicators, subfields):
+        """Method returns False only when none of the rules can change a
+        field with the indicators and subfields. Guards are not checked, so
+        a field can match and still be left unchanged.
+
+        Args:
+            indicators(str): The field's two indicators
+            subfields(iterable): (code, value) tuples of the field
+
+        Returns:
+            boolean
+        """
+        for position, pattern, replacement in self.indicators:
+            value = indicators[position:position + 1]
+            if pattern.fullmatch(value) and value != replacement:
+                return True
+        for code, value in subfields:
+            for guard, expander in self.subfields.get(code, self.default):
+                if expander.pattern.search(value):
+                    return True
+        return False
+
+
+class ExecutionPlan(object):
+    """Rules compiled once and grouped by tag, so converting a record only
+    runs the rules for the tags of its fields.
+
+    Attributes:
+        fields: dict of tag to FieldRules
+        fingerprint: fingerprint of the compiled RuleSet
+        cache: RewriteCache of the subfield values or None
+    """
+
+    def __init__(self, rule_set, cache_size=0):
+        self.fingerprint = rule_set.fingerprint()
+        self.cache = RewriteCache(cache_size) if cache_size > 0 else None
+        rules_by_tag = {}
+        for rule in rule_set.rules:
+            for tag in rule['tag']:
+                rules_by_tag.setdefault(tag, []).append(rule)
+        self.fields = dict((tag, FieldRules(tag, rules, self.cache))
+                           for tag, rules in rules_by_tag.items())
+
+    def __contains__(self, tag):
+        return tag in self.fields
+
+    def get(self, tag):
+        return self.fields.get(tag)
+
+    @property
+    def tags(self):
+        return frozenset(self.fields)
+
+def load_plan(filename=None, cache_size=0):
+    """Function compiles the PCC rules, followed by the local rules in
+    filename if given, into an ExecutionPlan
+
+    Args:
+        filename(str): Optional local rule spec file path
+        cache_size(int): Number of rewritten subfield values to cache
+
+    Returns:
+        ExecutionPlan
+    """
+    rule_set = RuleSet(PCC_RULE_SPEC['rules'])
+    if filename is not None:
+        rule_set = rule_set.extend(RuleSet.load(filename))
+    return rule_set.compile(cache_size)
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
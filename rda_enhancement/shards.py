@@ -0,0 +1,370 @@
+"""-------------------------------------------------------------------------------
+# Name:        shards
+# Purpose:     Writes converted MARC21 records to several shard files at once
+#              with a manifest, and merges the shards back in record order
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import marc_reader
+    import marc_writer
+except ImportError:
+    from . import marc_reader
+    from . import marc_writer
+
+import array
+import base64
+import errno
+import hashlib
+import heapq
+import json
+import os
+import sys
+import zlib
+
+SHARD_BY = ('count', 'size', 'hash')
+DEFAULT_SHARD_RECORDS = 10000
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024
+MANIFEST_VERSION = 2
+
+# Runs of records at least this long are copied in the kernel by merge_shards,
+# shorter ones through a buffer of this size
+SPLICE_BYTES = 1024 * 1024
+
+def shard_filename(output_filename, shard):
+    """Function returns the file name of a shard, records.mrc has the
+    shards records.00000.mrc, records.00001.mrc and so on"""
+    root, extension = os.path.splitext(output_filename)
+    return '{0}.{1:05d}{2}'.format(root, shard, extension)
+
+def manifest_filename(output_filename):
+    """Function returns the file name of the manifest of sharded output,
+    records.manifest.json for records.mrc"""
+    return '{0}.manifest.json'.format(os.path.splitext(output_filename)[0])
+
+
+class ShardedMARCWriter(object):
+    """Writes records to shard_count shard files, each through its own
+    marc_writer.BufferedMARCWriter so with background set the shards are
+    written at the same time. With shard_by 'count' or 'size' blocks of
+    shard_records records or shard_bytes bytes go to each shard in turn,
+    with 'hash' a record always goes to the shard of the hash of its 001.
+
+    The manifest saved on close has the records, bytes and SHA-256 of each
+    shard and the input record numbers of its records in the order written,
+    see encode_numbers, that merge_shards uses to put the records back in
+    order.
+
+    Attributes:
+        output_filename: file name the shard and manifest names are made from
+        shard_by: 'count', 'size' or 'hash'
+        writers: marc_writer.BufferedMARCWriter of each shard
+        numbers: array of the record numbers written to each shard
+    """
+
+    def __init__(self,
+                 output_filename,
+                 shard_count,
+                 shard_by='count',
+                 shard_records=DEFAULT_SHARD_RECORDS,
+                 shard_bytes=DEFAULT_SHARD_BYTES,
+                 buffer_size=marc_writer.DEFAULT_BUFFER_SIZE,
+                 background=False):
+        if shard_by not in SHARD_BY:
+            raise ValueError("shard_by must be 'count', 'size' or 'hash'")
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        self.output_filename = output_filename
+        self.shard_by = shard_by
+        self.shard_records = shard_records
+        self.shard_bytes = shard_bytes
+        self.files = [open(shard_filename(output_filename, shard), 'wb')
+                      for shard in range(shard_count)]
+        self.writers = [marc_writer.BufferedMARCWriter(shard_file,
+                                                       buffer_size,
+                                                       background)
+                        for shard_file in self.files]
+        self.checksums = [hashlib.sha256() for shard_file in self.files]
+        self.numbers = [array.array('q') for shard_file in self.files]
+        self.count = 0
+        self.shard, self.block_records, self.block_bytes = 0, 0, 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __next_shard__(self, raw_record):
+        if self.shard_by == 'hash':
+            number = marc_reader.control_number(raw_record) or ''
+            return zlib.crc32(number.encode('utf-8')) % len(self.writers)
+        if (self.shard_by == 'count' and
+            self.block_records >= self.shard_records) or \
+           (self.shard_by == 'size' and self.block_bytes >= self.shard_bytes):
+            self.shard = (self.shard + 1) % len(self.writers)
+            self.block_records, self.block_bytes = 0, 0
+        self.block_records += 1
+        self.block_bytes += len(raw_record)
+        return self.shard
+
+    def write(self, raw_record, number=None):
+        """Method writes a record to its shard
+
+        Args:
+            raw_record(bytes): Record in ISO 2709 transmission format
+            number(int): Input record number, defaults to the number of
+                         records written so far
+        """
+        if number is None:
+            number = self.count
+        shard = self.__next_shard__(raw_record)
+        self.writers[shard].write(raw_record)
+        self.checksums[shard].update(raw_record)
+        self.numbers[shard].append(number)
+        self.count += 1
+
+    def tell(self):
+        return sum(writer.tell() for writer in self.writers)
+
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+
+    def manifest(self):
+        """Method returns the manifest of the shards written so far
+
+        Returns:
+            dict
+        """
+        return {
+            'version': MANIFEST_VERSION,
+            'shard_by': self.shard_by,
+            'records': self.count,
+            'shards': [{'filename': os.path.basename(shard_file.name),
+                        'records': len(self.numbers[shard]),
+                        'bytes': self.writers[shard].tell(),
+                        'sha256': self.checksums[shard].hexdigest(),
+                        'numbers': encode_numbers(self.numbers[shard])}
+                       for shard, shard_file in enumerate(self.files)]}
+
+    def close(self):
+        """Method closes the shards and saves the manifest"""
+        try:
+            for writer in self.writers:
+                writer.close()
+        finally:
+            for shard_file in self.files:
+                shard_file.close()
+        with open(manifest_filename(self.output_filename), 'w') as manifest:
+            json.dump(self.manifest(), manifest)
+
+def encode_numbers(numbers):
+    """Function encodes record numbers for a manifest as the differences
+    between them, little-endian 64-bit integers compressed with zlib and
+    base64 encoded, which takes a byte or two a record when the numbers are
+    mostly ascending
+
+    Args:
+        numbers(array.array): Record numbers with the 'q' type code
+
+    Returns:
+        str
+    """
+    deltas = array.array('q', numbers)
+    for i in range(len(deltas) - 1, 0, -1):
+        deltas[i] -= deltas[i - 1]
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return base64.b64encode(zlib.compress(deltas.tobytes())).decode('ascii')
+
+def decode_numbers(encoded):
+    """Function decodes the record numbers of encode_numbers
+
+    Args:
+        encoded(str): Encoded record numbers
+
+    Returns:
+        array.array with the 'q' type code
+    """
+    numbers = array.array('q')
+    numbers.frombytes(zlib.decompress(base64.b64decode(encoded)))
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    for i in range(1, len(numbers)):
+        numbers[i] += numbers[i - 1]
+    return numbers
+
+def splice(source, destination, offset, length):
+    """Function copies length bytes at offset of the source file to the
+    current position of the destination file, in the kernel with
+    copy_file_range or sendfile where the platform has them
+
+    Args:
+        source(file): File opened for reading in binary mode
+        destination(file): File opened for writing in binary mode
+        offset(int): Byte offset in the source
+        length(int): Number of bytes
+    """
+    source_fd, destination_fd = source.fileno(), destination.fileno()
+    for copy in (_copy_file_range, _sendfile):
+        try:
+            copied = copy(source_fd, destination_fd, offset, length)
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                   errno.EOPNOTSUPP, errno.ENOTSUP):
+                raise
+            copied = 0
+        offset, length = offset + copied, length - copied
+        if length < 1:
+            return
+    while length > 0:
+        data = os.pread(source_fd, min(length, 1024 * 1024), offset)
+        if len(data) < 1:
+            raise IOError("Shard is shorter than its manifest")
+        os.write(destination_fd, data)
+        offset, length = offset + len(data), length - len(data)
+
+def _copy_file_range(source_fd, destination_fd, offset, length):
+    if not hasattr(os, 'copy_file_range'):
+        return 0
+    copied = 0
+    while copied < length:
+        count = os.copy_file_range(source_fd,
+                                   destination_fd,
+                                   length - copied,
+                                   offset + copied)
+        if count < 1:
+            break
+        copied += count
+    return copied
+
+def _sendfile(source_fd, destination_fd, offset, length):
+    if not hasattr(os, 'sendfile'):
+        return 0
+    copied = 0
+    while copied < length:
+        count = os.sendfile(destination_fd,
+                            source_fd,
+                            offset + copied,
+                            length - copied)
+        if count < 1:
+            break
+        copied += count
+    return copied
+
+def verify_shards(manifest_filename):
+    """Function checks the size and SHA-256 of each shard against its
+    manifest
+
+    Args:
+        manifest_filename(str): File path of the manifest
+
+    Returns:
+        list of the file names of the shards that do not match
+    """
+    with open(manifest_filename) as manifest_file:
+        manifest = json.load(manifest_file)
+    directory = os.path.dirname(manifest_filename)
+    mismatched = []
+    for shard in manifest['shards']:
+        filename = os.path.join(directory, shard['filename'])
+        checksum = hashlib.sha256()
+        with open(filename, 'rb') as shard_file:
+            for block in iter(lambda: shard_file.read(1024 * 1024), b''):
+                checksum.update(block)
+        if checksum.hexdigest() != shard['sha256'] or \
+           os.path.getsize(filename) != shard['bytes']:
+            mismatched.append(shard['filename'])
+    return mismatched
+
+def _shard_records(shard, numbers):
+    # Yields (record number, shard, index in the shard) in record order,
+    # shards written in input order are already sorted
+    indexes = range(len(numbers))
+    if any(numbers[i] > numbers[i + 1] for i in range(len(numbers) - 1)):
+        indexes = sorted(indexes, key=numbers.__getitem__)
+    for i in indexes:
+        yield numbers[i], shard, i
+
+def merge_shards(manifest_filename, output_filename, verify=False):
+    """Function merges the records of the shards of a manifest into one
+    file in input record order, reading the shards in step. Runs of
+    consecutive records in one shard are copied with splice when they are
+    at least SPLICE_BYTES long and through a buffer otherwise.
+
+    Args:
+        manifest_filename(str): File path of the manifest
+        output_filename(str): File path of the merged output
+        verify(boolean): Check the shard checksums before merging
+
+    Returns:
+        int, number of records merged
+    """
+    if verify:
+        mismatched = verify_shards(manifest_filename)
+        if len(mismatched) > 0:
+            raise ValueError("Shards do not match the manifest: {0}".format(
+                ', '.join(mismatched)))
+    with open(manifest_filename) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError("Unknown manifest version in {0}".format(
+            manifest_filename))
+    directory = os.path.dirname(manifest_filename)
+    filenames = [os.path.join(directory, shard['filename'])
+                 for shard in manifest['shards']]
+    readers, shard_files = [], []
+    try:
+        for filename in filenames:
+            readers.append(marc_reader.MappedMARCReader(filename))
+            shard_files.append(open(filename, 'rb'))
+        numbers = [decode_numbers(shard['numbers'])
+                   for shard in manifest['shards']]
+        for reader, shard_numbers, filename in zip(readers,
+                                                   numbers,
+                                                   filenames):
+            if len(reader) != len(shard_numbers):
+                raise ValueError("Shard {0} does not match the manifest".format(
+                    filename))
+        with open(output_filename, 'wb', SPLICE_BYTES) as output_file:
+
+            def copy(shard, start, end):
+                reader = readers[shard]
+                offset = reader.offset(start)
+                length = reader.offset(end) - offset
+                if length < SPLICE_BYTES:
+                    output_file.write(reader.mapping[offset:offset + length])
+                    return
+                output_file.flush()
+                splice(shard_files[shard], output_file, offset, length)
+
+            run = None
+            for number, shard, i in heapq.merge(
+                    *[_shard_records(shard, shard_numbers)
+                      for shard, shard_numbers in enumerate(numbers)]):
+                if run is not None and run[0] == shard and run[2] == i:
+                    run[2] += 1
+                    continue
+                if run is not None:
+                    copy(*run)
+                run = [shard, i, i + 1]
+            if run is not None:
+                copy(*run)
+    finally:
+        for reader in readers:
+            reader.close()
+        for shard_file in shard_files:
+            shard_file.close()
+    return manifest['records']
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
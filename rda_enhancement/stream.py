@@ -0,0 +1,130 @@
+"""-------------------------------------------------------------------------------
+# Name:        stream
+# Purpose:     Converts iterables of MARC21 records to RDA lazily, for
+#              programs that already have records in memory or in a stream
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+try:
+    import marc_reader
+    import marc_writer
+    import parallel
+    import pcc_conversion
+    import prefilter
+except ImportError:
+    from . import marc_reader
+    from . import marc_writer
+    from . import parallel
+    from . import pcc_conversion
+    from . import prefilter
+
+import logging
+import pymarc
+
+def convert_stream(records,
+                   output=None,
+                   fast_path=True,
+                   rules=None,
+                   stats=None,
+                   on_error='raise'):
+    """Generator converts records to RDA one at a time, so memory use does
+    not grow with the number of records. pymarc.Record objects are
+    converted in place, without copying them, and their fields sorted by
+    tag.
+
+    Args:
+        records(iterable): pymarc.Record objects or raw ISO 2709 records
+                           as bytes, or a binary file object such as
+                           socket.makefile('rb') to read raw records from
+        output(str): 'record' yields pymarc.Record objects, 'marc' yields
+                     bytes, None yields the same kind as each input record
+        fast_path(boolean): Yield raw records the conversion would not
+                            change without decoding them
+        rules(rules.ExecutionPlan): Rules of the conversion, defaults to
+                                    the PCC rules
+        stats(instrumentation.ConversionStats): Optional stats that the
+                                                conversion steps are timed into
+        on_error(str): 'raise' stops at a record that fails to convert
+                       with an errors.ConversionError naming the step that
+                       failed, 'skip' logs the error and leaves the
+                       record out
+
+    Yields:
+        pymarc.Record or bytes
+    """
+    if output not in (None, 'record', 'marc'):
+        raise ValueError("output must be None, 'record' or 'marc'")
+    if on_error not in ('raise', 'skip'):
+        raise ValueError("on_error must be 'raise' or 'skip'")
+    if hasattr(records, 'read'):
+        records = marc_reader.iter_raw_records(records)
+    for number, record in enumerate(records):
+        try:
+            converted = convert_record(record, output, fast_path, rules, stats)
+        except Exception as error:
+            if on_error == 'raise':
+                raise
+            logging.error(
+                "Failed to convert record number={}, error={}".format(
+                    number,
+                    error))
+            continue
+        yield converted
+
+def convert_record(record, output=None, fast_path=True, rules=None,
+                   stats=None):
+    """Function converts a single record, see convert_stream
+
+    Args:
+        record(pymarc.Record or bytes): MARC21 record
+
+    Returns:
+        pymarc.Record or bytes
+    """
+    if isinstance(record, pymarc.Record):
+        pcc_conversion.PCCMARCtoRDAConversion(record, stats, rules).convert()
+        if output == 'marc':
+            return marc_writer.serialize_record(record)
+        # In tag order like the records run.py and 'marc' output write, the
+        # sort is stable so fields with the same tag keep their order
+        record.fields.sort(key=lambda field: field.tag)
+        return record
+    raw_record = bytes(record)
+    if output == 'record':
+        record = pymarc.Record(data=raw_record, to_unicode=True)
+        return convert_record(record, output, fast_path, rules, stats)
+    if fast_path:
+        marc = prefilter.convert_record(raw_record, rules, stats=stats)
+        if marc is not None:
+            return marc
+    return parallel.convert_raw_record(raw_record, stats, rules)
+
+def convert_batch(records,
+                  output=None,
+                  fast_path=True,
+                  rules=None,
+                  stats=None,
+                  on_error='raise'):
+    """Function converts a batch of records and returns them as a list, see
+    convert_stream
+
+    Returns:
+        list of pymarc.Record or bytes
+    """
+    return list(convert_stream(records,
+                               output,
+                               fast_path,
+                               rules,
+                               stats,
+                               on_error))
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""-------------------------------------------------------------------------------
+# Name:        synthetic
+# Purpose:     Generates reproducible synthetic MARC21 corpora of AACR2 and
+#              RDA records for benchmarking and testing the RDA conversion
+#
+# Author:      Jeremy Nelson
+#
+# Created:     2026/10/18
+# Copyright:   (c) Jeremy Nelson, Colorado College 2026
+# Licence:     MIT
+#------------------------------------------------------------------------------"""
+
+import datetime
+import pymarc
+import random
+
+TITLES = ('Basic concepts of probability and statistics in the law',
+          'ASP.NET Web API 2 recipes',
+          'The pragmatic programmer',
+          'Music of the Rocky Mountain West',
+          'Colorado water law for non-lawyers',
+          'Cataloging and classification',
+          'Symphonies no. 4 and 5')
+SUBTITLES = ('a problem solution approach',
+             'from journeyman to master',
+             'an introduction',
+             'selected essays')
+AUTHORS = ('Finkelstein, Michael O.',
+           'Wojcieszyn, Filip.',
+           'Hunt, Andrew.',
+           'Nelson, Jeremy.')
+PLACES = ('Berkeley, CA', 'New York', 'Colorado Springs, Colo.', 'London')
+PUBLISHERS = ('Apress', 'Springer', 'Libraries Unlimited', 'Oxford')
+SUBJECTS = ('Computer science.', 'Law -- Statistical methods.',
+            'Music -- West (U.S.)', 'Cataloging.')
+# 007 values with their matching leader/06 type of record and the 336,
+# 337 and 338 of an RDA record of that carrier
+CARRIERS = (('a', 'cr nn 008mamaa',
+             ('text', 'txt'), ('computer', 'c'), ('online resource', 'cr')),
+            ('a', 'cd |||||||||||',
+             ('text', 'txt'), ('computer', 'c'), ('computer disc', 'cd')),
+            ('j', 'sd fsngnnmmned',
+             ('performed music', 'prm'), ('audio', 's'),
+             ('audio disc', 'sd')),
+            ('i', 'ss lnjlcnnnuue',
+             ('spoken word', 'spw'), ('audio', 's'),
+             ('audiocassette', 'ss')),
+            ('g', 'vd cvaizq',
+             ('two-dimensional moving image', 'tdi'), ('video', 'v'),
+             ('videodisc', 'vd')),
+            ('a', 'hd afb---buca',
+             ('text', 'txt'), ('microform', 'h'), ('microfilm reel', 'hd')))
+
+class SyntheticCorpus(object):
+    """Reproducible generator of AACR2 and RDA MARC21 records. The same
+    seed and options always generate the same records.
+
+    Attributes:
+        seed: seed of the random number generator
+        aacr2_share: share of records in AACR2 form, the rest are RDA
+        abbreviation_density: chance each 245/264/300/5XX abbreviation
+                              site gets an abbreviation
+        multiple_007_share: share of records with more than one 007
+        note_count: maximum number of 500/504 notes in a record
+    """
+
+    def __init__(self,
+                 seed=0,
+                 aacr2_share=0.5,
+                 abbreviation_density=0.5,
+                 multiple_007_share=0.1,
+                 note_count=3):
+        self.seed = seed
+        self.aacr2_share = aacr2_share
+        self.abbreviation_density = abbreviation_density
+        self.multiple_007_share = multiple_007_share
+        self.note_count = note_count
+
+    def __abbreviate__(self, rng, abbreviation, expansion):
+        if rng.random() < self.abbreviation_density:
+            return abbreviation
+        return expansion
+
+    def __start_record__(self, rng, number):
+        # Leader and fields up to the 100, shared by both forms, returns
+        # the record and the CARRIERS entries of its 007s
+        carriers = [rng.choice(CARRIERS)]
+        if rng.random() < self.multiple_007_share:
+            carriers.append(rng.choice(CARRIERS))
+        record = pymarc.Record()
+        record.leader = '00000n{0}m a2200000 i 4500'.format(carriers[0][0])
+        record.add_field(
+            pymarc.Field('001', data='syn{0:09d}'.format(number)),
+            pymarc.Field('005', data='{0:%Y%m%d%H%M%S}.0'.format(
+                datetime.datetime(2014, 1, 1) +
+                datetime.timedelta(seconds=rng.randint(0, 10 ** 8)))))
+        for carrier in carriers:
+            record.add_field(pymarc.Field('007', data=carrier[1]))
+        record.add_field(
+            pymarc.Field('008',
+                         data='140807s2014    xxu|    s    |||| 0|eng d'),
+            pymarc.Field('020', [' ', ' '],
+                         ['a', '978{0:010d}'.format(number)]),
+            pymarc.Field('100', ['1', ' '], ['a', rng.choice(AUTHORS)]))
+        return record, carriers
+
+    def __end_record__(self, rng, number, record):
+        # Summary, subjects and link, shared by both forms
+        record.add_field(
+            pymarc.Field('520', [' ', ' '],
+                         ['a', ' '.join(rng.choice(TITLES)
+                                        for i in range(rng.randint(5, 40)))]))
+        for i in range(rng.randint(1, 4)):
+            record.add_field(
+                pymarc.Field('650', [' ', '0'], ['a', rng.choice(SUBJECTS)]))
+        record.add_field(
+            pymarc.Field('856', ['4', '0'],
+                         ['u', 'http://dx.doi.org/10.1007/{0}'.format(number)]))
+        return record
+
+    def aacr2_record(self, rng, number):
+        """Method generates a record in AACR2 form, with a GMD, abbreviations
+        and no 33X fields
+
+        Args:
+            rng(random.Random): Random number generator
+            number(int): Record number used in the 001
+
+        Returns:
+            pymarc.Record
+        """
+        record, carriers = self.__start_record__(rng, number)
+        subfields = ['a', rng.choice(TITLES),
+                     'h', '[electronic resource] :']
+        if rng.random() < 0.5:
+            subfields += ['b', '{0} /'.format(rng.choice(SUBTITLES))]
+        responsibility = 'by {0}'.format(rng.choice(AUTHORS))
+        if rng.random() < self.abbreviation_density:
+            responsibility += ' … [et al.]'
+        subfields += ['c', responsibility]
+        record.add_field(pymarc.Field('245', ['1', '0'], subfields))
+        record.add_field(pymarc.Field('264', [' ', rng.choice(' 1')], [
+            'a', self.__abbreviate__(rng,
+                                     '[S.l.] :',
+                                     '{0} :'.format(rng.choice(PLACES))),
+            'b', self.__abbreviate__(rng,
+                                     '[s.n.],',
+                                     '{0},'.format(rng.choice(PUBLISHERS))),
+            'c', '2014.']))
+        extent = '{0} {1}'.format(rng.randint(1, 999),
+                                  self.__abbreviate__(rng, 'p.', 'pages'))
+        details = ', '.join([
+            self.__abbreviate__(rng, 'ill.', 'illustrations'),
+            self.__abbreviate__(rng, 'facsims.', 'facsimiles'),
+            self.__abbreviate__(rng, 'sd.', 'sound')])
+        record.add_field(pymarc.Field('300', [' ', ' '], [
+            'a', '{0} :'.format(extent),
+            'b', '{0} ;'.format(details),
+            'c', '24 cm.']))
+        for i in range(rng.randint(0, self.note_count)):
+            note = 'Includes {0} and bibliographical references ({1} 5-9).'
+            record.add_field(pymarc.Field(rng.choice(('500', '504')),
+                                          [' ', ' '],
+                                          ['a', note.format(
+                self.__abbreviate__(rng, 'introd.', 'introduction'),
+                self.__abbreviate__(rng, 'p.', 'pages'))]))
+        return self.__end_record__(rng, number, record)
+
+    def rda_record(self, rng, number):
+        """Method generates a record in RDA form from fixed templates, with
+        no GMD or abbreviations and the 336, 337 and 338 of its carriers
+
+        Args:
+            rng(random.Random): Random number generator
+            number(int): Record number used in the 001
+
+        Returns:
+            pymarc.Record
+        """
+        record, carriers = self.__start_record__(rng, number)
+        subfields = ['a', rng.choice(TITLES)]
+        if rng.random() < 0.5:
+            subfields[-1] += ' :'
+            subfields += ['b', rng.choice(SUBTITLES)]
+        subfields[-1] += ' /'
+        responsibility = 'by {0}'.format(rng.choice(AUTHORS))
+        if rng.random() < 0.5:
+            responsibility += ' [and others]'
+        subfields += ['c', responsibility]
+        record.add_field(pymarc.Field('245', ['1', '0'], subfields))
+        record.add_field(pymarc.Field('264', [' ', '1'], [
+            'a', '{0} :'.format(rng.choice(PLACES)),
+            'b', '{0},'.format(rng.choice(PUBLISHERS)),
+            'c', '2014.']))
+        record.add_field(pymarc.Field('300', [' ', ' '], [
+            'a', '{0} pages :'.format(rng.randint(1, 999)),
+            'b', 'illustrations, facsimiles, sound ;',
+            'c', '24 cm.']))
+        record.add_field(pymarc.Field('336', [' ', ' '], [
+            'a', carriers[0][2][0], 'b', carriers[0][2][1],
+            '2', 'rdacontent']))
+        for tag, position, source in (('337', 3, 'rdamedia'),
+                                      ('338', 4, 'rdacarrier')):
+            for carrier in carriers:
+                record.add_field(pymarc.Field(tag, [' ', ' '], [
+                    'a', carrier[position][0], 'b', carrier[position][1],
+                    '2', source]))
+        # Converted records have their fields in tag order
+        for tag in sorted(rng.choice(('500', '504'))
+                          for i in range(rng.randint(0, self.note_count))):
+            record.add_field(pymarc.Field(tag, [' ', ' '], [
+                'a', 'Includes introduction and bibliographical references '
+                     '(pages 5-9).']))
+        return self.__end_record__(rng, number, record)
+
+    def records(self, count):
+        """Generator yields count raw records in transmission format, a
+        share of them generated in AACR2 form and the rest in RDA form
+
+        Args:
+            count(int): Number of records
+
+        Yields:
+            bytes
+        """
+        rng = random.Random(self.seed)
+        for number in range(count):
+            if rng.random() < self.aacr2_share:
+                record = self.aacr2_record(rng, number)
+            else:
+                record = self.rda_record(rng, number)
+            yield record.as_marc()
+
+    def save(self, filename, count):
+        """Method writes count records to a file
+
+        Args:
+            filename(str): File path
+            count(int): Number of records
+
+        Returns:
+            int, size of the file in bytes
+        """
+        size = 0
+        with open(filename, 'wb') as marc_file:
+            for raw_record in self.records(count):
+                marc_file.write(raw_record)
+                size += len(raw_record)
+        return size
+
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -10,11 +10,47 @@
 #----------------------------------------------------------------------------"""
 __author__ = "Jeremy Nelson, Anjali Ravunniarath, Jason Stewart"
 
+import analyzer
+import array
+import checkpoint
+import compact
+import contextlib
 import copy
+import dedup
+import errors
+import fingerprints
+import golden
+import io
+import itertools
+import json
+import marc_formats
+import os
+import parallel
+import pipeline
+import prefilter
 import pymarc
+import reporter
+import shards
+import shutil
+import sqlite3
+import stream
+import sys
+import tempfile
 import unittest
+import zlib
+from abbreviations import AbbreviationExpander, NOTE_ABBREVIATIONS
 from base_converter import BaseMARC21Conversion
+from checkpoint import Checkpoint
+from instrumentation import ConversionStats
+from marc_reader import control_number, iter_raw_records, MappedMARCReader
+from marc_writer import BufferedMARCWriter, serialize_record
 from pcc_conversion import PCCMARCtoRDAConversion
+from rules import RewriteCache, RuleSet, load_plan
+from synthetic import SyntheticCorpus
+
+# run.py is in the directory above the package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run
 
 FIELD245_1 = pymarc.Field(
             tag='245',
@@ -51,6 +87,54 @@ class BaseMARC21ConversionTests(unittest.TestCase):
             "=245  10$aASP.NET Web API 2 Recipes :$bA Problem Solution Approach /$cby Filip Wojcieszyn.",
             str(new_field245))
 
+    def test_rewrite_subfields_keeps_order(self):
+        field = pymarc.Field('500', [' ', ' '],
+                             ['a', 'one', 'b', 'two', 'a', 'three'])
+        changed = self.marc21_converter.rewriteSubfields(
+            field,
+            lambda code, value: value.upper() if code == 'a' else value)
+        self.assertTrue(changed)
+        self.assertEqual(field.subfields,
+                         ['a', 'ONE', 'b', 'two', 'a', 'THREE'])
+
+    def test_rewrite_subfields_drop(self):
+        field = copy.deepcopy(FIELD245_1)
+        changed = self.marc21_converter.rewriteSubfields(
+            field,
+            lambda code, value: None if code == 'h' else value)
+        self.assertTrue(changed)
+        self.assertEqual(field.subfields[0::2], ['a', 'c'])
+
+    def test_rewrite_subfields_unchanged(self):
+        field = copy.deepcopy(FIELD300_1)
+        subfields = field.subfields
+        self.assertFalse(self.marc21_converter.rewriteSubfields(
+            field,
+            lambda code, value: value))
+        self.assertIs(field.subfields, subfields)
+
+    def test_get_fields_index(self):
+        self.marc21_converter.record = self.record_1
+        self.assertEqual(self.marc21_converter.getFields('650', '245'),
+                         self.record_1.get_fields('650') +
+                         self.record_1.get_fields('245'))
+        self.assertTrue(self.marc21_converter.hasField('007'))
+        self.assertFalse(self.marc21_converter.hasField('500'))
+
+    def test_replace_field_index(self):
+        self.marc21_converter.record = self.record_1
+        field245 = self.record_1['245']
+        position = self.record_1.fields.index(field245)
+        new_field245 = self.marc21_converter.__format245__(field245)
+        self.marc21_converter.replaceField(field245, new_field245)
+        self.assertIs(self.record_1.fields[position], new_field245)
+        self.assertEqual(self.marc21_converter.getFields('245'),
+                         [new_field245])
+        field500 = pymarc.Field('500', [' ', ' '], ['a', 'Note.'])
+        self.marc21_converter.addField(field500)
+        self.assertEqual(self.marc21_converter.getFields('500'), [field500])
+        self.assertIs(self.record_1['500'], field500)
+
 
     def tearDown(self):
         pass
@@ -71,6 +155,35 @@ class PCCMARCtoRDAConversionTests(unittest.TestCase):
             "=245  10$aASP.NET Web API 2 Recipes :$bA Problem Solution Approach /$cby Filip Wojcieszyn.",
             str(self.record_1['245']))
 
+    def test_remove245EllipsesChangeLatin(self):
+        field245 = pymarc.Field('245', ['1', '0'], [
+            'a', 'Proceedings /',
+            'c', 'edited by Jane Smith \u2026 [et al.]'])
+        self.converter.remove245EllipsesChangeLatin(field245)
+        self.assertEqual(field245.subfields, [
+            'a', 'Proceedings /',
+            'c', 'edited by Jane Smith  [and others]'])
+
+    def test_create33X(self):
+        self.record_1.remove_fields('336', '337', '338')
+        self.record_1.add_field(pymarc.Field('007', data='sd fsngnnmmned'))
+        self.converter.create336()
+        self.converter.create337()
+        self.converter.create338()
+        self.assertEqual(
+            [str(field) for field in self.record_1.get_fields('336', '337', '338')],
+            ["=336  \\\\$atext$btxt$2rdacontent",
+             "=337  \\\\$acomputer$bc$2rdamedia",
+             "=337  \\\\$aaudio$bs$2rdamedia",
+             "=338  \\\\$aonline resource$bcr$2rdacarrier",
+             "=338  \\\\$aaudio disc$bsd$2rdacarrier"])
+
+    def test_create33X_existing(self):
+        self.converter.create336()
+        self.converter.create337()
+        self.converter.create338()
+        self.assertEqual(len(self.record_1.get_fields('336', '337', '338')), 3)
+
     def test_convert264(self):
         record = pymarc.Record()
         record.add_field(
@@ -91,7 +204,16 @@ class PCCMARCtoRDAConversionTests(unittest.TestCase):
 
 
     def test_convert300(self):
-        pass
+        record = pymarc.Record()
+        record.add_field(
+            pymarc.Field('300', [' ', ' '], ['a', 'xxvi, 368 p. :',
+                                             'b', 'ill., facsims. ;',
+                                             'c', '24 cm.']))
+        converter = PCCMARCtoRDAConversion(record)
+        self.assertEqual(converter.convert300(), 1)
+        self.assertEqual(
+            str(record['300']),
+            "=300  \\\\$axxvi, 368 pages :$billustrations, facsimiles ;$c24 cm.")
 
     def test_convert300_a1(self):
         record = pymarc.Record()
@@ -145,6 +267,1264 @@ class PCCMARCtoRDAConversionTests(unittest.TestCase):
     def tearDown(self):
         pass
 
+class AbbreviationExpanderTests(unittest.TestCase):
+
+    def test_expand_single_pass(self):
+        expander = AbbreviationExpander(NOTE_ABBREVIATIONS)
+        self.assertEqual(expander.expand("Includes introd. and p. 5-9."),
+                         "Includes Introduction and pages 5-9.")
+
+    def test_expand_rule_order(self):
+        expander = AbbreviationExpander(((r"ab", "1"), (r"a", "2")))
+        self.assertEqual(expander.expand("aba"), "12")
+
+    def test_convert500_introduction(self):
+        record = pymarc.Record()
+        record.add_field(
+            pymarc.Field('500', [' ', ' '], ['a', 'Includes introd.',
+                                             '5', 'CoCC']))
+        converter = PCCMARCtoRDAConversion(record)
+        converter.convert500s()
+        self.assertEqual(record['500'].subfields,
+                         ['a', 'Includes Introduction', '5', 'CoCC'])
+
+
+class RuleSetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.record = pymarc.Record()
+        self.record.leader = '00000nam a2200000 i 4500'
+        self.record.add_field(
+            pymarc.Field('505', ['0', ' '], ['a', 'Contents: v. 1. Law']),
+            pymarc.Field('505', ['0', ' '], ['a', 'Chapters: v. 1. Law']))
+        self.local_rules = RuleSet([{'tag': '505',
+                                     'pattern': r'\bv\.',
+                                     'replacement': 'volume',
+                                     'guard': '^Contents'}])
+
+    def test_guard(self):
+        plan = self.local_rules.compile()
+        converter = PCCMARCtoRDAConversion(self.record, rules=plan)
+        self.assertEqual(converter.convertLocalRules(), 1)
+        self.assertEqual(
+            [field['a'] for field in self.record.get_fields('505')],
+            ['Contents: volume 1. Law', 'Chapters: v. 1. Law'])
+
+    def test_indicator_rule(self):
+        plan = RuleSet([{'tag': '505',
+                         'indicator': 2,
+                         'pattern': r'\s*',
+                         'replacement': '0'}]).compile()
+        PCCMARCtoRDAConversion(self.record, rules=plan).convertLocalRules()
+        self.assertEqual(self.record['505'].indicators, ['0', '0'])
+
+    def test_invalid_rule(self):
+        self.assertRaises(ValueError, RuleSet, [{'tag': '505'}])
+        for rule in [{'pattern': r'\bv\.(', 'replacement': 'volume'},
+                     {'pattern': 1, 'replacement': 'volume'},
+                     {'pattern': r'\bv\.', 'replacement': None},
+                     {'pattern': r'\bv\.', 'replacement': 'volume',
+                      'guard': '^(Contents'}]:
+            self.assertRaises(ValueError, RuleSet, [dict(rule, tag='505')])
+        self.assertRaises(ValueError, RuleSet, ['505'])
+
+    def test_null_guard(self):
+        plan = RuleSet([{'tag': '505',
+                         'pattern': r'\bv\.',
+                         'replacement': 'volume',
+                         'subfields': None,
+                         'guard': None}]).compile()
+        PCCMARCtoRDAConversion(self.record, rules=plan).convertLocalRules()
+        self.assertEqual(
+            [field['a'] for field in self.record.get_fields('505')],
+            ['Contents: volume 1. Law', 'Chapters: volume 1. Law'])
+
+    def test_rule_group(self):
+        # Rules with the same guard are one pass, the earlier rule wins at
+        # the same position and neither sees the other's replacement
+        plan = RuleSet([{'tag': '505', 'pattern': r'\bv\.',
+                         'replacement': 'volume'},
+                        {'tag': '505', 'pattern': r'\bv\. 1\b',
+                         'replacement': 'first volume'},
+                        {'tag': '505', 'pattern': r'\bvolume\b',
+                         'replacement': 'vol.'}]).compile()
+        self.assertEqual(plan.get('505').rewrite('a', 'Contents: v. 1. Law'),
+                         'Contents: volume 1. Law')
+
+    def test_fingerprint(self):
+        self.assertEqual(self.local_rules.fingerprint(),
+                         RuleSet(self.local_rules.rules).fingerprint())
+        self.assertNotEqual(self.local_rules.fingerprint(),
+                            RuleSet().fingerprint())
+
+    def test_load_plan(self):
+        spec_filename = tempfile.mktemp(suffix='.json')
+        try:
+            with open(spec_filename, 'w') as spec_file:
+                json.dump({'rules': self.local_rules.rules}, spec_file)
+            plan = load_plan(spec_filename)
+        finally:
+            os.remove(spec_filename)
+        self.assertIn('505', plan)
+        self.assertIn('300', plan)
+        raw_record = parallel.convert_raw_record(self.record.as_marc())
+        self.assertTrue(prefilter.needs_conversion(raw_record, plan))
+        converted = parallel.convert_raw_record(raw_record, rules=plan)
+        self.assertIn(b'Contents: volume 1.', converted)
+        self.assertFalse(prefilter.needs_conversion(converted, plan))
+
+
+class RewriteCacheTests(unittest.TestCase):
+
+    def test_least_recently_used(self):
+        cache = RewriteCache(2)
+        cache.put('a', '1')
+        cache.put('b', '2')
+        self.assertEqual(cache.get('a'), '1')
+        cache.put('c', '3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_plan_cache(self):
+        plan = load_plan(cache_size=10)
+        for i in range(2):
+            record = pymarc.Record()
+            record.add_field(copy.deepcopy(FIELD300_1))
+            PCCMARCtoRDAConversion(record, rules=plan).convert300()
+            self.assertEqual(record['300']['a'], '149 pages ;')
+        self.assertEqual((plan.cache.hits, plan.cache.misses), (1, 1))
+
+    def test_convert_chunk_cache_stats(self):
+        results, stats = parallel.convert_chunk((0, [REC_1, REC_1]),
+                                                fast_path=False,
+                                                instrument=True,
+                                                cache_size=100)
+        self.assertEqual(results[0][1], results[1][1])
+        self.assertGreater(stats['rule_cache']['hits'], 0)
+
+
+class ConversionStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.record_1 = pymarc.Record()
+        self.record_1.decode_marc(REC_1)
+        self.stats = ConversionStats()
+
+    def test_convert_stats(self):
+        PCCMARCtoRDAConversion(self.record_1, self.stats).convert()
+        steps = self.stats.as_dict()
+        self.assertEqual(sorted(steps), sorted(PCCMARCtoRDAConversion.steps))
+        self.assertEqual(steps['convert245']['fields_modified'], 1)
+        self.assertEqual(steps['convert300']['fields_modified'], 1)
+        self.assertEqual(steps['create336']['fields_modified'], 0)
+
+    def test_merge(self):
+        self.stats.add('convert300', 0.5, 1)
+        other = ConversionStats()
+        other.add('convert300', 0.25, 0)
+        other.add('create336', 0.125, 1)
+        self.stats.merge(other.as_dict())
+        self.assertEqual(self.stats.steps['convert300'],
+                         {'calls': 2, 'seconds': 0.75, 'fields_modified': 1})
+        self.assertEqual(self.stats.steps['create336']['calls'], 1)
+
+    def test_to_prometheus(self):
+        self.stats.add('convert300', 0.5, 1)
+        self.assertIn('rda_conversion_step_seconds_total{step="convert300"} 0.5',
+                      self.stats.to_prometheus())
+
+    def test_count(self):
+        self.stats.count('rule_cache', 'hits', 3)
+        self.stats.merge({'rule_cache': {'hits': 2, 'misses': 1}})
+        self.assertEqual(self.stats.steps['rule_cache']['hits'], 5)
+        self.assertIn('rda_conversion_step_hits_total{step="rule_cache"} 5',
+                      self.stats.to_prometheus())
+
+
+class BufferedMARCWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.record_1 = pymarc.Record()
+        self.record_1.decode_marc(REC_1)
+
+    def test_serialize_record(self):
+        self.assertEqual(serialize_record(self.record_1), REC_1)
+        self.record_1.add_field(pymarc.Field('001', data='1'))
+        marc = serialize_record(self.record_1)
+        self.assertEqual(pymarc.Record(data=marc).fields[1].data, '1')
+        self.assertEqual(serialize_record(self.record_1, False),
+                         self.record_1.as_marc())
+
+    def test_buffered_write(self):
+        output = io.BytesIO()
+        writer = BufferedMARCWriter(output, buffer_size=len(REC_1) * 2)
+        writer.write(REC_1)
+        self.assertEqual(output.getvalue(), b'')
+        writer.write_record(self.record_1)
+        self.assertEqual(output.getvalue(), REC_1 * 2)
+        writer.write(REC_1)
+        self.assertEqual(writer.tell(), len(REC_1) * 3)
+        writer.close()
+        self.assertEqual(output.getvalue(), REC_1 * 3)
+
+    def test_background_write(self):
+        output = io.BytesIO()
+        with BufferedMARCWriter(output, 1, background=True) as writer:
+            for i in range(50):
+                writer.write(REC_1)
+        self.assertEqual(output.getvalue(), REC_1 * 50)
+
+
+class MappedMARCReaderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rda_record = parallel.convert_raw_record(REC_1)
+        self.filename = os.path.join(self.directory, 'records.mrc')
+        with open(self.filename, 'wb') as marc_file:
+            marc_file.write(REC_1 + self.rda_record + REC_1)
+
+    def test_random_access(self):
+        with MappedMARCReader(self.filename) as reader:
+            self.assertEqual(len(reader), 3)
+            self.assertEqual(reader[1], self.rda_record)
+            self.assertEqual(reader[-1], REC_1)
+            self.assertEqual(bytes(reader.view(1)), self.rda_record)
+            self.assertEqual(list(reader.records(1, 10)),
+                             [self.rda_record, REC_1])
+
+    def test_ranges(self):
+        with MappedMARCReader(self.filename) as reader:
+            ranges = list(reader.ranges(2, start=1))
+        self.assertEqual([first for first, records in ranges], [1])
+        self.assertEqual(list(ranges[0][1]), [self.rda_record, REC_1])
+        # A new file of the same size moved over the old one is mapped again
+        new_filename = os.path.join(self.directory, 'new.mrc')
+        with open(new_filename, 'wb') as marc_file:
+            marc_file.write(REC_1 + REC_1 + self.rda_record)
+        modified = os.stat(self.filename).st_mtime_ns
+        os.utime(new_filename, ns=(modified, modified + 1000000000))
+        os.replace(new_filename, self.filename)
+        # Offsets read from the old file are not used on the new one
+        self.assertRaises(ValueError, list, ranges[0][1])
+        with MappedMARCReader(self.filename) as reader:
+            ranges = list(reader.ranges(2, start=1))
+        self.assertEqual(list(ranges[0][1]), [REC_1, self.rda_record])
+
+    def test_saved_index(self):
+        with MappedMARCReader(self.filename, save_index=True) as reader:
+            offsets = reader.offsets
+        self.assertTrue(os.path.exists(self.filename + '.idx'))
+        with MappedMARCReader(self.filename) as reader:
+            self.assertEqual(reader.offsets, offsets)
+
+    def test_stale_index(self):
+        MappedMARCReader(self.filename, save_index=True).close()
+        with open(self.filename, 'ab') as marc_file:
+            marc_file.write(REC_1)
+        with MappedMARCReader(self.filename) as reader:
+            self.assertEqual(len(reader), 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class CheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'rda.mrc.checkpoint')
+
+    def test_load_missing(self):
+        self.assertIsNone(Checkpoint.load(self.filename))
+
+    def test_save_load(self):
+        Checkpoint(4373000, 2500, 4370000, 3).save(self.filename)
+        progress = Checkpoint.load(self.filename)
+        self.assertEqual(progress.input_offset, 4373000)
+        self.assertEqual(progress.record_count, 2500)
+        self.assertEqual(progress.output_offset, 4370000)
+        self.assertEqual(progress.error_count, 3)
+        self.assertEqual(os.listdir(self.directory), ['rda.mrc.checkpoint'])
+
+    def test_remove(self):
+        Checkpoint(4373000, 2500, 4370000, 3).save(self.filename)
+        Checkpoint.remove(self.filename)
+        self.assertEqual(os.listdir(self.directory), [])
+        Checkpoint.remove(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class PrefilterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rda_record = parallel.convert_raw_record(REC_1)
+
+    def test_needs_conversion_aacr2(self):
+        self.assertTrue(prefilter.needs_conversion(REC_1))
+
+    def test_needs_conversion_rda(self):
+        self.assertFalse(prefilter.needs_conversion(self.rda_record))
+        self.assertEqual(parallel.convert_raw_record(self.rda_record),
+                         self.rda_record)
+
+    def test_needs_conversion_marc8(self):
+        marc8_record = self.rda_record[0:9] + b' ' + self.rda_record[10:]
+        self.assertFalse(prefilter.needs_conversion(marc8_record))
+        diacritic = marc8_record.replace(b'Filip', b'Fil\xe2ip')
+        self.assertTrue(prefilter.needs_conversion(diacritic))
+
+    def test_needs_conversion_malformed(self):
+        self.assertTrue(prefilter.needs_conversion(b'00005'))
+
+    def test_convert_record(self):
+        self.assertIs(prefilter.convert_record(self.rda_record),
+                      self.rda_record)
+        stats = ConversionStats()
+        self.assertEqual(prefilter.convert_record(REC_1, stats=stats),
+                         golden.reference_convert(REC_1))
+        # The steps run once, in the check
+        self.assertEqual(stats.as_dict()['convert245']['calls'], 1)
+        self.assertIsNone(prefilter.convert_record(b'00005'))
+
+    def test_convert_chunk_fast_path(self):
+        results, stats = parallel.convert_chunk((0, [self.rda_record, REC_1]))
+        self.assertIs(results[0][1], self.rda_record)
+        self.assertEqual(results[1][1], self.rda_record)
+
+
+class FingerprintStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rda_record = parallel.convert_raw_record(REC_1)
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'fingerprints.db')
+        self.plan = parallel.load_plan()
+        with fingerprints.FingerprintStore(
+                self.filename,
+                fingerprints.rule_version(self.plan)) as store:
+            store.add(REC_1, self.rda_record)
+            store.commit()
+
+    def test_record_fingerprint(self):
+        control_number, fingerprint = fingerprints.record_fingerprint(REC_1)
+        self.assertEqual(control_number, '978-1-4302-5981-7')
+        record = pymarc.Record(data=REC_1, to_unicode=True)
+        record.add_field(pymarc.Field('650', [' ', '0'], ['a', 'Law.']))
+        self.assertEqual(fingerprints.record_fingerprint(record.as_marc()),
+                         (control_number, fingerprint))
+        self.assertNotEqual(
+            fingerprints.record_fingerprint(self.rda_record)[1],
+            fingerprint)
+
+    def test_unchanged(self):
+        store = fingerprints.open_store(self.filename, self.plan)
+        self.assertEqual(store.unchanged([REC_1, self.rda_record, b'00005']),
+                         set([0, 1]))
+        self.assertEqual(store.unchanged([REC_1, self.rda_record], True),
+                         set([1]))
+        # A change to a field the conversion does not read is still a change
+        record = pymarc.Record(data=REC_1, to_unicode=True)
+        record.add_field(pymarc.Field('650', [' ', '0'], ['a', 'Law.']))
+        self.assertEqual(store.unchanged([record.as_marc()]), set())
+        record = pymarc.Record(data=self.rda_record, to_unicode=True)
+        record.add_field(pymarc.Field('650', [' ', '0'], ['a', 'Law.']))
+        self.assertEqual(store.unchanged([record.as_marc()]), set())
+        self.assertEqual(store.unchanged([record.as_marc()], True), set([0]))
+        store = fingerprints.FingerprintStore(self.filename,
+                                              'other rule version',
+                                              read_only=True)
+        self.assertEqual(store.unchanged([REC_1]), set())
+
+    def test_open_store_replaced(self):
+        store = fingerprints.open_store(self.filename, self.plan)
+        self.assertIs(fingerprints.open_store(self.filename, self.plan), store)
+        new_filename = os.path.join(self.directory, 'new.db')
+        with fingerprints.FingerprintStore(
+                new_filename,
+                fingerprints.rule_version(self.plan)) as new_store:
+            new_store.add(self.rda_record, self.rda_record)
+            new_store.commit()
+        os.replace(new_filename, self.filename)
+        replaced = fingerprints.open_store(self.filename, self.plan)
+        self.assertIsNot(replaced, store)
+        self.assertEqual(replaced.unchanged([REC_1, self.rda_record]),
+                         set([1]))
+        self.assertRaises(sqlite3.ProgrammingError, len, store)
+
+    def test_store_without_hashes(self):
+        filename = os.path.join(self.directory, 'old.db')
+        connection = sqlite3.connect(filename)
+        connection.execute(
+            """CREATE TABLE fingerprints (
+                   control_number TEXT PRIMARY KEY,
+                   input_fingerprint TEXT NOT NULL,
+                   output_fingerprint TEXT NOT NULL,
+                   rule_version TEXT NOT NULL)""")
+        connection.execute(
+            "INSERT INTO fingerprints VALUES (?, ?, ?, ?)",
+            fingerprints.record_fingerprint(REC_1) +
+            (fingerprints.record_fingerprint(self.rda_record)[1],
+             fingerprints.rule_version(self.plan)))
+        connection.commit()
+        connection.close()
+        with fingerprints.FingerprintStore(
+                filename,
+                fingerprints.rule_version(self.plan)) as store:
+            self.assertEqual(store.unchanged([REC_1]), set())
+            store.add(REC_1, self.rda_record)
+            store.commit()
+            self.assertEqual(store.unchanged([REC_1]), set([0]))
+
+    def test_convert_chunk_unchanged(self):
+        results, stats = parallel.convert_chunk(
+            (0, [REC_1, self.rda_record]),
+            fingerprints_filename=self.filename)
+        self.assertEqual(results, [(0, None, None), (1, None, None)])
+        results, stats = parallel.convert_chunk(
+            (0, [REC_1, self.rda_record]),
+            fingerprints_filename=self.filename,
+            unchanged='copy')
+        self.assertEqual(results, [(0, self.rda_record, None),
+                                   (1, self.rda_record, None)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class SyntheticCorpusTests(unittest.TestCase):
+
+    def test_reproducible(self):
+        self.assertEqual(list(SyntheticCorpus(seed=7).records(20)),
+                         list(SyntheticCorpus(seed=7).records(20)))
+        self.assertNotEqual(list(SyntheticCorpus(seed=7).records(20)),
+                            list(SyntheticCorpus(seed=8).records(20)))
+
+    def test_aacr2_share(self):
+        aacr2 = SyntheticCorpus(aacr2_share=1.0).records(20)
+        self.assertTrue(all(prefilter.needs_conversion(raw_record)
+                            for raw_record in aacr2))
+        rda = list(SyntheticCorpus(aacr2_share=0.0).records(20))
+        self.assertFalse(any(prefilter.needs_conversion(raw_record)
+                             for raw_record in rda))
+        self.assertEqual([parallel.convert_raw_record(raw_record)
+                          for raw_record in rda], rda)
+
+    def test_multiple_007s(self):
+        corpus = SyntheticCorpus(multiple_007_share=1.0)
+        for raw_record in corpus.records(5):
+            record = pymarc.Record(data=raw_record)
+            self.assertEqual(len(record.get_fields('007')), 2)
+        corpus = SyntheticCorpus(aacr2_share=0.0, multiple_007_share=1.0)
+        for raw_record in corpus.records(5):
+            record = pymarc.Record(data=raw_record)
+            self.assertEqual(len(record.get_fields('337')), 2)
+            self.assertEqual(len(record.get_fields('338')), 2)
+
+
+class ParallelConversionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.raw_records = [REC_1, b'00005', REC_1, REC_1, REC_1]
+
+    def test_iter_raw_records(self):
+        marc_file = io.BytesIO(REC_1 * 3)
+        self.assertEqual(list(iter_raw_records(marc_file)), [REC_1] * 3)
+
+    def test_chunk_records(self):
+        chunks = list(parallel.chunk_records(self.raw_records, 2))
+        self.assertEqual([start for start, chunk in chunks], [0, 2, 4])
+        self.assertEqual(len(chunks[-1][1]), 1)
+
+    def test_convert_chunk_captures_errors(self):
+        results, stats = parallel.convert_chunk((0, self.raw_records))
+        self.assertEqual([i for i, marc, error in results], [0, 1, 2, 3, 4])
+        self.assertIsNone(results[0][2])
+        self.assertIsNone(results[1][1])
+        self.assertEqual(results[1][2].step, 'decode')
+        self.assertEqual(results[1][2].raw_record, b'00005')
+
+    def test_convert_chunks_input_order(self):
+        chunks = list(parallel.chunk_records(self.raw_records, 1))
+        serial = [parallel.convert_chunk(chunk) for chunk in chunks]
+        self.assertEqual(
+            list(parallel.convert_chunks(chunks, 2, max_pending=2)),
+            serial)
+
+    def test_convert_chunks_completion_order(self):
+        chunks = list(parallel.chunk_records(self.raw_records, 1))
+        results = parallel.convert_chunks(chunks, 2, order='completion')
+        self.assertEqual(
+            sorted(result for chunk, stats in results for result in chunk
+                   if result[2] is None),
+            sorted(result
+                   for chunk, stats in map(parallel.convert_chunk, chunks)
+                   for result in chunk if result[2] is None))
+
+    def test_convert_chunk_instrument(self):
+        results, stats = parallel.convert_chunk((0, self.raw_records),
+                                                instrument=True)
+        self.assertEqual(stats['prefilter']['calls'], 5)
+        self.assertEqual(stats['convert245']['calls'], 4)
+        self.assertEqual(stats['convert245']['fields_modified'], 4)
+        self.assertEqual(stats['prefilter']['fields_modified'], 4)
+        self.assertEqual(stats['prefilter']['fallbacks'], 1)
+        # Copied through unchanged
+        results, stats = parallel.convert_chunk(
+            (0, [parallel.convert_raw_record(REC_1)]),
+            instrument=True)
+        self.assertEqual(stats['prefilter']['fields_modified'], 0)
+
+
+class StreamTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rda_record = parallel.convert_raw_record(REC_1)
+
+    def test_convert_stream_raw(self):
+        converted = stream.convert_stream(iter([REC_1, self.rda_record]))
+        self.assertEqual(next(converted), self.rda_record)
+        self.assertEqual(next(converted), self.rda_record)
+        self.assertRaises(StopIteration, next, converted)
+
+    def test_convert_stream_record_in_place(self):
+        record = pymarc.Record(data=REC_1, to_unicode=True)
+        converted = stream.convert_batch([record])
+        self.assertIs(converted[0], record)
+        self.assertEqual(serialize_record(record), self.rda_record)
+
+    def test_convert_stream_record_sorted(self):
+        # The conversion adds 33X fields at the end, sorted like the
+        # converted raw record
+        record = pymarc.Record(data=REC_1, to_unicode=True)
+        for field in record.get_fields('336', '337', '338'):
+            record.remove_field(field)
+        raw_record = serialize_record(record)
+        converted = stream.convert_record(record)
+        self.assertEqual(serialize_record(converted, sort_fields=False),
+                         stream.convert_record(raw_record))
+
+    def test_convert_stream_file(self):
+        converted = stream.convert_batch(io.BytesIO(REC_1 * 2),
+                                         output='record')
+        self.assertEqual([record['001'].value() for record in converted],
+                         ['978-1-4302-5981-7'] * 2)
+
+    def test_convert_stream_skip_errors(self):
+        self.assertEqual(stream.convert_batch([b'00005', REC_1],
+                                              on_error='skip'),
+                         [self.rda_record])
+        self.assertRaises(Exception, stream.convert_batch, [b'00005'])
+
+
+class MarcFormatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rda_record = parallel.convert_raw_record(REC_1)
+        self.directory = tempfile.mkdtemp()
+
+    def __write__(self, format, raw_record=None):
+        filename = os.path.join(self.directory, 'records.{0}'.format(format))
+        with open(filename, 'wb') as output_file:
+            writer = marc_formats.FormatWriter(
+                BufferedMARCWriter(output_file),
+                format)
+            writer.write(raw_record or self.rda_record)
+            writer.write(raw_record or self.rda_record)
+            writer.close()
+        return filename
+
+    def test_xml_round_trip(self):
+        filename = self.__write__('xml')
+        self.assertEqual(marc_formats.detect_format(filename), 'xml')
+        with open(filename, 'rb') as xml_file:
+            records = list(marc_formats.iter_xml_records(xml_file))
+        self.assertEqual([serialize_record(record) for record in records],
+                         [self.rda_record] * 2)
+
+    def test_json_round_trip(self):
+        filename = self.__write__('json')
+        self.assertEqual(marc_formats.detect_format(filename), 'json')
+        with open(filename, 'rb') as json_file:
+            records = list(marc_formats.iter_json_records(json_file))
+        self.assertEqual([serialize_record(record) for record in records],
+                         [self.rda_record] * 2)
+
+    def test_streaming_reader(self):
+        reader = marc_formats.StreamingMARCReader(self.__write__('xml'),
+                                                  'xml')
+        self.assertEqual(list(reader.records(1)), [self.rda_record])
+        self.assertEqual(reader.offset(1), 1)
+
+    def test_marc8_diacritics(self):
+        marc8_record = REC_1[0:9] + b' ' + REC_1[10:]
+        marc8_record = marc8_record.replace(b'Filip.', b'Fil\xe2ip', 1)
+        # Converted MARC-8 records are written in Latin-1
+        converted = parallel.convert_raw_record(marc8_record)
+        self.assertIn(b'Fil\xedp', converted)
+        with open(self.__write__('json', converted), 'rb') as json_file:
+            record = json.loads(json_file.readline())
+        self.assertEqual(record['leader'][9], 'a')
+        field100 = next(field['100'] for field in record['fields']
+                        if '100' in field)
+        self.assertEqual(field100['subfields'][0]['a'],
+                         'Wojcieszyn, Fil\u00edp')
+        with open(self.__write__('xml', converted), 'rb') as xml_file:
+            records = list(marc_formats.iter_xml_records(xml_file))
+        self.assertEqual(records[0]['100']['a'], 'Wojcieszyn, Fil\u00edp')
+        self.assertEqual(records[0].leader[9], 'a')
+
+    def test_marc8_copied(self):
+        # Already converted, so --unchanged copy passes it through as MARC-8
+        marc8_record = self.rda_record[0:9] + b' ' + self.rda_record[10:]
+        marc8_record = marc8_record.replace(b'Filip.', b'Fil\xe2ip', 1)
+        input_filename = os.path.join(self.directory, 'records.mrc')
+        with open(input_filename, 'wb') as input_file:
+            input_file.write(marc8_record)
+        fingerprints_filename = os.path.join(self.directory, 'fingerprints.db')
+        json_filename = os.path.join(self.directory, 'rda.json')
+        with contextlib.redirect_stdout(io.StringIO()), \
+             contextlib.redirect_stderr(io.StringIO()):
+            for output_filename, unchanged in (('rda.mrc', 'skip'),
+                                               (json_filename, 'copy')):
+                run.convert(input_filename,
+                            os.path.join(self.directory, output_filename),
+                            fingerprints_filename=fingerprints_filename,
+                            unchanged=unchanged,
+                            progress_interval=0)
+        with open(json_filename, 'rb') as json_file:
+            record = json.loads(json_file.read().decode('utf-8'))
+        field100 = next(field['100'] for field in record['fields']
+                        if '100' in field)
+        self.assertEqual(field100['subfields'][0]['a'],
+                         'Wojcieszyn, Fil\u00edp')
+        self.assertEqual(record['leader'][9], 'a')
+
+    def test_unicode_leader(self):
+        record = marc_formats.json_to_record(
+            {'leader': '00000nam  2200000 i 4500',
+             'fields': [{'245': {'ind1': '0', 'ind2': '0',
+                                 'subfields': [{'a': 'Ca\u00f1\u00f3n'}]}}]})
+        self.assertEqual(record.leader[9], 'a')
+        self.assertIn('Ca\u00f1\u00f3n'.encode('utf-8'),
+                      serialize_record(record))
+
+    def test_format_from_filename(self):
+        self.assertEqual(marc_formats.format_from_filename('a.XML'), 'xml')
+        self.assertEqual(marc_formats.format_from_filename('a.ndjson'),
+                         'json')
+        self.assertEqual(marc_formats.format_from_filename('a.mrc'), 'marc')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class PipelineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.chunks = list(parallel.chunk_records(
+            [REC_1, b'00005', REC_1, REC_1, REC_1], 1))
+
+    def test_run_input_order(self):
+        stages = pipeline.Pipeline(workers=2, queue_size=2)
+        self.assertEqual(list(stages.run(self.chunks)),
+                         [parallel.convert_chunk(chunk)
+                          for chunk in self.chunks])
+        report = stages.report()
+        for name in ('reader', 'converter', 'writer'):
+            self.assertEqual(report[name]['batches'], 5)
+            self.assertTrue(0.0 <= report[name]['utilisation'] <= 1.0)
+
+    def test_run_completion_order(self):
+        stages = pipeline.Pipeline(workers=2, order='completion')
+        results = [result for chunk, stats in stages.run(self.chunks)
+                   for result in chunk]
+        self.assertEqual(sorted(i for i, marc, error in results),
+                         [0, 1, 2, 3, 4])
+
+    def test_run_reader_error(self):
+        def chunks():
+            yield self.chunks[0]
+            raise IOError("disk failed")
+        stages = pipeline.Pipeline(workers=1)
+        self.assertRaises(RuntimeError, list, stages.run(chunks()))
+
+
+class CompactRecordTests(unittest.TestCase):
+
+    def setUp(self):
+        self.record = compact.CompactRecord.from_marc(REC_1)
+
+    def test_lazy_fields(self):
+        field650 = self.record.get_fields('650')[0]
+        self.assertFalse(hasattr(field650, '__dict__'))
+        self.assertEqual(field650.get_subfields('a'), ['Computer science.'])
+        self.assertEqual(list(field650.offsets), [field650.start + 2])
+        self.assertEqual(field650.as_marc('utf-8'),
+                         REC_1[field650.start:field650.end])
+        field650.indicators[1] = '4'
+        self.assertEqual(field650.as_marc('utf-8'),
+                         b' 4\x1faComputer science.\x1e')
+
+    def test_conversion_matches_pymarc(self):
+        record = pymarc.Record(data=REC_1, to_unicode=True)
+        PCCMARCtoRDAConversion(record).convert()
+        PCCMARCtoRDAConversion(self.record).convert()
+        self.assertEqual(serialize_record(self.record),
+                         serialize_record(record))
+        self.assertIsInstance(self.record.get_fields('245')[0],
+                              compact.CompactField)
+
+    def test_irregular_subfields(self):
+        raw_record = REC_1.replace(b'\x1faComputer science.',
+                                   b'\x1f\x1faComputer science.')
+        raw_record = '{0:05d}'.format(len(raw_record)).encode() + \
+                     raw_record[5:]
+        record = pymarc.Record(data=raw_record, to_unicode=True)
+        self.assertEqual(
+            serialize_record(compact.CompactRecord.from_marc(raw_record)),
+            serialize_record(record))
+
+    def test_pymarc_records(self):
+        record = self.record.to_record()
+        self.assertIsInstance(record, pymarc.Record)
+        self.assertEqual(str(record['245']),
+                         str(self.record.get_fields('245')[0]))
+        self.assertEqual(
+            serialize_record(compact.CompactRecord.from_record(record)),
+            serialize_record(self.record))
+
+    def test_decode_record(self):
+        marc8_record = REC_1[0:9] + b' ' + REC_1[10:]
+        self.assertIsInstance(compact.decode_record(marc8_record),
+                              compact.CompactRecord)
+
+    def test_marc8_fields(self):
+        marc8_record = REC_1[0:9] + b' ' + REC_1[10:].replace(
+            b'Filip.', b'Fil\xe2ip', 1).replace(b'Computer science.',
+                                               b'Computer sci\xe2ence')
+        record = compact.decode_record(marc8_record)
+        field100, field650 = record.get_fields('100', '650')[0:2]
+        self.assertEqual(field100.encoding, 'marc-8')
+        self.assertIsNone(field100._subfields)
+        self.assertEqual(field100['a'], 'Wojcieszyn, Fil\u00edp')
+        self.assertEqual(record.get_fields('520')[0].encoding, 'utf-8')
+        pymarc_record = pymarc.Record(data=marc8_record, to_unicode=True)
+        PCCMARCtoRDAConversion(record).convert()
+        PCCMARCtoRDAConversion(pymarc_record).convert()
+        # No step reads the 650, it is converted as it is written
+        self.assertIsNone(field650._subfields)
+        self.assertEqual(serialize_record(record),
+                         serialize_record(pymarc_record))
+        self.assertIn(b'Computer sci\xe9nce', serialize_record(record))
+
+
+class ErrorReportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.quarantine = os.path.join(self.directory, 'failed.mrc')
+        self.report = os.path.join(self.directory, 'errors.jsonl')
+
+    def failure(self, number=0):
+        class BrokenConversion(PCCMARCtoRDAConversion):
+            def create338(self):
+                return rda_media
+        record = pymarc.Record(data=REC_1, to_unicode=True)
+        try:
+            BrokenConversion(record).convert()
+        except errors.ConversionError as error:
+            return errors.RecordFailure(number, REC_1, error)
+
+    def test_conversion_error_step(self):
+        failure = self.failure(3)
+        self.assertEqual(failure.step, 'create338')
+        self.assertEqual(failure.error, 'NameError')
+        self.assertEqual(failure.control_number, '978-1-4302-5981-7')
+        self.assertIn('rda_media', failure.traceback)
+
+    def test_quarantine_and_report(self):
+        with errors.ErrorReport(self.quarantine, self.report) as report:
+            report.add(self.failure(3))
+            report.add(self.failure(7))
+        self.assertEqual(report.summary(10),
+                         {'create338': {'failures': 2, 'rate': 0.2}})
+        with open(self.quarantine, 'rb') as quarantine:
+            self.assertEqual(quarantine.read(), REC_1 * 2)
+        with open(self.report) as report_file:
+            lines = [json.loads(line) for line in report_file]
+        self.assertEqual([line['record'] for line in lines], [3, 7])
+        self.assertEqual(lines[0]['step'], 'create338')
+
+    def test_max_error_rate(self):
+        report = errors.ErrorReport(max_error_rate=0.5, min_records=4)
+        for i in range(3):
+            report.add(self.failure(i))
+        report.check(3)
+        report.check(6)
+        self.assertRaises(errors.ErrorRateExceeded, report.check, 4)
+
+    def test_resume_truncates(self):
+        with errors.ErrorReport(self.quarantine, self.report) as report:
+            report.add(self.failure(0))
+            offsets = report.offsets()
+            report.add(self.failure(1))
+        with errors.ErrorReport(self.quarantine,
+                                self.report,
+                                quarantine_offset=offsets[0],
+                                report_offset=offsets[1]) as report:
+            report.add(self.failure(2))
+        with open(self.report) as report_file:
+            self.assertEqual([json.loads(line)['record']
+                              for line in report_file], [0, 2])
+        self.assertEqual(os.path.getsize(self.quarantine), len(REC_1) * 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class ResumeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, 'records.mrc')
+        # Records 5 and 30 fail to convert
+        raw_records = list(itertools.islice(
+            golden.read_records(golden.GOLDEN_INPUT), 38))
+        raw_records.insert(5, b'00010xxxxx')
+        raw_records.insert(30, b'00010xxxxx')
+        with open(self.input, 'wb') as input_file:
+            input_file.write(b''.join(raw_records))
+
+    def convert(self, name, **options):
+        filenames = [os.path.join(self.directory, name + extension)
+                     for extension in ('.mrc', '.quarantine.mrc', '.jsonl')]
+        with contextlib.redirect_stdout(io.StringIO()), \
+             contextlib.redirect_stderr(io.StringIO()):
+            run.convert(self.input,
+                        filenames[0],
+                        checkpoint_every=10,
+                        quarantine_filename=filenames[1],
+                        error_report_filename=filenames[2],
+                        progress_interval=0,
+                        **options)
+        return filenames
+
+    def read(self, filenames):
+        contents = []
+        for filename in filenames:
+            with open(filename, 'rb') as output_file:
+                contents.append(output_file.read())
+        return contents
+
+    def test_resume(self):
+        expected = self.read(self.convert('full'))
+        output, quarantine, report = filenames = [
+            os.path.join(self.directory, 'resumed' + extension)
+            for extension in ('.mrc', '.quarantine.mrc', '.jsonl')]
+        checkpoint_filename = checkpoint.checkpoint_filename(output)
+        self.assertFalse(os.path.exists(
+            checkpoint.checkpoint_filename(
+                os.path.join(self.directory, 'full.mrc'))))
+        # A run stopped after writing past its checkpoint at record 20
+        with MappedMARCReader(self.input) as reader:
+            input_offset = reader.offset(20)
+        output_offset = sum(len(raw_record) for raw_record in itertools.islice(
+            iter_raw_records(io.BytesIO(expected[0])), 19))
+        report_offset = len(expected[2].split(b'\n')[0]) + 1
+        for filename, contents, offset in zip(filenames,
+                                              expected,
+                                              (output_offset,
+                                               10,
+                                               report_offset)):
+            with open(filename, 'wb') as output_file:
+                output_file.write(contents[:offset] + b'partly written')
+        Checkpoint(input_offset,
+                   20,
+                   output_offset,
+                   1,
+                   10,
+                   report_offset).save(checkpoint_filename)
+        self.convert('resumed', resume=True)
+        self.assertEqual(self.read(filenames), expected)
+        self.assertFalse(os.path.exists(checkpoint_filename))
+        self.assertRaises(ValueError, self.convert, 'resumed', resume=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class ShardedMARCWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'rda.mrc')
+        self.records = [REC_1.replace(b'978-1-4302-5981-7\x1e',
+                                      '978-1-4302-{0:04d}-7\x1e'.format(
+                                          i).encode('ascii'), 1)
+                        for i in range(10)]
+
+    def test_count_shards(self):
+        with shards.ShardedMARCWriter(self.output, 3, shard_records=2) as writer:
+            for record in self.records:
+                writer.write(record)
+        manifest = writer.manifest()
+        self.assertEqual([shard['records'] for shard in manifest['shards']],
+                         [4, 4, 2])
+        self.assertEqual([list(shards.decode_numbers(shard['numbers']))
+                          for shard in manifest['shards']],
+                         [[0, 1, 6, 7], [2, 3, 8, 9], [4, 5]])
+        merged = os.path.join(self.directory, 'merged.mrc')
+        shards.merge_shards(shards.manifest_filename(self.output), merged)
+        with open(merged, 'rb') as merged_file:
+            self.assertEqual(merged_file.read(), b''.join(self.records))
+
+    def test_encode_numbers(self):
+        numbers = array.array('q', [5, 6, 7, 8, 9, 0, 1, 2, 3, 4])
+        self.assertEqual(shards.decode_numbers(shards.encode_numbers(numbers)),
+                         numbers)
+        # One of four shards by hash, about 100,000 records
+        numbers = array.array('q', [
+            i for i in range(400000)
+            if zlib.crc32(str(i).encode('ascii')) % 4 == 0])
+        self.assertLess(len(shards.encode_numbers(numbers)), len(numbers))
+
+    def test_merge_completion_order(self):
+        writer = shards.ShardedMARCWriter(self.output, 4, shard_by='hash')
+        for i in [5, 6, 7, 8, 9, 0, 1, 2, 3, 4]:
+            writer.write(self.records[i], i)
+        writer.close()
+        merged = os.path.join(self.directory, 'merged.mrc')
+        self.assertEqual(
+            shards.merge_shards(shards.manifest_filename(self.output),
+                                merged,
+                                verify=True),
+            10)
+        with open(merged, 'rb') as merged_file:
+            self.assertEqual(merged_file.read(), b''.join(self.records))
+
+    def test_verify_shards(self):
+        with shards.ShardedMARCWriter(self.output, 2, shard_records=5) as writer:
+            for record in self.records:
+                writer.write(record)
+        with open(shards.shard_filename(self.output, 1), 'r+b') as shard:
+            shard.write(b'1')
+        manifest = shards.manifest_filename(self.output)
+        self.assertEqual(shards.verify_shards(manifest), ['rda.00001.mrc'])
+        self.assertRaises(ValueError,
+                          shards.merge_shards,
+                          manifest,
+                          os.path.join(self.directory, 'merged.mrc'),
+                          True)
+
+    def test_splice(self):
+        source_name = os.path.join(self.directory, 'source')
+        with open(source_name, 'wb') as source_file:
+            source_file.write(b'0123456789')
+        destination_name = os.path.join(self.directory, 'destination')
+        with open(source_name, 'rb') as source_file, \
+             open(destination_name, 'wb') as destination_file:
+            destination_file.write(b'ab')
+            destination_file.flush()
+            shards.splice(source_file, destination_file, 3, 4)
+            shards.splice(source_file, destination_file, 0, 2)
+        with open(destination_name, 'rb') as destination_file:
+            self.assertEqual(destination_file.read(), b'ab345601')
+
+    def test_control_number(self):
+        self.assertEqual(control_number(REC_1), '978-1-4302-5981-7')
+        self.assertEqual(control_number(self.records[3]), '978-1-4302-0003-7')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class AnalyzerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rda_record = parallel.convert_raw_record(REC_1)
+        self.records = list(SyntheticCorpus(seed=3).records(200))
+
+    def test_profile(self):
+        profile = analyzer.analyze([REC_1, self.rda_record, b'00005'])
+        summary = profile.as_dict()
+        self.assertEqual(summary['records'], 3)
+        self.assertEqual(summary['unreadable'], 1)
+        self.assertEqual(summary['leader06'], {'a': 2})
+        self.assertEqual(summary['007'], {'cr': 2})
+        self.assertEqual(summary['gmd'], 1)
+        self.assertEqual(summary['rule_hits'], {'300': 1})
+        self.assertEqual(summary['steps']['convert245'], 2)
+        self.assertEqual(summary['steps']['create336'], 1)
+
+    def test_plan_skips_steps(self):
+        self.assertEqual(analyzer.analyze([REC_1]).plan(),
+                         ['convert245', 'convert300'])
+        self.assertEqual(analyzer.analyze([self.rda_record]).plan(), [])
+
+    def test_plan_matches_full_conversion(self):
+        steps = analyzer.analyze(self.records).plan()
+        self.assertLess(len(steps), len(PCCMARCtoRDAConversion.steps))
+        for raw_record in self.records:
+            self.assertEqual(
+                parallel.convert_raw_record(raw_record, steps=steps),
+                parallel.convert_raw_record(raw_record))
+
+    def test_local_rules(self):
+        plan = load_plan()
+        plan.fields['520'] = RuleSet([
+            {'tag': '520', 'pattern': r'\bWeb API\b',
+             'replacement': 'Web Application Programming Interface'}]
+            ).compile().get('520')
+        profile = analyzer.CorpusProfile(plan)
+        profile.add(REC_1)
+        self.assertEqual(profile.rule_hits['520'], 1)
+        self.assertIn('convertLocalRules', profile.plan())
+
+    def test_load_steps(self):
+        input_filename = os.path.join(self.directory, 'records.mrc')
+        plan_filename = os.path.join(self.directory, 'plan.json')
+        with open(input_filename, 'wb') as input_file:
+            input_file.write(REC_1)
+        analyzer.save_plan(analyzer.analyze([REC_1]),
+                           plan_filename,
+                           input_filename)
+        self.assertEqual(analyzer.load_steps(plan_filename,
+                                             input_filename,
+                                             load_plan()),
+                         ('convert245', 'convert300'))
+        # Rewritten with the same size
+        modified = os.stat(input_filename).st_mtime_ns
+        os.utime(input_filename, ns=(modified, modified + 1000000000))
+        self.assertRaises(ValueError,
+                          analyzer.load_steps,
+                          plan_filename,
+                          input_filename,
+                          load_plan())
+        analyzer.save_plan(analyzer.analyze([REC_1]),
+                           plan_filename,
+                           input_filename)
+        with open(input_filename, 'ab') as input_file:
+            input_file.write(REC_1)
+        self.assertRaises(ValueError,
+                          analyzer.load_steps,
+                          plan_filename,
+                          input_filename,
+                          load_plan())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class GoldenCorpusTests(unittest.TestCase):
+
+    def test_golden_corpus(self):
+        self.assertEqual(list(golden.compare_corpus(engine='fast',
+                                                    workers=2)),
+                         [])
+
+    def test_engines_match_reference(self):
+        for engine in ('compact', 'plan'):
+            self.assertEqual(list(golden.compare_corpus(engine=engine,
+                                                        shard=1,
+                                                        shards=2)),
+                             [])
+
+    def test_diff_records(self):
+        expected = golden.reference_convert(REC_1)
+        self.assertEqual(golden.diff_records(expected, expected), [])
+        differences = golden.diff_records(expected, REC_1)
+        self.assertEqual([field.tag for field in differences],
+                         ['245', '300'])
+        self.assertEqual(differences[1].actual,
+                         '=300  \\\\$aXXVI, 368 p. 17 illus.$bonline resource.')
+
+    def test_compare_chunk(self):
+        expected = golden.reference_convert(REC_1)
+        self.assertEqual(golden.compare_chunk((0, [(REC_1, expected)])), [])
+        differences = golden.compare_chunk((5, [(REC_1, REC_1)]))
+        self.assertEqual(differences[0].record, 5)
+        self.assertEqual(differences[0].control_number, '978-1-4302-5981-7')
+
+class ProgressReporterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [100.0]
+        self.output = io.StringIO()
+        self.tmp = tempfile.mkdtemp()
+        self.status_filename = os.path.join(self.tmp, 'status.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def clock(self):
+        return self.now[0]
+
+    def reporter(self, **kwargs):
+        return reporter.ProgressReporter(output=self.output,
+                                         clock=self.clock,
+                                         smoothing=0.5,
+                                         **kwargs)
+
+    def test_reports_once_an_interval(self):
+        progress = self.reporter(total_records=1000, interval=5)
+        progress.update(100)
+        self.now[0] = 104.0
+        progress.update(100)
+        self.assertEqual(self.output.getvalue(), '')
+        self.now[0] = 105.0
+        progress.update(100)
+        self.assertEqual(len(self.output.getvalue().splitlines()), 1)
+        self.assertEqual(progress.record_rate, 60.0)
+
+    def test_moving_average_and_eta(self):
+        progress = self.reporter(total_records=1000, interval=10)
+        self.now[0] = 110.0
+        progress.update(200)
+        self.now[0] = 120.0
+        progress.update(100)
+        # Half of the 20 records/s of the first interval and the 10 of the
+        # second
+        self.assertEqual(progress.record_rate, 15.0)
+        status = progress.status()
+        self.assertEqual(status['interval_records_per_second'], 10.0)
+        self.assertIn(' 10 records/s (15 moving, 15 average)',
+                      self.output.getvalue().splitlines()[-1])
+        self.assertEqual(status['fraction_done'], 0.3)
+        self.assertEqual(status['eta_seconds'], 700 / 15.0)
+        self.assertEqual(status['records_per_second'], 15.0)
+        self.assertTrue(self.output.getvalue().endswith('ETA 0:00:47\n'))
+
+    def test_eta_from_bytes(self):
+        progress = self.reporter(total_records=10,
+                                 total_bytes=1000,
+                                 interval=1)
+        self.now[0] = 102.0
+        progress.update(1, 100)
+        status = progress.status()
+        self.assertEqual(status['fraction_done'], 0.1)
+        self.assertEqual(status['eta_seconds'], 18.0)
+
+    def test_status_file(self):
+        with self.reporter(interval=1,
+                           status_filename=self.status_filename) as progress:
+            self.now[0] = 101.0
+            progress.update(10, errors=1)
+            with open(self.status_filename) as status_file:
+                status = json.load(status_file)
+            self.assertEqual(status['state'], 'running')
+            self.assertEqual(status['errors'], 1)
+            self.assertEqual(status['error_rate'], 0.1)
+            self.assertIsNone(status['eta_seconds'])
+        with open(self.status_filename) as status_file:
+            status = json.load(status_file)
+        self.assertEqual(status['state'], 'finished')
+        self.assertEqual(status['records'], 10)
+        self.assertEqual(os.listdir(self.tmp), ['status.json'])
+
+    def test_finish(self):
+        progress = self.reporter(total_records=20, interval=1)
+        self.now[0] = 101.0
+        progress.update(10)
+        self.now[0] = 101.5
+        progress.finish()
+        # No records since the last report is not a stall
+        self.assertEqual(progress.record_rate, 10.0)
+        self.assertIn('finished in 0:00:02', self.output.getvalue())
+        progress.finish('failed')
+        self.assertEqual(progress.state, 'finished')
+
+    def test_failed(self):
+        try:
+            with self.reporter(status_filename=self.status_filename):
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        with open(self.status_filename) as status_file:
+            self.assertEqual(json.load(status_file)['state'], 'failed')
+        self.assertIn('failed in', self.output.getvalue())
+
+class DeduplicatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def record(self, control_number, stamp='20140807044706.0', isbn=None):
+        record = pymarc.Record(data=REC_1)
+        record['001'].data = control_number
+        record['005'].data = stamp
+        record.remove_fields('020', '024')
+        if isbn is not None:
+            record.add_ordered_field(
+                pymarc.Field('020', [' ', ' '], ['a', isbn]))
+        return record.as_marc()
+
+    def test_normalize_isbn(self):
+        self.assertEqual(dedup.normalize_isbn('1-4302-5981-7 (pbk.)'),
+                         '9781430259817')
+        self.assertEqual(dedup.normalize_isbn('9781430259817'),
+                         '9781430259817')
+        self.assertEqual(dedup.normalize_isbn('080442957X'),
+                         '9780804429573')
+        self.assertIsNone(dedup.normalize_isbn('not an ISBN'))
+        self.assertIsNone(dedup.normalize_isbn(''))
+
+    def test_record_keys(self):
+        keys, stamp = dedup.record_keys(REC_1)
+        self.assertEqual(keys,
+                         [('001', '978-1-4302-5981-7'),
+                          ('020', '9781430259817'),
+                          ('024', 'doi:10.1007/978-1-4302-5981-7')])
+        self.assertEqual(stamp, 20140807044706.0)
+
+    def test_first_wins(self):
+        records = [self.record('a', isbn='1430259817'),
+                   self.record('b'),
+                   self.record('c', isbn='978-1-4302-5981-7'),
+                   self.record('b'),
+                   self.record('d')]
+        duplicates, counts = dedup.find_duplicates(records, first=10)
+        self.assertEqual(duplicates, {12: 10, 13: 11})
+        self.assertEqual(counts, {'001': 1, '020': 1})
+
+    def test_latest_wins(self):
+        records = [self.record('a', '20100101000000.0'),
+                   self.record('a', '20200101000000.0', isbn='1430259817'),
+                   self.record('b', '20150101000000.0', isbn='1430259817'),
+                   self.record('a', '20200101000000.0')]
+        duplicates, counts = dedup.find_duplicates(records, 'latest')
+        # The sets of a and b are joined by the ISBN, the first of the two
+        # records with the latest 005 is kept
+        self.assertEqual(duplicates, {0: 1, 2: 1, 3: 1})
+        self.assertRaises(ValueError, dedup.Deduplicator, 'last')
+
+    def test_spill(self):
+        records = [self.record(str(i % 7)) for i in range(20)]
+        spill_filename = os.path.join(self.tmp, 'keys.db')
+        with dedup.Deduplicator(spill_filename=spill_filename,
+                                max_keys=3) as deduplicator:
+            deduplicator.add(0, records[:10])
+            self.assertTrue(os.path.exists(spill_filename))
+            self.assertEqual(len(deduplicator.key_set), 7)
+            deduplicator.add(10, records[10:])
+            self.assertEqual(deduplicator.duplicates(),
+                             dict((i, i % 7) for i in range(7, 20)))
+        self.assertFalse(os.path.exists(spill_filename))
+
+    def test_leave_out(self):
+        records = [self.record('a'), self.record('a')]
+        results, chunk_stats = parallel.convert_chunk(
+            (5, list(dedup.leave_out(records, {6: 5}, 5))))
+        self.assertEqual([(i, marc is None) for i, marc, error in results],
+                         [(5, False), (6, True)])
+
 
 if __name__ == '__main__':
     unittest.main()
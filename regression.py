@@ -0,0 +1,108 @@
+__author__ = "Jeremy Nelson"
+
+import argparse
+import logging
+import sys
+from rda_enhancement import golden, parallel
+
+# pymarc warns about every irregular field in the fixtures
+logging.basicConfig(level=logging.ERROR)
+
+def report(engine, differences, limit):
+    """Function prints the differences of an engine from the golden records,
+    at most limit records of them
+
+    Args:
+        engine -- Name of the engine
+        differences -- List of golden.RecordDifference
+        limit -- Most records to print the differences of
+
+    Returns:
+        number of records that differ
+    """
+    for difference in differences[:limit]:
+        print("{} record {} 001={}".format(engine,
+                                           difference.record,
+                                           difference.control_number))
+        for field in difference.fields:
+            print("  {} #{}\n    expected {!r}\n    actual   {!r}".format(
+                field.tag,
+                field.occurrence,
+                field.expected,
+                field.actual))
+    if len(differences) > limit:
+        print("{} ... and {} more records".format(engine,
+                                                  len(differences) - limit))
+    print("{:<10} {:>8} records differ".format(engine, len(differences)))
+    return len(differences)
+
+def main(args):
+    if args.update:
+        count = golden.save_golden(args.input, args.expected)
+        print("Saved {} golden records to {}".format(count, args.expected))
+        return 0
+    failed = 0
+    for engine in args.engine:
+        differences = list(golden.compare_corpus(
+            args.input,
+            None if args.against_reference else args.expected,
+            engine,
+            args.workers,
+            args.chunk_size,
+            args.shard,
+            args.shards))
+        failed += report(engine, differences, args.limit)
+    return 1 if failed > 0 else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare the PCC RDA conversion with golden records')
+    parser.add_argument(
+        '--input',
+        default=golden.GOLDEN_INPUT,
+        help='Fixture MARC21 records, gzipped if the name ends in .gz')
+    parser.add_argument(
+        '--expected',
+        default=golden.GOLDEN_EXPECTED,
+        help='Golden records converted from the fixtures in the same order')
+    parser.add_argument(
+        '--against-reference',
+        action='store_true',
+        help='Compare with the reference engine instead of the golden records')
+    parser.add_argument(
+        '--engine',
+        choices=golden.ENGINES,
+        nargs='+',
+        default=list(golden.ENGINES),
+        help='Engines to compare, all of them by default')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of comparison processes')
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=parallel.DEFAULT_CHUNK_SIZE,
+        help='Number of records sent to a process at a time')
+    parser.add_argument(
+        '--shard',
+        type=int,
+        default=0,
+        help='Compare only the chunks numbered this modulo --shards')
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=1,
+        help='Number of shards the fixtures are split into')
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=10,
+        help='Most records to print the differences of for each engine')
+    parser.add_argument(
+        '--update',
+        action='store_true',
+        help='Save the reference conversion of the fixtures as the golden '
+             'records, after a deliberate change to the conversion')
+    sys.exit(main(parser.parse_args()))
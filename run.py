@@ -1,67 +1,477 @@
 __author__ = "Jeremy Nelson"
 
 import argparse
+import contextlib
 import datetime
 import logging
-import pymarc
+import os
 import sys
-from rda_enhancement import pcc_conversion
+from rda_enhancement import analyzer, checkpoint, dedup, errors, fingerprints
+from rda_enhancement import instrumentation
+from rda_enhancement import marc_formats, marc_reader, marc_writer
+from rda_enhancement import parallel, pipeline, prefilter, reporter, shards
 
-logging.basicConfig(
-    filename='error.log', 
-    format='%(asctime)s %(message)s',
-    level=logging.ERROR)
-
-def convert(input_mrc_filename, output_mrc_filename):
+def convert(input_mrc_filename,
+            output_mrc_filename,
+            workers=1,
+            chunk_size=parallel.DEFAULT_CHUNK_SIZE,
+            order='input',
+            fast_path=True,
+            start_record=0,
+            stop_record=None,
+            save_index=False,
+            checkpoint_every=checkpoint.DEFAULT_CHECKPOINT_EVERY,
+            resume=False,
+            stats_filename=None,
+            stats_format='json',
+            buffer_size=marc_writer.DEFAULT_BUFFER_SIZE,
+            background_writer=False,
+            rules_filename=None,
+            pipeline_mode=False,
+            queue_size=pipeline.DEFAULT_QUEUE_SIZE,
+            pipeline_report_filename=None,
+            cache_size=0,
+            fingerprints_filename=None,
+            unchanged='skip',
+            input_format='auto',
+            output_format='auto',
+            shard_count=1,
+            shard_by='count',
+            shard_records=shards.DEFAULT_SHARD_RECORDS,
+            shard_bytes=shards.DEFAULT_SHARD_BYTES,
+            quarantine_filename=None,
+            error_report_filename=None,
+            max_error_rate=None,
+            plan_filename=None,
+            progress_interval=reporter.DEFAULT_INTERVAL,
+            status_filename=None,
+            dedup_policy=None,
+            duplicates_filename=None,
+            dedup_spill_filename=None,
+            dedup_max_keys=dedup.DEFAULT_MAX_KEYS):
     """Function takes an input MARC21 file, runs the PCC RDA conversion
     on each record, and saves the resulting converted RDA MARC records
     as the output filepath.
 
     Args:
         input_mrc_filename -- File path to input MARC file
+        workers -- Number of conversion processes, 1 converts every record
+                   in this process
+        chunk_size -- Number of raw records sent to a worker at a time
+        order -- 'input' writes records in input order, 'completion'
+                 writes each chunk as soon as a worker finishes it
+        fast_path -- Copy records that are already RDA through without
+                     decoding them
+        start_record -- Number of the first input record to convert
+        stop_record -- Number of the input record to stop before, defaults
+                       to converting through the last record
+        save_index -- Save the input's record offset index to a sidecar
+                      .idx file that later runs load instead of scanning
+        checkpoint_every -- Save a checkpoint after about this many records,
+                            0 turns checkpoints off. Checkpoints need
+                            records written in input order.
+        resume -- Continue from the output's last checkpoint, truncating
+                  the output back to the checkpoint. The checkpoint is
+                  removed once the output is complete.
+        stats_filename -- Save the time, calls and fields modified of each
+                          conversion step to this file
+        stats_format -- 'json' or 'prometheus' text format for the stats
+        buffer_size -- Bytes of converted records collected before each
+                       write to the output
+        background_writer -- Write the output from a background thread
+        rules_filename -- JSON or YAML spec of local rules run after the
+                          PCC rules
+        pipeline_mode -- Run a reader thread, workers converter processes
+                         and the writer as stages joined by bounded queues
+        queue_size -- Most chunks read but not yet written in pipeline mode
+        pipeline_report_filename -- Save the utilisation of each pipeline
+                                    stage to this JSON file
+        cache_size -- Number of rewritten subfield values cached by each
+                      conversion process, 0 turns the cache off
+        fingerprints_filename -- SQLite file of the fingerprints of the
+                                 records converted, records unchanged since
+                                 an earlier run with the same rules are not
+                                 converted again
+        unchanged -- 'skip' leaves unchanged records out of the output,
+                     'copy' copies them through
+        input_format -- 'marc', 'xml' for MARCXML or 'json' for line
+                        delimited MARC-in-JSON, 'auto' detects the format
+                        from the start of the input
+        output_format -- 'marc', 'xml' or 'json', 'auto' picks the format
+                         from the output file extension
+        shard_count -- Write the output to this many shard files and a
+                       manifest instead of one file
+        shard_by -- 'count' or 'size' writes blocks of shard_records records
+                    or shard_bytes bytes to each shard in turn, 'hash' the
+                    records with the same 001 hash to the same shard
+        shard_records -- Records in each block of 'count' sharding
+        shard_bytes -- Bytes in each block of 'size' sharding
+        quarantine_filename -- Write the records that fail to convert, as
+                               they were read, to this MARC21 file
+        error_report_filename -- Write the record number, 001, failed step
+                                 and traceback of each failure to this file
+                                 as a line of JSON
+        max_error_rate -- Stop the run with errors.ErrorRateExceeded when
+                          more than this share of the records converted
+                          have failed, checked once
+                          errors.DEFAULT_MIN_RECORDS have been converted
+        plan_filename -- Execution plan saved by python run.py analyze for
+                         the input, only its steps are run
+        progress_interval -- Seconds between progress reports, 0 reports
+                             only at the end of the run
+        status_filename -- JSON file of the progress, throughput and time
+                           left of the run, rewritten with each report
+        dedup_policy -- 'first' or 'latest' converts only the first record or
+                        the one with the latest 005 of the records sharing
+                        a 001, ISBN or 024, None converts every record
+        duplicates_filename -- Write the duplicates left out, as they were
+                               read, to this MARC21 file
+        dedup_spill_filename -- SQLite file the duplicate keys are spilled
+                                to once there are more than dedup_max_keys
+        dedup_max_keys -- Duplicate keys held in memory
 
     Returns:
          output_mrc_filename -- File path for converted RDA MARC records
     """
-    input_reader = pymarc.MARCReader(open(input_mrc_filename,
-                                          "rb"),
-                                     to_unicode=True)
-    output_writer = pymarc.MARCWriter(open(output_mrc_filename,
-                                           "bw+"))
     start = datetime.datetime.now()
     print("Converting {} to RDA at {}".format(
         input_mrc_filename, 
         start.isoformat()))
-    for i,rec in enumerate(input_reader):
-        converter = pcc_conversion.PCCMARCtoRDAConversion(rec)
-        if not i%10 and i > 0:
-            print(".", end='')
-        if not i%100:
-            print(i, end='')
-        try:
-            converter.convert()
-            new_record = pymarc.Record()
-            new_record.leader = rec.leader
-            for field in sorted(converter.record.fields,
-                        key=lambda x: x.tag):
-                new_record.add_field(field)
-            output_writer.write(new_record)
-        except:
-            logging.error(
-                "Failed to convert record number={}, error={}".format(
-                    i,
-                    sys.exc_info()[0]))
-            continue
-    output_writer.close()
+    if order != 'input':
+        if resume:
+            raise ValueError("Resuming needs records written in input order")
+        checkpoint_every = 0
+    if unchanged not in ('skip', 'copy'):
+        raise ValueError("unchanged must be 'skip' or 'copy'")
+    if shard_count > 1:
+        if resume:
+            raise ValueError("Sharded output can not be resumed")
+        checkpoint_every = 0
+    if input_format == 'auto':
+        input_format = marc_formats.detect_format(input_mrc_filename)
+    if output_format == 'auto':
+        output_format = marc_formats.format_from_filename(output_mrc_filename)
+    if shard_count > 1 and output_format != 'marc':
+        raise ValueError("Shards are written in MARC21 transmission format")
+    if input_format != 'marc':
+        if fingerprints_filename:
+            raise ValueError("Fingerprints need MARC21 transmission input")
+        if dedup_policy:
+            raise ValueError("Deduplication needs MARC21 transmission input")
+        reader = marc_formats.StreamingMARCReader(input_mrc_filename,
+                                                  input_format)
+    else:
+        reader = marc_reader.MappedMARCReader(input_mrc_filename,
+                                              save_index=save_index)
+    # Compiling the rules here reports a bad spec before any conversion
+    plan = parallel.load_plan(rules_filename)
+    steps = None
+    if plan_filename:
+        steps = analyzer.load_steps(plan_filename, input_mrc_filename, plan)
+        print("Running the steps {} from {}".format(', '.join(steps),
+                                                    plan_filename))
+    store = None
+    if fingerprints_filename:
+        store = fingerprints.FingerprintStore(
+            fingerprints_filename,
+            fingerprints.rule_version(plan),
+            prefilter.CONVERSION_TAGS | plan.tags)
+    checkpoint_file = checkpoint.checkpoint_filename(output_mrc_filename)
+    progress = None
+    if resume:
+        progress = checkpoint.Checkpoint.load(checkpoint_file)
+        if progress is None:
+            raise ValueError(
+                "No checkpoint {} to resume from, the run finished or has "
+                "not started".format(checkpoint_file))
+    stats = instrumentation.ConversionStats() if stats_filename else None
+    options = {'fast_path': fast_path,
+               'instrument': stats is not None,
+               'rules_filename': rules_filename,
+               'cache_size': cache_size,
+               'fingerprints_filename': fingerprints_filename,
+               'unchanged': unchanged,
+               'steps': steps}
+    count, skipped = 0, 0
+    with reader, contextlib.ExitStack() as outputs:
+        duplicates = {}
+        if dedup_policy:
+            # Read ahead of the conversion, as the record kept from a set of
+            # duplicates can come after the others
+            duplicates, matches = dedup.find_duplicates(
+                reader.records(start_record, stop_record),
+                dedup_policy,
+                start_record,
+                dedup_spill_filename,
+                dedup_max_keys)
+            print("Found {} duplicate records{}".format(
+                len(duplicates),
+                ''.join(', {} by {}'.format(matches[tag], tag)
+                        for tag in sorted(matches))))
+            if stats is not None:
+                for tag in sorted(matches):
+                    stats.count('dedup', tag, matches[tag])
+            if duplicates_filename:
+                with open(duplicates_filename, 'wb') as duplicates_file:
+                    for i in sorted(duplicates):
+                        duplicates_file.write(reader[i])
+        if progress is None:
+            progress = checkpoint.Checkpoint(reader.offset(start_record),
+                                             start_record)
+        elif reader.offset(progress.record_count) != progress.input_offset:
+            raise ValueError(
+                "Checkpoint {} does not match {}".format(
+                    checkpoint_file,
+                    input_mrc_filename))
+        report = outputs.enter_context(errors.ErrorReport(
+            quarantine_filename,
+            error_report_filename,
+            max_error_rate,
+            quarantine_offset=progress.quarantine_offset if resume else None,
+            report_offset=progress.report_offset if resume else None))
+        if shard_count > 1:
+            output_writer = shards.ShardedMARCWriter(output_mrc_filename,
+                                                     shard_count,
+                                                     shard_by,
+                                                     shard_records,
+                                                     shard_bytes,
+                                                     buffer_size,
+                                                     background_writer)
+            write = output_writer.write
+        else:
+            output_file = outputs.enter_context(
+                open(output_mrc_filename, "bw+" if not resume else "rb+"))
+            if resume:
+                start_record = progress.record_count
+                output_file.truncate(progress.output_offset)
+                output_file.seek(progress.output_offset)
+                print("Resuming at record {}".format(start_record))
+            output_writer = marc_writer.BufferedMARCWriter(output_file,
+                                                           buffer_size,
+                                                           background_writer)
+            if output_format != 'marc':
+                output_writer = marc_formats.FormatWriter(output_writer,
+                                                          output_format)
+
+            def write(marc, i):
+                # A MARC-8 record copied through by --unchanged copy is the
+                # input record still in MARC-8, not the Latin-1 a converted
+                # one is written in
+                if output_format != 'marc' and marc[9:10] != b'a' and \
+                   marc == reader[i]:
+                    output_writer.write(marc, 'marc-8')
+                else:
+                    output_writer.write(marc)
+        # Offsets of streamed input are record numbers, not bytes
+        total_records, total_bytes = None, None
+        if input_format == 'marc':
+            stop = len(reader) if stop_record is None \
+                   else min(stop_record, len(reader))
+            total_records = max(stop - start_record, 0)
+            total_bytes = reader.offset(stop) - reader.offset(start_record)
+        monitor = outputs.enter_context(reporter.ProgressReporter(
+            total_records,
+            total_bytes,
+            progress_interval,
+            status_filename))
+
+        def save_checkpoint():
+            output_writer.flush()
+            os.fsync(output_file.fileno())
+            progress.output_offset = output_writer.tell()
+            progress.input_offset = reader.offset(progress.record_count)
+            progress.quarantine_offset, progress.report_offset = [
+                offset or 0 for offset in report.offsets()]
+            progress.save(checkpoint_file)
+            if store is not None:
+                store.commit()
+
+        records = reader.records(start_record, stop_record)
+        if len(duplicates) > 0:
+            records = dedup.leave_out(records, duplicates, start_record)
+        stages = None
+        if pipeline_mode:
+            stages = pipeline.Pipeline(workers, queue_size, order, **options)
+            results = stages.run(parallel.chunk_records(
+                records,
+                chunk_size,
+                start_record))
+        elif workers > 1:
+            # Ranges can not leave the duplicates out
+            if input_format == 'marc' and len(duplicates) < 1:
+                chunks = reader.ranges(chunk_size, start_record, stop_record)
+            else:
+                chunks = parallel.chunk_records(records,
+                                                chunk_size,
+                                                start_record)
+            results = parallel.convert_chunks(chunks,
+                                              workers,
+                                              order,
+                                              **options)
+        else:
+            chunks = parallel.chunk_records(records,
+                                            chunk_size,
+                                            start_record)
+            results = (parallel.convert_chunk(chunk, **options)
+                       for chunk in chunks)
+        # Stops the workers when the run fails while writing
+        outputs.callback(results.close)
+        since_checkpoint = 0
+        for chunk, chunk_stats in results:
+            if chunk_stats is not None:
+                stats.merge(chunk_stats)
+            failures = report.failures
+            for i, marc, error in chunk:
+                count += 1
+                if error is not None:
+                    progress.error_count += 1
+                    report.add(error)
+                    logging.error(
+                        "Failed to convert record number={}, step={}, "
+                        "error={}".format(i, error.step, error))
+                    continue
+                if marc is None:
+                    if i not in duplicates:
+                        skipped += 1
+                    continue
+                write(marc, i)
+                if store is not None:
+                    store.add(reader[i], marc)
+            if len(chunk) > 0 and input_format == 'marc':
+                monitor.update(len(chunk),
+                               reader.offset(chunk[-1][0] + 1) -
+                               reader.offset(chunk[0][0]),
+                               report.failures - failures)
+            else:
+                monitor.update(len(chunk), 0, report.failures - failures)
+            report.check(count)
+            if len(chunk) < 1:
+                continue
+            progress.record_count = chunk[-1][0] + 1
+            since_checkpoint += len(chunk)
+            if checkpoint_every > 0 and since_checkpoint >= checkpoint_every:
+                save_checkpoint()
+                since_checkpoint = 0
+        if checkpoint_every > 0:
+            save_checkpoint()
+        output_writer.close()
+    # The output is complete, so there is nothing left to resume
+    checkpoint.Checkpoint.remove(checkpoint_file)
+    if store is not None:
+        store.commit()
+        store.close()
+    if store is not None and unchanged == 'skip':
+        print("Skipped {} records unchanged since the last run".format(
+            skipped))
+    if len(duplicates) > 0:
+        print("Left out {} duplicate records{}".format(
+            len(duplicates),
+            " written to {}".format(duplicates_filename)
+            if duplicates_filename else ''))
+    if report.failures > 0:
+        print("Failed to convert {} records".format(report.failures),
+              end='')
+        for step, failures in sorted(report.summary(count).items()):
+            print("\n{:<20} {:>8} failed {:>7.2%}".format(step,
+                                                          failures['failures'],
+                                                          failures['rate']),
+                  end='')
+        print()
+    if stats is not None:
+        stats.save(stats_filename, stats_format)
+    if stages is not None:
+        for name, stage in sorted(stages.report().items()):
+            print("\n{:<10} {:>6.1%} busy {:>10.2f}s waiting {:>10.2f}s "
+                  "blocked".format(name,
+                                   stage['utilisation'],
+                                   stage['waiting_seconds'],
+                                   stage['blocked_seconds']), end='')
+        print()
+        if pipeline_report_filename:
+            stages.save_report(pipeline_report_filename)
     end = datetime.datetime.now()
     print("Finished Converting {} records to RDA at {} total={} minutes".format(
-        i,
+        count,
         end.isoformat(),
-        (end-start).seconds / 60.0))     
+        (end-start).total_seconds() / 60.0))     
         
         
+def merge(arguments):
+    """Function merges the shards of a sharded run into one file in input
+    record order, run as python run.py merge MANIFEST OUTPUT"""
+    parser = argparse.ArgumentParser(prog='run.py merge')
+    parser.add_argument(
+        'manifest',
+        help='Manifest saved next to the shards of a run with --shards')
+    parser.add_argument(
+        'output',
+        help='File path and name for the merged MARC21 records')
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Check the SHA-256 of each shard against the manifest first')
+    args = parser.parse_args(arguments)
+    records = shards.merge_shards(args.manifest, args.output, args.verify)
+    print("Merged {} records into {}".format(records, args.output))
+
+def analyze(arguments):
+    """Function profiles an input file and saves the execution plan of the
+    conversion steps that can change its records, run as
+    python run.py analyze INPUT"""
+    parser = argparse.ArgumentParser(prog='run.py analyze')
+    parser.add_argument(
+        'input',
+        help='File path and name for input MARC21 records to profile')
+    parser.add_argument(
+        '--plan',
+        help='Save the execution plan and profile to this JSON file')
+    parser.add_argument(
+        '--rules',
+        help='JSON or YAML spec of local rules run after the PCC rules')
+    parser.add_argument(
+        '--input-format',
+        choices=['auto'] + list(marc_formats.FORMATS),
+        default='auto',
+        help='Format of the input file, detected from its start by default')
+    args = parser.parse_args(arguments)
+    input_format = args.input_format
+    if input_format == 'auto':
+        input_format = marc_formats.detect_format(args.input)
+    if input_format != 'marc':
+        reader = marc_formats.StreamingMARCReader(args.input, input_format)
+    else:
+        reader = marc_reader.MappedMARCReader(args.input)
+    with reader:
+        profile = analyzer.analyze(reader.records(),
+                                   parallel.load_plan(args.rules))
+    summary = profile.as_dict()
+    print("Profiled {} records, {} unreadable".format(summary['records'],
+                                                      summary['unreadable']))
+    for name in ('encodings', 'leader06', '007', '33X', 'rule_hits'):
+        print("{:<10} {}".format(name, ', '.join(
+            '{}={}'.format(key, value)
+            for key, value in sorted(summary[name].items()))))
+    print("{:<10} {}".format('gmd', summary['gmd']))
+    for step, records in summary['steps'].items():
+        print("{:<20} {:>8} records {}".format(
+            step, records, 'run' if records > 0 else 'skipped'))
+    if args.plan:
+        analyzer.save_plan(profile, args.plan, args.input)
+        print("Saved the execution plan to {}".format(args.plan))
 
 if __name__ == '__main__':
+    # Only from the command line, so importing convert does not log to a
+    # file in the caller's directory
+    logging.basicConfig(
+        filename='error.log', 
+        format='%(asctime)s %(message)s',
+        level=logging.ERROR)
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        merge(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == 'analyze':
+        analyze(sys.argv[2:])
+        sys.exit(0)
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '--input', 
@@ -69,7 +479,200 @@ if __name__ == '__main__':
     parser.add_argument(
         '--output', 
         help='File path and name for converted RDA MARC21 records')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes converting records, default is 1')
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=parallel.DEFAULT_CHUNK_SIZE,
+        help='Number of records sent to a worker process at a time')
+    parser.add_argument(
+        '--order',
+        choices=['input', 'completion'],
+        default='input',
+        help='Write records in input order or as workers complete them')
+    parser.add_argument(
+        '--no-fast-path',
+        dest='fast_path',
+        action='store_false',
+        help='Decode and re-encode every record, even ones already in RDA')
+    parser.add_argument(
+        '--start',
+        type=int,
+        default=0,
+        help='Number of the first input record to convert, starting at 0')
+    parser.add_argument(
+        '--stop',
+        type=int,
+        help='Number of the input record to stop converting before')
+    parser.add_argument(
+        '--save-index',
+        action='store_true',
+        help='Save the record offsets of the input to a sidecar .idx file')
+    parser.add_argument(
+        '--checkpoint-every',
+        type=int,
+        default=checkpoint.DEFAULT_CHECKPOINT_EVERY,
+        help='Records between checkpoints saved next to the output, 0 for none')
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue a failed run from the last checkpoint of the output')
+    parser.add_argument(
+        '--stats',
+        help='File path to save the time and counters of each conversion step')
+    parser.add_argument(
+        '--stats-format',
+        choices=['json', 'prometheus'],
+        default='json',
+        help='Format of the conversion step stats')
+    parser.add_argument(
+        '--buffer-size',
+        type=int,
+        default=marc_writer.DEFAULT_BUFFER_SIZE,
+        help='Bytes of converted records collected before each write')
+    parser.add_argument(
+        '--background-writer',
+        action='store_true',
+        help='Write the output file from a background thread')
+    parser.add_argument(
+        '--rules',
+        help='JSON or YAML spec of local rules to run after the PCC rules')
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Run reading, converting and writing as concurrent stages')
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=pipeline.DEFAULT_QUEUE_SIZE,
+        help='Most chunks read but not yet written in pipeline mode')
+    parser.add_argument(
+        '--pipeline-report',
+        help='File path to save the utilisation of each pipeline stage')
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=0,
+        help='Rewritten subfield values cached by each process, default 0')
+    parser.add_argument(
+        '--fingerprints',
+        help='SQLite file of record fingerprints for incremental runs')
+    parser.add_argument(
+        '--unchanged',
+        choices=['skip', 'copy'],
+        default='skip',
+        help='Leave records unchanged since the last run out or copy them')
+    parser.add_argument(
+        '--input-format',
+        choices=['auto'] + list(marc_formats.FORMATS),
+        default='auto',
+        help='Format of the input, detected from the file by default')
+    parser.add_argument(
+        '--output-format',
+        choices=['auto'] + list(marc_formats.FORMATS),
+        default='auto',
+        help='Format of the output, from its extension by default')
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=1,
+        help='Write the output to this many shard files with a manifest')
+    parser.add_argument(
+        '--shard-by',
+        choices=list(shards.SHARD_BY),
+        default='count',
+        help='Send blocks of records, blocks of bytes or 001 hashes to shards')
+    parser.add_argument(
+        '--shard-records',
+        type=int,
+        default=shards.DEFAULT_SHARD_RECORDS,
+        help='Records in each block sent to a shard with --shard-by count')
+    parser.add_argument(
+        '--shard-bytes',
+        type=int,
+        default=shards.DEFAULT_SHARD_BYTES,
+        help='Bytes in each block sent to a shard with --shard-by size')
+    parser.add_argument(
+        '--quarantine',
+        help='MARC21 file to write the records that fail to convert to')
+    parser.add_argument(
+        '--error-report',
+        help='JSON lines file of the step and traceback of each failure')
+    parser.add_argument(
+        '--max-error-rate',
+        type=float,
+        help='Stop when more than this share of records fail, from 0 to 1')
+    parser.add_argument(
+        '--plan',
+        help='Execution plan from python run.py analyze, skips the steps '
+             'that can not change the input')
+    parser.add_argument(
+        '--progress-interval',
+        type=float,
+        default=reporter.DEFAULT_INTERVAL,
+        help='Seconds between progress reports, 0 reports only at the end')
+    parser.add_argument(
+        '--status-file',
+        help='JSON file of the progress and time left, rewritten with '
+             'each report for a scheduler to poll')
+    parser.add_argument(
+        '--dedup',
+        choices=list(dedup.POLICIES),
+        help='Convert only the first or the latest 005 of the records '
+             'sharing a 001, ISBN or 024')
+    parser.add_argument(
+        '--duplicates',
+        help='MARC21 file to write the duplicates left out to')
+    parser.add_argument(
+        '--dedup-spill',
+        help='SQLite file to spill the duplicate keys to for large inputs')
+    parser.add_argument(
+        '--dedup-max-keys',
+        type=int,
+        default=dedup.DEFAULT_MAX_KEYS,
+        help='Duplicate keys held in memory before spilling')
     args = parser.parse_args()
-    convert(args.input, args.output)
+    convert(args.input,
+            args.output,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            order=args.order,
+            fast_path=args.fast_path,
+            start_record=args.start,
+            stop_record=args.stop,
+            save_index=args.save_index,
+            checkpoint_every=args.checkpoint_every,
+            resume=args.resume,
+            stats_filename=args.stats,
+            stats_format=args.stats_format,
+            buffer_size=args.buffer_size,
+            background_writer=args.background_writer,
+            rules_filename=args.rules,
+            pipeline_mode=args.pipeline,
+            queue_size=args.queue_size,
+            pipeline_report_filename=args.pipeline_report,
+            cache_size=args.cache_size,
+            fingerprints_filename=args.fingerprints,
+            unchanged=args.unchanged,
+            input_format=args.input_format,
+            output_format=args.output_format,
+            shard_count=args.shards,
+            shard_by=args.shard_by,
+            shard_records=args.shard_records,
+            shard_bytes=args.shard_bytes,
+            quarantine_filename=args.quarantine,
+            error_report_filename=args.error_report,
+            max_error_rate=args.max_error_rate,
+            plan_filename=args.plan,
+            progress_interval=args.progress_interval,
+            status_filename=args.status_file,
+            dedup_policy=args.dedup,
+            duplicates_filename=args.duplicates,
+            dedup_spill_filename=args.dedup_spill,
+            dedup_max_keys=args.dedup_max_keys)
 
 
@@ -22,7 +22,9 @@ setup(
     long_description=__doc__,
     packages=find_packages(),
     zip_safe=False,
+    python_requires='>=3.4',
     include_package_data=True,
+    package_data={'rda_enhancement': ['fixtures/*.mrc.gz']},
     platforms='any',
     install_requires=[
         'pymarc'
@@ -33,7 +35,7 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.4',
         'Topic :: Software Development :: Libraries :: Python Modules'
     ]